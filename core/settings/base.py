@@ -3,7 +3,7 @@ Base Django settings for core project.
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -47,6 +47,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'posts.context_processors.sidebar_data',
             ],
         },
     },
@@ -114,4 +115,142 @@ LOGGING = {
             'propagate': True,
         },
     },
-}
\ No newline at end of file
+}
+# Cola de generación de noticias IA (python manage.py run_news_worker)
+NEWS_WORKER_LEASE_SECONDS = config('NEWS_WORKER_LEASE_SECONDS', default=300, cast=int)
+NEWS_WORKER_POLL_INTERVAL = config('NEWS_WORKER_POLL_INTERVAL', default=5, cast=float)
+NEWS_WORKER_MAX_ATTEMPTS = config('NEWS_WORKER_MAX_ATTEMPTS', default=3, cast=int)
+NEWS_WORKER_RETRY_BACKOFF = config('NEWS_WORKER_RETRY_BACKOFF', default=30, cast=int)
+NEWS_WORKER_RETRY_BACKOFF_MAX = config('NEWS_WORKER_RETRY_BACKOFF_MAX', default=900, cast=int)
+
+# Descarga de fuentes (URLs manuales)
+NEWS_FETCH_MAX_WORKERS = config('NEWS_FETCH_MAX_WORKERS', default=8, cast=int)
+NEWS_FETCH_PER_HOST = config('NEWS_FETCH_PER_HOST', default=2, cast=int)
+NEWS_FETCH_DEADLINE = config('NEWS_FETCH_DEADLINE', default=40, cast=float)
+NEWS_FETCH_MAX_BYTES = config('NEWS_FETCH_MAX_BYTES', default=2 * 1024 * 1024, cast=int)
+NEWS_EXTRACT_MAX_CHARS = config('NEWS_EXTRACT_MAX_CHARS', default=12000, cast=int)
+NEWS_HTTP_TIMEOUT = config('NEWS_HTTP_TIMEOUT', default=15, cast=float)
+NEWS_HTTP_RETRIES = config('NEWS_HTTP_RETRIES', default=2, cast=int)
+NEWS_HTTP_BACKOFF = config('NEWS_HTTP_BACKOFF', default=0.5, cast=float)
+NEWS_HTTP_BACKOFF_MAX = config('NEWS_HTTP_BACKOFF_MAX', default=8, cast=float)
+
+# Fuentes casi duplicadas (posts/dedup.py): distancia máxima en bits entre las
+# huellas SimHash de 64 bits para considerar dos textos la misma nota
+NEWS_DEDUP_MAX_DISTANCE = config('NEWS_DEDUP_MAX_DISTANCE', default=10, cast=int)
+
+# Contexto de fuentes en el prompt (posts/context_packing.py): tokens totales
+# repartidos entre las fuentes y mínimo por fuente para incluirla
+NEWS_CONTEXT_TOKEN_BUDGET = config('NEWS_CONTEXT_TOKEN_BUDGET', default=6000, cast=int)
+NEWS_CONTEXT_MIN_SOURCE_TOKENS = config('NEWS_CONTEXT_MIN_SOURCE_TOKENS', default=150, cast=int)
+
+# Caché persistente de artículos extraídos (posts/article_cache.py). Las páginas
+# sin ETag ni Last-Modified se reutilizan sin revalidar durante UNVALIDATED_TTL.
+NEWS_ARTICLE_CACHE_TTL = config('NEWS_ARTICLE_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+NEWS_ARTICLE_CACHE_UNVALIDATED_TTL = config('NEWS_ARTICLE_CACHE_UNVALIDATED_TTL', default=3600, cast=int)
+NEWS_ARTICLE_CACHE_MAX_BYTES = config('NEWS_ARTICLE_CACHE_MAX_BYTES', default=50 * 1024 * 1024, cast=int)
+
+# Generación con OpenAI. En modo 'single' fuentes y artículo salen de una sola
+# llamada con respuesta JSON estricta; 'multi' es el flujo de varias llamadas.
+NEWS_GENERATION_MODE = config('NEWS_GENERATION_MODE', default='multi')
+NEWS_ARTICLE_TARGET_WORDS = config('NEWS_ARTICLE_TARGET_WORDS', default=800, cast=int)
+NEWS_MAX_OUTPUT_TOKENS = config('NEWS_MAX_OUTPUT_TOKENS', default=16000, cast=int)
+
+# Streaming de respuestas: el contenido parcial se guarda cada N tokens o cada
+# tantos segundos, lo que ocurra primero
+NEWS_STREAM_COMPLETIONS = config('NEWS_STREAM_COMPLETIONS', default=True, cast=bool)
+NEWS_STREAM_FLUSH_TOKENS = config('NEWS_STREAM_FLUSH_TOKENS', default=64, cast=int)
+NEWS_STREAM_FLUSH_SECONDS = config('NEWS_STREAM_FLUSH_SECONDS', default=1.0, cast=float)
+
+# Pipeline asíncrono (python manage.py run_async_news_worker): generaciones en
+# curso por proceso y llamadas simultáneas a OpenAI
+NEWS_ASYNC_CONCURRENCY = config('NEWS_ASYNC_CONCURRENCY', default=20, cast=int)
+NEWS_ASYNC_OPENAI_CONCURRENCY = config('NEWS_ASYNC_OPENAI_CONCURRENCY', default=10, cast=int)
+
+# Límite de uso de OpenAI compartido entre procesos (posts/rate_limit.py). Ajustar
+# a los límites de la cuenta; la prioridad baja deja libre el margen RESERVE.
+NEWS_RATE_LIMIT_ENABLED = config('NEWS_RATE_LIMIT_ENABLED', default=True, cast=bool)
+NEWS_RATE_LIMIT_RPM = config('NEWS_RATE_LIMIT_RPM', default=500, cast=int)
+NEWS_RATE_LIMIT_TPM = config('NEWS_RATE_LIMIT_TPM', default=200000, cast=int)
+NEWS_RATE_LIMIT_RESERVE = config('NEWS_RATE_LIMIT_RESERVE', default=0.2, cast=float)
+NEWS_RATE_LIMIT_MAX_WAIT = config('NEWS_RATE_LIMIT_MAX_WAIT', default=120, cast=float)
+NEWS_RATE_LIMIT_POLL_INTERVAL = config('NEWS_RATE_LIMIT_POLL_INTERVAL', default=2, cast=float)
+NEWS_RATE_LIMIT_RETRIES = config('NEWS_RATE_LIMIT_RETRIES', default=3, cast=int)
+NEWS_RATE_LIMIT_BACKOFF = config('NEWS_RATE_LIMIT_BACKOFF', default=20, cast=float)
+
+# Precios del modelo en USD por millón de tokens, para el reporte de tramos del
+# admin (valores de gpt-4o-mini)
+NEWS_OPENAI_PROMPT_PRICE = config('NEWS_OPENAI_PROMPT_PRICE', default=0.15, cast=float)
+NEWS_OPENAI_COMPLETION_PRICE = config('NEWS_OPENAI_COMPLETION_PRICE', default=0.60, cast=float)
+
+# Generación por lotes (python manage.py process_news_batches). 'openai' usa la
+# Batch API; 'local' resuelve los lotes en el propio proceso (desarrollo y tests).
+NEWS_BATCH_BACKEND = config('NEWS_BATCH_BACKEND', default='openai')
+NEWS_BATCH_DIR = config('NEWS_BATCH_DIR', default=str(BASE_DIR / 'batches'))
+NEWS_BATCH_MAX_REQUESTS = config('NEWS_BATCH_MAX_REQUESTS', default=1000, cast=int)
+NEWS_BATCH_POLL_INTERVAL = config('NEWS_BATCH_POLL_INTERVAL', default=60, cast=float)
+
+# Caché de respuestas de OpenAI (posts/completion_cache.py). Cualquier alias de
+# CACHES sirve; el backend define la expiración y el desalojo.
+NEWS_COMPLETION_CACHE = config('NEWS_COMPLETION_CACHE', default='completions')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'completions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'completions',
+        'TIMEOUT': config('NEWS_COMPLETION_CACHE_TIMEOUT', default=7 * 24 * 3600, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('NEWS_COMPLETION_CACHE_MAX_ENTRIES', default=2000, cast=int),
+            'CULL_FREQUENCY': 4,  # al llenarse descarta 1/4 de las entradas
+        },
+    },
+}
+
+# Caché compartida entre procesos de las páginas públicas (posts/page_cache.py).
+# Con REDIS_URL se usa Redis; si no, archivos en disco, que también comparten
+# todos los workers de gunicorn del servidor. Con Redis las visitas de los posts
+# se acumulan ahí (posts/view_counts.py); sin Redis, en la memoria de cada
+# proceso, que las vuelca a la base cada VIEW_COUNT_FLUSH_INTERVAL segundos.
+REDIS_URL = config('REDIS_URL', default='')
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=30, cast=float)
+PAGE_CACHE = config('PAGE_CACHE', default='pages')
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=3600, cast=int)
+POPULAR_POSTS_COUNT = config('POPULAR_POSTS_COUNT', default=5, cast=int)
+
+
+def _shared_cache(name, timeout, max_entries):
+    if REDIS_URL:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': name,
+            'TIMEOUT': timeout,
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / name,
+        'TIMEOUT': timeout,
+        'OPTIONS': {'MAX_ENTRIES': max_entries},
+    }
+
+
+CACHES['pages'] = _shared_cache('pages', PAGE_CACHE_TIMEOUT, 5000)
+
+# Búsqueda de texto completo (ver posts/search.py). SEARCH_CONFIG es la
+# configuración de idioma de PostgreSQL; en SQLite se usa FTS5.
+SEARCH_CONFIG = config('SEARCH_CONFIG', default='spanish')
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=200, cast=int)
+
+# Variantes de Post.image para srcset (ver posts/images.py): anchos en px y
+# calidad de cada formato. Las genera `generate_image_variants --watch`, de a
+# POST_IMAGE_BATCH posts, revisando cada POST_IMAGE_POLL_INTERVAL segundos.
+POST_IMAGE_WIDTHS = config('POST_IMAGE_WIDTHS', default='480,960,1440', cast=Csv(int))
+POST_IMAGE_WEBP_QUALITY = config('POST_IMAGE_WEBP_QUALITY', default=80, cast=int)
+POST_IMAGE_JPEG_QUALITY = config('POST_IMAGE_JPEG_QUALITY', default=82, cast=int)
+POST_IMAGE_BATCH = config('POST_IMAGE_BATCH', default=5, cast=int)
+POST_IMAGE_POLL_INTERVAL = config('POST_IMAGE_POLL_INTERVAL', default=10, cast=float)
+
+# Tiempo de lectura de los posts (ver posts/rendering.py)
+READING_WORDS_PER_MINUTE = config('READING_WORDS_PER_MINUTE', default=200, cast=int)
@@ -18,12 +18,14 @@ from django.contrib import admin
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from posts.views import post_list, post_detail
+from posts.views import post_list, post_detail, category_detail, search_posts
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', post_list, name='post_list'),
     path('post/<slug:slug>/', post_detail, name='post_detail'),
+    path('category/<slug:slug>/', category_detail, name='category_detail'),
+    path('search/', search_posts, name='search'),
 ]
 
 if settings.DEBUG:
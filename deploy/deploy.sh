@@ -79,6 +79,48 @@ PrivateTmp=true
 WantedBy=multi-user.target
 EOF
 
+# Create systemd service for the news generation worker
+sudo tee /etc/systemd/system/radar-data-worker.service > /dev/null <<EOF
+[Unit]
+Description=Radar Data News Generation Worker
+After=network.target
+
+[Service]
+User=$USER
+Group=www-data
+WorkingDirectory=$PROJECT_PATH
+Environment="PATH=$PROJECT_PATH/venv/bin"
+Environment="DJANGO_SETTINGS_MODULE=core.settings.production"
+ExecStart=$PROJECT_PATH/venv/bin/python manage.py run_news_worker
+KillSignal=SIGTERM
+TimeoutStopSec=120
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# Create systemd service for the image variants worker
+sudo tee /etc/systemd/system/radar-data-images.service > /dev/null <<EOF
+[Unit]
+Description=Radar Data Image Variants Worker
+After=network.target
+
+[Service]
+User=$USER
+Group=www-data
+WorkingDirectory=$PROJECT_PATH
+Environment="PATH=$PROJECT_PATH/venv/bin"
+Environment="DJANGO_SETTINGS_MODULE=core.settings.production"
+ExecStart=$PROJECT_PATH/venv/bin/python manage.py generate_image_variants --watch
+KillSignal=SIGTERM
+TimeoutStopSec=60
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 # Configure Nginx
 sudo tee /etc/nginx/sites-available/radar-data > /dev/null <<EOF
 server {
@@ -110,6 +152,10 @@ sudo rm -f /etc/nginx/sites-enabled/default
 sudo systemctl daemon-reload
 sudo systemctl start radar-data
 sudo systemctl enable radar-data
+sudo systemctl start radar-data-worker
+sudo systemctl enable radar-data-worker
+sudo systemctl start radar-data-images
+sudo systemctl enable radar-data-images
 sudo systemctl restart nginx
 sudo systemctl enable nginx
 
@@ -122,5 +168,5 @@ echo "Deployment completed!"
 echo "Please:"
 echo "1. Edit .env file with your production settings"
 echo "2. Update Nginx config with your domain"
-echo "3. Restart services: sudo systemctl restart radar-data nginx"
+echo "3. Restart services: sudo systemctl restart radar-data radar-data-worker radar-data-images nginx"
 echo "4. Check status: sudo systemctl status radar-data nginx"
\ No newline at end of file
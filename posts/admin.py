@@ -1,13 +1,30 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.shortcuts import redirect
+from django.core.exceptions import PermissionDenied
 from django.http import JsonResponse
-from .models import Post, Category, NewsGeneration
-from .services_simple import SimpleNewsGenerationService, MockSimpleNewsGenerationService
-from decouple import config
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from datetime import timedelta
+from django.db.models import Avg, BooleanField, ExpressionWrapper, IntegerField, Q
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Length, Right
+from .models import Post, Category, NewsGeneration, ArticleCache, NewsBatch, GenerationSpan
+from . import batching, jobs, rendering, search, tracing
+
+class DeferredChangeList(ChangeList):
+    """
+    Listado que no trae las columnas grandes indicadas en `changelist_defer`
+    del ModelAdmin; el formulario de edición las sigue cargando completas
+    """
+
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(request, exclude_parameters).defer(*self.model_admin.changelist_defer)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -20,7 +37,11 @@ class CategoryAdmin(admin.ModelAdmin):
 class PostAdmin(admin.ModelAdmin):
     list_display = ('title', 'category', 'has_image', 'published', 'created_at')
     list_filter = ('published', 'category', 'created_at')
-    search_fields = ('title', 'content', 'meta_description')
+    list_select_related = ('category',)
+    changelist_defer = ('content', 'rendered_content', 'toc')
+    readonly_fields = ('word_count', 'reading_time')
+    # La búsqueda usa el índice de texto completo (ver get_search_results)
+    search_fields = ('title', 'excerpt', 'content', 'meta_keywords')
     prepopulated_fields = {"slug": ("title",)}
     
     fieldsets = (
@@ -32,27 +53,114 @@ class PostAdmin(admin.ModelAdmin):
             'classes': ('collapse',),
             'description': 'Optimización para motores de búsqueda'
         }),
+        ('Lectura', {
+            'fields': ('word_count', 'reading_time'),
+            'classes': ('collapse',),
+            'description': 'Calculado al guardar a partir del contenido'
+        }),
     )
     
     def has_image(self, obj):
         return bool(obj.image)
     has_image.boolean = True
     has_image.short_description = 'Imagen'
+    
+    def get_changelist(self, request, **kwargs):
+        return DeferredChangeList
+    
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
+
+@admin.register(ArticleCache)
+class ArticleCacheAdmin(admin.ModelAdmin):
+    list_display = ('url', 'hits', 'size', 'fetched_at', 'last_used_at')
+    search_fields = ('url', 'title')
+    readonly_fields = ('url_hash', 'url', 'title', 'content', 'etag', 'last_modified', 'size', 'hits', 'fetched_at', 'last_used_at')
+
+
+@admin.register(NewsBatch)
+class NewsBatchAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'remote_status', 'request_count', 'completed_count', 'failed_count', 'created_at', 'completed_at')
+    list_filter = ('status',)
+    readonly_fields = ('status', 'remote_id', 'remote_status', 'input_file', 'input_file_id', 'output_file_id', 'error_file_id',
+                       'request_count', 'completed_count', 'failed_count', 'error_message', 'created_at', 'checked_at', 'completed_at')
+    actions = ['poll_batches']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    @admin.action(description='Consultar estado de los lotes seleccionados')
+    def poll_batches(self, request, queryset):
+        client = batching.get_batch_client()
+        for batch in queryset.filter(status='SUBMITTED'):
+            batching.poll_batch(batch, client)
+        messages.success(request, "Lotes consultados")
+
+
+@admin.register(GenerationSpan)
+class GenerationSpanAdmin(admin.ModelAdmin):
+    list_display = ('generation', 'stage', 'label', 'duration_ms', 'prompt_tokens', 'completion_tokens', 'cached', 'error', 'started_at')
+    list_filter = ('stage', 'cached', 'started_at')
+    list_select_related = ('generation',)
+    search_fields = ('label', 'error')
+    readonly_fields = ('generation', 'stage', 'label', 'started_at', 'duration_ms', 'prompt_tokens', 'completion_tokens', 'cached', 'error')
+    change_list_template = 'admin/posts/generationspan/change_list.html'
+    
+    REPORT_DAYS = (1, 7, 30)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def get_urls(self):
+        from django.urls import path
+        custom_urls = [
+            path('report/', self.admin_site.admin_view(self.report_view), name='generationspan_report'),
+        ]
+        return custom_urls + super().get_urls()
+    
+    def report_view(self, request):
+        """
+        Latencia p50/p95/p99, tokens y costo por etapa en los últimos días
+        """
+        try:
+            days = int(request.GET.get('days', 7))
+        except ValueError:
+            days = 7
+        # Sin tope el reporte recorrería toda la historia de tramos
+        days = min(max(days, 1), max(self.REPORT_DAYS))
+        totals, daily = tracing.stage_report(timezone.now() - timedelta(days=days))
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title='Tiempos y tokens por etapa',
+            days=days,
+            day_options=self.REPORT_DAYS,
+            tables=[(title, rows) for title, rows in (('Total del período', totals), ('Por día', daily)) if rows],
+        )
+        return TemplateResponse(request, 'admin/posts/generationspan/report.html', context)
 
 
 @admin.register(NewsGeneration)
 class NewsGenerationAdmin(admin.ModelAdmin):
     list_display = ('id', 'tags_display', 'status_display', 'total_sources_found', 'created_by', 'created_at', 'actions_column')
     list_filter = ('status', 'created_by', 'created_at')
+    list_select_related = ('created_by',)
+    # El listado sólo muestra tags y estado: sin el HTML generado ni los JSON
+    changelist_defer = ('manual_urls', 'generated_content', 'source_articles', 'generation_metadata', 'error_message')
     search_fields = ('tags', 'generated_title', 'error_message')
-    readonly_fields = ('created_by', 'created_at', 'completed_at', 'total_sources_found', 'source_articles', 'error_message', 'published_post')
+    readonly_fields = ('created_by', 'created_at', 'completed_at', 'total_sources_found', 'source_articles', 'generation_metadata', 'error_message', 'published_post',
+                       'attempts', 'available_at', 'locked_by', 'locked_until', 'batch')
+    actions = ['requeue_generations', 'submit_batch_generations']
     
     fieldsets = (
         ('Configuración', {
-            'fields': ('tags', 'manual_urls', 'status', 'created_by', 'created_at')
+            'fields': ('tags', 'manual_urls', 'bypass_completion_cache', 'status', 'created_by', 'created_at')
         }),
         ('Resultados de Búsqueda', {
-            'fields': ('total_sources_found', 'source_articles'),
+            'fields': ('total_sources_found', 'source_articles', 'generation_metadata'),
             'classes': ('collapse',),
         }),
         ('Contenido Generado por IA', {
@@ -63,6 +171,10 @@ class NewsGenerationAdmin(admin.ModelAdmin):
             'fields': ('completed_at', 'error_message', 'published_post'),
             'classes': ('collapse',),
         }),
+        ('Cola de procesamiento', {
+            'fields': ('attempts', 'available_at', 'locked_by', 'locked_until', 'batch'),
+            'classes': ('collapse',),
+        }),
     )
     
     def save_model(self, request, obj, form, change):
@@ -70,22 +182,49 @@ class NewsGenerationAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
         
-        # Si es nueva generación, procesarla automáticamente
+        # Si es nueva generación, dejarla en la cola para los workers
+        # (python manage.py run_news_worker) en lugar de procesarla en el request
         if not change and obj.status == 'PENDING':
-            try:
-                # Decidir si usar OpenAI real o simulado
-                api_key = config('OPENAI_API_KEY', default='')
-                if api_key and api_key != 'your-openai-api-key-here' and len(api_key) > 20:
-                    service = SimpleNewsGenerationService()
-                    messages.info(request, f"Procesando con OpenAI real...")
-                else:
-                    service = MockSimpleNewsGenerationService()
-                    messages.info(request, f"Procesando con IA simulada (configura OpenAI para usar IA real)...")
-                
-                service.process_news_generation(obj.id)
-                messages.success(request, f"Generación #{obj.id} procesada exitosamente")
-            except Exception as e:
-                messages.error(request, f"Error procesando generación: {str(e)}")
+            jobs.enqueue(obj)
+            messages.info(request, f"Generación #{obj.id} encolada; se procesará en segundo plano")
+    
+    @admin.action(description='Reencolar generaciones seleccionadas')
+    def requeue_generations(self, request, queryset):
+        count = 0
+        for news_gen in queryset.exclude(status__in=['PUBLISHED', 'SEARCHING', 'GENERATING']):
+            jobs.enqueue(news_gen)
+            count += 1
+        messages.success(request, f"{count} generaciones reencoladas")
+    
+    @admin.action(description='Generar en lote (Batch API)')
+    def submit_batch_generations(self, request, queryset):
+        batch = batching.submit_batch(queryset, limit=queryset.count())
+        if batch is None:
+            messages.warning(request, "Ninguna generación seleccionada está pendiente y sin URLs manuales")
+        elif batch.status == 'FAILED':
+            messages.error(request, f"No se pudo enviar el lote: {batch.error_message}")
+        else:
+            messages.success(request, f"{batch.request_count} generaciones enviadas en el lote #{batch.pk}")
+    
+    def get_queryset(self, request):
+        # Para la columna de acciones sin leer generated_content
+        return super().get_queryset(request).annotate(
+            has_content=ExpressionWrapper(~Q(generated_content=''), output_field=BooleanField()),
+        )
+    
+    def get_changelist(self, request, **kwargs):
+        return DeferredChangeList
+    
+    def changelist_view(self, request, extra_context=None):
+        # Promedio de llamadas a OpenAI por generación (registrado en generation_metadata)
+        recent = NewsGeneration.objects.filter(generation_metadata__has_key='api_calls').order_by('-created_at')[:200]
+        average = NewsGeneration.objects.filter(pk__in=recent.values('pk')).aggregate(
+            avg=Avg(Cast(KeyTextTransform('api_calls', 'generation_metadata'), IntegerField()))
+        )['avg']
+        if average is not None:
+            extra_context = extra_context or {}
+            extra_context.setdefault('subtitle', f"Promedio de llamadas a la API por generación (últimas 200): {average:.2f}")
+        return super().changelist_view(request, extra_context=extra_context)
     
     def tags_display(self, obj):
         if len(obj.tags) > 50:
@@ -113,14 +252,18 @@ class NewsGenerationAdmin(admin.ModelAdmin):
     def actions_column(self, obj):
         buttons = []
         
-        if obj.status == 'COMPLETED' and obj.can_publish:
+        if obj.status == 'COMPLETED' and obj.generated_title and obj.has_content:
             publish_url = reverse('admin:news_publish', args=[obj.pk])
             buttons.append(f'<a href="{publish_url}" class="button" style="background: #417690; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px; margin-right: 5px;">Publicar</a>')
         
-        if obj.generated_content:
+        if obj.has_content:
             preview_url = reverse('admin:news_preview', args=[obj.pk])
             buttons.append(f'<a href="{preview_url}" class="button" target="_blank" style="background: #79aec8; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px;">Vista Previa</a>')
         
+        if obj.status in jobs.ACTIVE_STATUSES:
+            progress_url = reverse('admin:news_progress', args=[obj.pk])
+            buttons.append(f'<a href="{progress_url}" class="button" target="_blank" style="background: #999; color: white; padding: 5px 10px; text-decoration: none; border-radius: 3px;">Progreso</a>')
+        
         return format_html(''.join(buttons))
     actions_column.short_description = 'Acciones'
     
@@ -130,9 +273,30 @@ class NewsGenerationAdmin(admin.ModelAdmin):
         custom_urls = [
             path('<int:news_id>/publish/', self.admin_site.admin_view(self.publish_news), name='news_publish'),
             path('<int:news_id>/preview/', self.admin_site.admin_view(self.preview_news), name='news_preview'),
+            path('<int:news_id>/progress/', self.admin_site.admin_view(self.news_progress), name='news_progress'),
         ]
         return custom_urls + urls
     
+    def news_progress(self, request, news_id):
+        """
+        Progreso de una generación en curso, para consultar periódicamente sin
+        recargar el listado. Sólo lee las columnas necesarias y el final del
+        contenido parcial.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        progress = NewsGeneration.objects.filter(pk=news_id).annotate(
+            content_chars=Length('generated_content'),
+            content_tail=Right('generated_content', 500),
+        ).values(
+            'status', 'progress_tokens', 'progress_updated_at', 'generated_title',
+            'error_message', 'content_chars', 'content_tail',
+        ).first()
+        
+        if progress is None:
+            return JsonResponse({'error': 'Generación no encontrada'}, status=404)
+        return JsonResponse(progress)
+    
     def publish_news(self, request, news_id):
         """
         Publica la noticia generada como un nuevo Post
@@ -206,7 +370,7 @@ class NewsGenerationAdmin(admin.ModelAdmin):
                 </div>
                 
                 <div class="content">
-                    {news_gen.generated_content}
+                    {rendering.render(news_gen.generated_content)['content']}
                 </div>
                 
                 <div class="sources">
@@ -245,6 +409,7 @@ class NewsGenerationAdmin(admin.ModelAdmin):
                         <div class="source-item">
                             <strong>{i}. {source.get('title', source.get('source_name', 'Sin título'))}</strong><br>
                             <small>{source.get('description', '')}</small>
+                            {f"<br><small><em>Casi duplicado de {source['duplicate_of']}; no se incluyó en el prompt</em></small>" if source.get('duplicate_of') else ''}
                         </div>
                     """
             
@@ -0,0 +1,138 @@
+"""
+Caché persistente de artículos extraídos desde URLs fuente.
+
+Las entradas se guardan por URL canónica junto con el ETag/Last-Modified de la
+respuesta original. Al volver a usar una URL se hace un GET condicional: si la
+página no cambió el servidor contesta 304 y se reutiliza el texto ya extraído,
+sin descargar ni parsear el HTML otra vez. Cada 304 renueva fetched_at, así que
+el TTL cuenta desde la última vez que el servidor confirmó la entrada.
+
+Las páginas sin ETag ni Last-Modified no se pueden revalidar: se guardan igual
+y se reutilizan sin hacer ninguna petición durante
+NEWS_ARTICLE_CACHE_UNVALIDATED_TTL; después se descargan de nuevo.
+
+Las entradas más viejas que el TTL se descartan y, si la caché supera su
+tamaño máximo, se eliminan las menos usadas recientemente.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArticleCache
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de tracking que no cambian el contenido de la página
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+def url_hash(url):
+    return hashlib.sha256(canonical_url(url).encode('utf-8')).hexdigest()
+
+
+def revalidates(entry):
+    """
+    True si la entrada se puede revalidar con un GET condicional
+    """
+    return bool(entry.etag or entry.last_modified)
+
+
+def lookup_many(urls):
+    """
+    Devuelve {url: ArticleCache} con las entradas vigentes para las URLs dadas
+    """
+    hashes = {url_hash(url): url for url in urls}
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.NEWS_ARTICLE_CACHE_TTL)
+    unvalidated_cutoff = now - timedelta(seconds=settings.NEWS_ARTICLE_CACHE_UNVALIDATED_TTL)
+    entries = ArticleCache.objects.filter(url_hash__in=hashes, fetched_at__gte=cutoff).exclude(
+        etag='', last_modified='', fetched_at__lt=unvalidated_cutoff,
+    )
+    return {hashes[entry.url_hash]: entry for entry in entries}
+
+
+def record_results(articles, cached):
+    """
+    Guarda las extracciones nuevas, marca las revalidadas y devuelve las
+    estadísticas de uso de la caché para el lote.
+    """
+    now = timezone.now()
+    stats = {'hits': 0, 'misses': 0}
+
+    for article in articles:
+        status = article.get('cache_status')
+        if status == 'hit':
+            stats['hits'] += 1
+            entry = cached[article['url']]
+            fields = {'last_used_at': now, 'hits': F('hits') + 1}
+            if revalidates(entry):
+                # El servidor contestó 304: la entrada vuelve a estar al día
+                fields['fetched_at'] = now
+            ArticleCache.objects.filter(pk=entry.pk).update(**fields)
+        elif status == 'miss':
+            stats['misses'] += 1
+            _store(article, now)
+
+    if stats['misses']:
+        evict()
+    return stats
+
+
+def _store(article, now):
+    content = article['content']
+    ArticleCache.objects.update_or_create(
+        url_hash=url_hash(article['url']),
+        defaults={
+            'url': canonical_url(article['url']),
+            'title': article['title'][:500],
+            'content': content,
+            'published_at': (article.get('published_at') or '')[:64],
+            'image': article.get('image') or '',
+            'etag': (article.get('etag') or '')[:255],
+            'last_modified': (article.get('last_modified') or '')[:64],
+            'size': len(content.encode('utf-8')) + len(article['title']),
+            'fetched_at': now,
+            'last_used_at': now,
+        },
+    )
+
+
+def evict():
+    """
+    Elimina entradas vencidas y, si hace falta, las menos usadas hasta
+    volver a quedar por debajo del tamaño máximo.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.NEWS_ARTICLE_CACHE_TTL)
+    expired, _ = ArticleCache.objects.filter(fetched_at__lt=cutoff).delete()
+
+    budget = settings.NEWS_ARTICLE_CACHE_MAX_BYTES
+    total = 0
+    overflow = []
+    for pk, size in ArticleCache.objects.order_by('-last_used_at').values_list('id', 'size').iterator():
+        total += size
+        if total > budget:
+            overflow.append(pk)
+    if overflow:
+        ArticleCache.objects.filter(pk__in=overflow).delete()
+
+    if expired or overflow:
+        logger.info(f"Caché de artículos: {expired} vencidos y {len(overflow)} desalojados por tamaño")
@@ -0,0 +1,354 @@
+"""
+Generación de noticias por lotes con la Batch API de OpenAI.
+
+Las generaciones PENDING sin URLs manuales se agrupan en un archivo JSONL (una
+petición de chat completion por fila, con el mismo prompt del modo de llamada
+única) que se sube y se envía como batch. Mientras el lote está en curso las
+filas quedan en GENERATING y sin lease, así que los workers de la cola no las
+toman. Al consultar un lote terminado los resultados se vuelcan en cada fila;
+las que fallaron vuelven a la cola normal (ver posts/jobs.py).
+
+Las filas con URLs manuales necesitan descargar sus fuentes antes del prompt y
+siguen yendo por el worker.
+"""
+import json
+import logging
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import openai
+from decouple import config
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NewsBatch, NewsGeneration
+from .services_simple import RESULT_FIELDS, OpenAINewsGenerator, apply_generation_result, simulated_sources
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+COMPLETION_WINDOW = '24h'
+
+# Estados terminales de un batch en OpenAI
+FINISHED_STATUSES = ('completed',)
+FAILED_STATUSES = ('failed', 'expired', 'cancelled')
+
+
+def get_batch_client():
+    if settings.NEWS_BATCH_BACKEND == 'local':
+        return LocalBatchClient()
+    return openai.OpenAI(api_key=config('OPENAI_API_KEY', default=''))
+
+
+def batchable(queryset=None):
+    """
+    Generaciones que pueden ir en un lote
+    """
+    queryset = NewsGeneration.objects.all() if queryset is None else queryset
+    return queryset.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=timezone.now()),
+        status='PENDING',
+        manual_urls='',
+    )
+
+
+def custom_id(pk):
+    return f"news-{pk}"
+
+
+def build_requests(generations, generator):
+    """
+    Una línea del JSONL de la Batch API por generación
+    """
+    lines = []
+    for news_gen in generations:
+        prompt, params = generator.single_call_request(', '.join(news_gen.tags_list))
+        lines.append({
+            'custom_id': custom_id(news_gen.pk),
+            'method': 'POST',
+            'url': BATCH_ENDPOINT,
+            'body': dict(params, model=generator.model, messages=[{"role": "user", "content": prompt}]),
+        })
+    return lines
+
+
+def submit_batch(queryset=None, limit=None, client=None):
+    """
+    Arma y envía un lote con hasta `limit` generaciones. Devuelve el NewsBatch
+    creado o None si no había nada para enviar.
+    """
+    limit = limit or settings.NEWS_BATCH_MAX_REQUESTS
+    ids = list(batchable(queryset).order_by('available_at', 'id').values_list('id', flat=True)[:limit])
+    if not ids:
+        return None
+
+    # Sólo pasan al lote las filas que sigan disponibles (un worker pudo tomar alguna)
+    batch = NewsBatch.objects.create()
+    batchable(NewsGeneration.objects.filter(pk__in=ids)).update(status='GENERATING', batch=batch, progress_tokens=0)
+    generations = list(NewsGeneration.objects.filter(batch=batch, status='GENERATING').order_by('id').only('id', 'tags'))
+    if not generations:
+        batch.delete()
+        return None
+
+    generator = OpenAINewsGenerator()
+    path = Path(settings.NEWS_BATCH_DIR) / f"batch_{batch.pk}_input.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        for line in build_requests(generations, generator):
+            handle.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+    batch.input_file = str(path)
+    batch.request_count = len(generations)
+
+    client = client or get_batch_client()
+    try:
+        with open(path, 'rb') as handle:
+            uploaded = client.files.create(file=handle, purpose='batch')
+        remote = client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+            metadata={'news_batch': str(batch.pk)},
+        )
+    except Exception as e:
+        logger.error(f"Error enviando el lote {batch.pk}: {e}")
+        batch.status = 'FAILED'
+        batch.error_message = str(e)
+        batch.save()
+        _requeue_pending(batch, f"No se pudo enviar el lote: {e}")
+        return batch
+
+    batch.input_file_id = uploaded.id
+    batch.remote_id = remote.id
+    batch.remote_status = remote.status
+    batch.save()
+    logger.info(f"Lote {batch.pk} enviado ({batch.request_count} generaciones, batch {remote.id})")
+    return batch
+
+
+def poll_batch(batch, client=None):
+    """
+    Consulta el estado del lote y, si terminó, vuelca los resultados en cada generación
+    """
+    client = client or get_batch_client()
+    remote = client.batches.retrieve(batch.remote_id)
+    batch.remote_status = remote.status
+    batch.checked_at = timezone.now()
+
+    if remote.status in FINISHED_STATUSES:
+        batch.output_file_id = remote.output_file_id or ''
+        batch.error_file_id = remote.error_file_id or ''
+        completed = failed = 0
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                ok, ko = _apply_results(batch, client.files.content(file_id).text)
+                completed += ok
+                failed += ko
+        failed += _requeue_pending(batch, 'El lote terminó sin respuesta para esta generación')
+
+        batch.status = 'COMPLETED'
+        batch.completed_count = completed
+        batch.failed_count = failed
+        batch.completed_at = timezone.now()
+        logger.info(f"Lote {batch.pk} terminado: {completed} completadas, {failed} reencoladas")
+
+    elif remote.status in FAILED_STATUSES:
+        batch.status = 'FAILED'
+        batch.error_message = _remote_errors(remote) or remote.status
+        batch.failed_count = _requeue_pending(batch, f"El lote terminó en estado {remote.status}")
+        batch.completed_at = timezone.now()
+        logger.error(f"Lote {batch.pk} falló ({remote.status}); generaciones reencoladas")
+
+    batch.save()
+    return batch
+
+
+def poll_open_batches(client=None):
+    client = client or get_batch_client()
+    return [poll_batch(batch, client) for batch in NewsBatch.objects.filter(status='SUBMITTED')]
+
+
+def _apply_results(batch, text):
+    generator = OpenAINewsGenerator()
+    completed = failed = 0
+
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        try:
+            pk = int(record['custom_id'].rsplit('-', 1)[1])
+        except (KeyError, IndexError, ValueError):
+            logger.warning(f"Lote {batch.pk}: línea sin custom_id válido")
+            continue
+
+        news_gen = NewsGeneration.objects.filter(pk=pk, batch=batch, status='GENERATING').first()
+        if news_gen is None:
+            continue
+
+        response = record.get('response') or {}
+        try:
+            if record.get('error') or response.get('status_code') != 200:
+                raise ValueError((record.get('error') or {}).get('message') or f"HTTP {response.get('status_code')}")
+            body = response['body']
+            generator.reset_metadata()
+            generated = generator.parse_single_call_result(body['choices'][0]['message']['content'])
+        except Exception as e:
+            _requeue(news_gen, f"Lote {batch.pk}: {e}")
+            failed += 1
+            continue
+
+        usage = body.get('usage') or {}
+        metadata = dict(
+            generator.metadata,
+            generation_mode='batch',
+            api_calls=1,
+            batch=batch.pk,
+            prompt_tokens=usage.get('prompt_tokens', 0),
+            completion_tokens=usage.get('completion_tokens', 0),
+        )
+        apply_generation_result(news_gen, generated, simulated_sources(news_gen.tags_list), metadata)
+        news_gen.save(update_fields=RESULT_FIELDS)
+        completed += 1
+
+    return completed, failed
+
+
+def _requeue(news_gen, reason):
+    """
+    Devuelve la generación a la cola de los workers. El lote cuenta como un
+    intento: sin reintentos disponibles la generación queda en ERROR.
+    """
+    rows = NewsGeneration.objects.filter(pk=news_gen.pk)
+    attempts = (rows.values_list('attempts', flat=True).first() or 0) + 1
+    max_attempts = settings.NEWS_WORKER_MAX_ATTEMPTS
+
+    if attempts >= max_attempts:
+        rows.update(
+            status='ERROR',
+            attempts=attempts,
+            error_message=f"Falló tras {attempts} intentos: {reason}",
+            locked_by='',
+            locked_until=None,
+        )
+        logger.error(f"Generación {news_gen.pk} marcada como ERROR tras {attempts} intentos: {reason}")
+        return
+
+    rows.update(
+        status='PENDING',
+        available_at=timezone.now(),
+        attempts=attempts,
+        error_message=reason,
+        locked_by='',
+        locked_until=None,
+    )
+    logger.warning(f"Generación {news_gen.pk} reencolada (intento {attempts}/{max_attempts}): {reason}")
+
+
+def _requeue_pending(batch, reason):
+    pending = list(NewsGeneration.objects.filter(batch=batch, status='GENERATING'))
+    for news_gen in pending:
+        _requeue(news_gen, reason)
+    return len(pending)
+
+
+def _remote_errors(remote):
+    errors = getattr(remote, 'errors', None)
+    data = getattr(errors, 'data', None) or []
+    return '; '.join(getattr(error, 'message', '') or '' for error in data)
+
+
+def sample_response(body):
+    """
+    Respuesta JSON de ejemplo para el cliente local
+    """
+    return json.dumps({
+        'sources': [{'name': 'Fuente de ejemplo', 'type': 'Blog', 'focus': 'General', 'key_points': []}],
+        'title': 'Artículo generado en lote',
+        'excerpt': 'Resumen del artículo generado en lote.',
+        'content': '<p>' + 'Contenido generado en lote. ' * 80 + '</p>',
+        'meta_description': 'Artículo generado en lote.',
+        'meta_keywords': 'lote, noticias',
+    })
+
+
+class LocalBatchClient:
+    """
+    Implementación local de la parte de la API de OpenAI que usa este módulo
+    (files.create/content y batches.create/retrieve). Cada petición se responde
+    con `responder(body)`; si lanza una excepción la línea va al archivo de
+    errores. Los archivos se guardan en NEWS_BATCH_DIR/local, así que el estado
+    sobrevive entre ejecuciones del comando.
+    """
+
+    def __init__(self, responder=None, directory=None):
+        self.responder = responder or sample_response
+        self.directory = Path(directory or settings.NEWS_BATCH_DIR) / 'local'
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _path(self, object_id):
+        return self.directory / object_id
+
+    def _create_file(self, file, purpose):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file_id = f"file-{uuid.uuid4().hex[:16]}"
+        self._path(file_id).write_bytes(file.read())
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id):
+        return SimpleNamespace(text=self._path(file_id).read_text(encoding='utf-8'))
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata=None):
+        batch_id = f"batch-{uuid.uuid4().hex[:16]}"
+        output, errors = [], []
+
+        for line in self._file_content(input_file_id).text.splitlines():
+            request = json.loads(line)
+            try:
+                content = self.responder(request['body'])
+            except Exception as e:
+                errors.append({
+                    'id': f"req-{uuid.uuid4().hex[:12]}", 'custom_id': request['custom_id'],
+                    'response': None, 'error': {'code': 'server_error', 'message': str(e)},
+                })
+                continue
+            output.append({
+                'id': f"req-{uuid.uuid4().hex[:12]}", 'custom_id': request['custom_id'], 'error': None,
+                'response': {'status_code': 200, 'body': {
+                    'model': request['body'].get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                }},
+            })
+
+        state = {
+            'id': batch_id,
+            'status': 'completed',
+            'output_file_id': self._write_results(output),
+            'error_file_id': self._write_results(errors),
+            'request_counts': {'total': len(output) + len(errors), 'completed': len(output), 'failed': len(errors)},
+        }
+        self._path(batch_id).write_text(json.dumps(state), encoding='utf-8')
+        return self._retrieve_batch(batch_id)
+
+    def _retrieve_batch(self, batch_id):
+        state = json.loads(self._path(batch_id).read_text(encoding='utf-8'))
+        return SimpleNamespace(
+            id=state['id'],
+            status=state['status'],
+            output_file_id=state['output_file_id'],
+            error_file_id=state['error_file_id'],
+            request_counts=SimpleNamespace(**state['request_counts']),
+            errors=None,
+        )
+
+    def _write_results(self, records):
+        if not records:
+            return None
+        file_id = f"file-{uuid.uuid4().hex[:16]}"
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        self._path(file_id).write_text(lines, encoding='utf-8')
+        return file_id
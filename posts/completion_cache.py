@@ -0,0 +1,55 @@
+"""
+Caché de respuestas de chat completions.
+
+La clave combina modelo, hash del prompt y parámetros de la petición, así que
+sólo se reutiliza una respuesta ante una petición idéntica. El almacenamiento
+es cualquier backend de la caché de Django (alias NEWS_COMPLETION_CACHE); la
+expiración y la política de desalojo son las del backend configurado (TIMEOUT,
+MAX_ENTRIES y CULL_FREQUENCY en CACHES).
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionCache:
+    prefix = 'completion'
+
+    def __init__(self, alias=None):
+        self.alias = alias or settings.NEWS_COMPLETION_CACHE
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, model, messages, params):
+        payload = json.dumps({'messages': messages, 'params': params}, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return f"{self.prefix}:{model}:{digest}"
+
+    def get(self, key):
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            # La caché nunca debe impedir una generación
+            logger.warning(f"Caché de completions no disponible: {e}")
+            return None
+
+    def set(self, key, entry):
+        if not entry.get('content'):
+            return
+        try:
+            self.cache.set(key, entry)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en la caché de completions: {e}")
+
+    def delete(self, key):
+        try:
+            self.cache.delete(key)
+        except Exception as e:
+            logger.warning(f"No se pudo borrar de la caché de completions: {e}")
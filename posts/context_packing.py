@@ -0,0 +1,198 @@
+"""
+Armado del contexto de fuentes para el prompt con un presupuesto de tokens.
+
+En lugar de cortar cada fuente a un largo fijo, NEWS_CONTEXT_TOKEN_BUDGET se
+reparte entre todas: las fuentes cortas entran completas y lo que no usan pasa
+a las demás. Una fuente que no cabe en su parte se resume de forma extractiva:
+se puntúan sus oraciones (palabras frecuentes en el texto, coincidencia con los
+tags y posición en la nota) y se toman las mejores que entren, en su orden
+original.
+
+Los tokens se cuentan con tiktoken para el modelo de destino; sin tiktoken (o
+sin su archivo de codificación) se usa la estimación de posts/rate_limit.py.
+"""
+import functools
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+
+from .rate_limit import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken es opcional
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_ENCODING = 'o200k_base'
+
+# Las primeras oraciones de una nota suelen resumirla
+LEAD_BONUS = 0.5
+TAG_BONUS = 0.3
+
+# Oraciones más cortas (pies de foto, créditos) sólo entran si sobra lugar
+MIN_SENTENCE_WORDS = 6
+
+_sentences = re.compile(r'(?<=[.!?…])\s+(?=[¿¡"“«(\w])|\n+')
+_words = re.compile(r'\w+', re.UNICODE)
+
+STOPWORDS = frozenset("""
+    a al algo como con cual cuando de del desde donde durante el ella ellas ellos en entre era es esa ese eso esta
+    este esto fue ha han hasta hay la las le les lo los mas más muy no nos o para pero por que qué se ser si sin
+    sobre son su sus también tiene un una uno unos unas y ya
+    about after also and are as at be been but by can for from has have he her his in into is it its more not of
+    on or our she that the their they this to was were which will with would you
+""".split())
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        # Sin red tiktoken no puede descargar la codificación la primera vez
+        logger.warning(f"tiktoken no disponible para {model} ({e}); se estiman los tokens")
+        return None
+
+
+def tokenizer_name(model):
+    return 'tiktoken' if _encoding(model) is not None else 'estimate'
+
+
+def count_tokens(text, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in _sentences.split(text) if sentence and sentence.strip()]
+
+
+def _content_words(text):
+    return [word for word in _words.findall(text.lower()) if len(word) > 2 and word not in STOPWORDS]
+
+
+def rank_sentences(sentences, tags=()):
+    """
+    Puntaje de cada oración: frecuencia media (normalizada) de sus palabras en
+    todo el texto, más bonos por tags y por estar al principio
+    """
+    words = [_content_words(sentence) for sentence in sentences]
+    frequencies = Counter(word for sentence_words in words for word in sentence_words)
+    top = max(frequencies.values(), default=1)
+    tag_words = {word for tag in tags for word in _content_words(tag)}
+
+    scores = []
+    for index, sentence_words in enumerate(words):
+        if not sentence_words:
+            scores.append(0.0)
+            continue
+        score = sum(frequencies[word] for word in sentence_words) / top / len(sentence_words)
+        score += TAG_BONUS * len(tag_words.intersection(sentence_words))
+        score += LEAD_BONUS / (index + 1)
+        if len(sentence_words) < MIN_SENTENCE_WORDS:
+            score /= 4
+        scores.append(score)
+    return scores
+
+
+def summarize(text, max_tokens, model, tags=()):
+    """
+    Extracto de `text` de hasta `max_tokens` tokens con las oraciones mejor
+    puntuadas, en el orden en que aparecen
+    """
+    sentences = split_sentences(text)
+    scores = rank_sentences(sentences, tags)
+    chosen = []
+    remaining = max_tokens
+    for index in sorted(range(len(sentences)), key=lambda i: -scores[i]):
+        # +1 por el espacio que las une
+        tokens = count_tokens(sentences[index], model) + 1
+        if tokens <= remaining:
+            chosen.append(index)
+            remaining -= tokens
+
+    if not chosen:
+        # Texto sin puntuación o una sola oración enorme
+        return truncate_tokens(text, max_tokens, model)
+    return ' '.join(sentences[i] for i in sorted(chosen))
+
+
+def allocate(sizes, budget):
+    """
+    Reparte `budget` entre fuentes de `sizes` tokens: ninguna recibe más de lo
+    que necesita y el sobrante de las chicas se divide entre las grandes
+    """
+    shares = [0] * len(sizes)
+    remaining = budget
+    pending = len(sizes)
+    for index in sorted(range(len(sizes)), key=lambda i: sizes[i]):
+        shares[index] = min(sizes[index], remaining // pending)
+        remaining -= shares[index]
+        pending -= 1
+    return shares
+
+
+def _header(number, article):
+    return f"\nArtículo {number} - {article['title']}\nURL: {article['url']}\nContenido: "
+
+
+def pack_sources(articles, model, tags=(), budget=None):
+    """
+    Devuelve (contexto, estadísticas) para las fuentes en `articles`
+    respetando el presupuesto de tokens
+    """
+    budget = settings.NEWS_CONTEXT_TOKEN_BUDGET if budget is None else budget
+    min_tokens = settings.NEWS_CONTEXT_MIN_SOURCE_TOKENS
+
+    # Con demasiadas fuentes las últimas quedan afuera antes que dejar a todas sin
+    # texto: cada fuente admitida reserva su encabezado y min_tokens de contenido
+    included = []
+    spent = 0
+    reserved = 0
+    for article in articles:
+        header_tokens = count_tokens(_header(len(included) + 1, article), model) + 1
+        if spent + header_tokens + reserved + min_tokens > budget and included:
+            break
+        included.append((article, header_tokens))
+        spent += header_tokens
+        reserved += min_tokens
+
+    sizes = [count_tokens(article['content'], model) for article, _ in included]
+    shares = allocate(sizes, max(budget - spent, 0))
+
+    parts = []
+    summarized = 0
+    for number, ((article, _), size, share) in enumerate(zip(included, sizes, shares), 1):
+        content = article['content']
+        if size > share:
+            content = summarize(content, share, model, tags)
+            summarized += 1
+        parts.append(f"{_header(number, article)}{content}\n")
+
+    context = ''.join(parts)
+    return context, {
+        'budget': budget,
+        'tokens': count_tokens(context, model),
+        'sources': len(included),
+        'summarized': summarized,
+        'omitted': len(articles) - len(included),
+        'tokenizer': tokenizer_name(model),
+    }
@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import sidebar
+
+
+def sidebar_data(request):
+    """
+    Populares y categorías del sidebar; sólo se leen si la plantilla los usa
+    """
+    return {
+        'popular_posts': SimpleLazyObject(sidebar.popular_posts),
+        'sidebar_categories': SimpleLazyObject(sidebar.categories),
+    }
@@ -0,0 +1,91 @@
+"""
+Detección de fuentes casi duplicadas (p.ej. copias sindicadas de un mismo
+cable de agencia) antes de armar el prompt.
+
+Cada texto extraído se resume en un SimHash de 64 bits calculado sobre
+shingles de 3 palabras: textos casi iguales dan huellas a pocos bits de
+distancia (Hamming). Los artículos cuya distancia no supera
+NEWS_DEDUP_MAX_DISTANCE se agrupan y de cada grupo se conserva la copia más
+completa; las demás quedan marcadas con `duplicate_of`.
+"""
+import hashlib
+import re
+from collections import Counter
+
+from django.conf import settings
+
+SHINGLE_SIZE = 3
+HASH_BITS = 64
+
+# Por debajo de este largo la huella no es confiable
+MIN_DEDUP_CHARS = 300
+
+_words = re.compile(r'\w+', re.UNICODE)
+
+
+def simhash(text):
+    words = _words.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = Counter([' '.join(words)])
+    else:
+        shingles = Counter(' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+    weights = [0] * HASH_BITS
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(HASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _richness(article):
+    return (len(article['content']), bool(article.get('published_at')), bool(article.get('image')))
+
+
+def merge_near_duplicates(articles, max_distance=None):
+    """
+    Devuelve (únicos, estadísticas). Los únicos conservan el orden de aparición
+    de cada grupo; en los artículos descartados se agrega `duplicate_of` (URL de
+    la copia conservada) y `similarity` (bits en común sobre 64).
+    """
+    max_distance = settings.NEWS_DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+    groups = []  # [(huella, [artículos])]
+
+    for article in articles:
+        # Los errores de extracción y los textos muy cortos no se agrupan
+        if article.get('cache_status') is None or len(article['content']) < MIN_DEDUP_CHARS:
+            groups.append((None, [article]))
+            continue
+
+        fingerprint = simhash(article['content'])
+        for group_fingerprint, members in groups:
+            if group_fingerprint is not None and distance(fingerprint, group_fingerprint) <= max_distance:
+                members.append(article)
+                article['_fingerprint'] = fingerprint
+                break
+        else:
+            article['_fingerprint'] = fingerprint
+            groups.append((fingerprint, [article]))
+
+    unique = []
+    duplicates = 0
+    chars_saved = 0
+    for group_fingerprint, members in groups:
+        kept = max(members, key=_richness)
+        unique.append(kept)
+        for member in members:
+            if member is not kept:
+                member['duplicate_of'] = kept['url']
+                member['similarity'] = HASH_BITS - distance(member['_fingerprint'], kept['_fingerprint'])
+                duplicates += 1
+                chars_saved += len(member['content'])
+
+    for article in articles:
+        article.pop('_fingerprint', None)
+
+    return unique, {'duplicates': duplicates, 'chars_saved': chars_saved}
@@ -0,0 +1,395 @@
+"""
+Extracción de artículos a partir de HTML en streaming.
+
+Con lxml disponible el HTML se parsea de forma incremental a medida que llega
+(HTMLPullParser) y se recorre una sola vez. Cada párrafo suma su texto "útil"
+(descontando el texto de enlaces) al bloque que lo contiene y la mitad a su
+abuelo; al final gana el bloque con mejor puntaje, ajustado por pistas de
+tag/clase/id. En el mismo recorrido se recogen título, fecha de publicación e
+imagen principal. Los elementos ya cerrados se liberan y la lectura se corta en
+cuanto el mejor bloque reunió suficiente texto, así que ni la descarga ni el
+árbol completo de páginas enormes llegan a memoria.
+
+Sin lxml se usa BeautifulSoup con html.parser y las reglas por selector de
+siempre (sin fecha ni imagen).
+"""
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+from django.utils.dateparse import parse_date, parse_datetime
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml es opcional
+    etree = None
+
+# Elementos que nunca forman parte del cuerpo del artículo
+SKIP_TAGS = frozenset({'script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript', 'form', 'button', 'select'})
+
+# Navegación y pie: los títulos que aparezcan ahí no son del artículo
+CHROME_TAGS = frozenset({'nav', 'footer', 'aside'})
+
+# Elementos que pueden contener el cuerpo del artículo
+BLOCK_TAGS = frozenset({'article', 'main', 'section', 'div', 'td', 'body'})
+
+# Elementos de texto: mientras haya uno abierto no se libera nada del árbol
+TEXT_TAGS = frozenset({'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'title'})
+
+# Al cerrar uno de estos (fuera de un elemento de texto) se liberan sus
+# hermanos anteriores; los inline (<a>, <strong>...) nunca disparan la liberación
+RELEASE_TAGS = BLOCK_TAGS | TEXT_TAGS | SKIP_TAGS | frozenset({
+    'ul', 'ol', 'li', 'dl', 'table', 'tbody', 'tr', 'figure', 'blockquote', 'pre', 'hr',
+})
+TAG_WEIGHTS = {'article': 1.3, 'main': 1.1, 'section': 1.0, 'div': 1.0, 'td': 0.8, 'body': 0.7}
+
+POSITIVE_HINTS = re.compile(r'article|body|content|entry|main|post|story|text|nota|cuerpo', re.IGNORECASE)
+NEGATIVE_HINTS = re.compile(
+    r'comment|footer|sidebar|related|share|social|promo|advert|\bad[s-]?\b|banner|menu|nav|widget|'
+    r'cookie|newsletter|subscribe|recomend|relacionad|popular|trending',
+    re.IGNORECASE,
+)
+
+# Fuentes de metadatos, en orden de preferencia
+TITLE_META = ('og:title', 'twitter:title')
+IMAGE_META = ('og:image', 'og:image:url', 'twitter:image', 'twitter:image:src')
+DATE_META = (
+    'article:published_time', 'og:published_time', 'datepublished', 'date', 'pubdate',
+    'publishdate', 'dc.date', 'dc.date.issued', 'dcterms.date', 'dcterms.created', 'sailthru.date',
+)
+
+# Texto mínimo para dar por bueno un bloque
+MIN_CONTENT_CHARS = 200
+
+_whitespace = re.compile(r'\s+')
+_meta_charset = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+_ld_date = re.compile(r'"datePublished"\s*:\s*"([^"]+)"')
+
+
+def _clean(text):
+    return _whitespace.sub(' ', text).strip()
+
+
+def _text(element):
+    return _clean(''.join(element.itertext()))
+
+
+def normalize_date(value):
+    """
+    Devuelve la fecha en ISO 8601 si se puede interpretar; si no, el texto original
+    """
+    value = (value or '').strip()
+    if not value:
+        return ''
+    try:
+        # Una fecha sola no debe convertirse en medianoche
+        parsed = parse_date(value) if len(value) == 10 else parse_datetime(value) or parse_date(value[:10])
+    except ValueError:
+        parsed = None
+    return parsed.isoformat() if parsed else value
+
+
+def extract_article(chunks, max_chars, encoding=None, base_url=None):
+    """
+    Extrae {'title', 'content', 'published_at', 'image'} de un iterable de
+    bloques de bytes HTML. Deja de consumir el iterable en cuanto tiene
+    max_chars de texto útil.
+    """
+    extractor = incremental_extractor(max_chars, encoding, base_url)
+    for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    return extractor.finish()
+
+
+def incremental_extractor(max_chars, encoding=None, base_url=None):
+    """
+    Extractor al que se le pasan los bloques a medida que llegan: feed(chunk)
+    devuelve True cuando ya no hace falta leer más y finish() devuelve el
+    resultado. Lo usa el pipeline asíncrono, que no puede entregar un iterable.
+    """
+    if etree is None:
+        return _BufferedSoupExtractor(max_chars)
+    return _StreamingExtractor(max_chars, encoding, base_url)
+
+
+class _Block:
+    __slots__ = ('weight', 'score', 'chars', 'first_image')
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.score = 0.0
+        self.chars = 0
+        self.first_image = ''
+
+
+class _StreamingExtractor:
+
+    def __init__(self, max_chars, encoding=None, base_url=None):
+        self.max_chars = max_chars
+        self.encoding = encoding
+        self.base_url = base_url
+        self.parser = None
+        self.skip_depth = 0
+        self.chrome_depth = 0
+        self.article_depth = 0
+        self.text_depth = 0
+        self.blocks = {}  # elemento abierto -> _Block
+        self.paragraphs = []  # (texto, bloques que lo contienen)
+        self.meta = {}
+        self.h1 = ''
+        self.article_h1 = ''
+        self.title_tag = ''
+        self.title_class = ''
+        self.time_datetime = ''
+        self.ld_date = ''
+        self.best = None
+
+    def feed(self, chunk):
+        if not chunk:
+            return False
+        if self.parser is None:
+            self.parser = self._make_parser(chunk)
+        self.parser.feed(chunk)
+        self._consume_events()
+        return self._enough()
+
+    def finish(self):
+        if self.parser is None:
+            return {'title': '', 'content': '', 'published_at': '', 'image': ''}
+        if not self._enough():
+            try:
+                self.parser.close()
+            except etree.XMLSyntaxError:
+                pass  # documento vacío o irrecuperable
+            self._consume_events()
+
+        return self._result()
+
+    def _make_parser(self, first_chunk):
+        # Sin charset en la cabecera: el declarado en el HTML o UTF-8
+        # (libxml2 asumiría latin-1)
+        encoding = self.encoding
+        if not encoding:
+            match = _meta_charset.search(first_chunk[:4096])
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        return etree.HTMLPullParser(events=('start', 'end'), encoding=encoding, remove_comments=True)
+
+    # Recorrido
+
+    def _consume_events(self):
+        for event, element in self.parser.read_events():
+            tag = element.tag if isinstance(element.tag, str) else ''
+            if event == 'start':
+                self._start(element, tag)
+            else:
+                self._end(element, tag)
+
+    def _start(self, element, tag):
+        if tag in TEXT_TAGS:
+            self.text_depth += 1
+        if tag in CHROME_TAGS:
+            self.chrome_depth += 1
+        elif tag == 'article':
+            self.article_depth += 1
+
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == 'meta':
+            self._collect_meta(element)
+        elif not self.skip_depth:
+            if tag in BLOCK_TAGS:
+                self.blocks[element] = _Block(self._weight(element, tag))
+            elif tag == 'img':
+                self._collect_image(element)
+
+    def _end(self, element, tag):
+        if tag in CHROME_TAGS:
+            self.chrome_depth -= 1
+        elif tag == 'article':
+            self.article_depth -= 1
+        elif tag == 'h1' and not self.chrome_depth:
+            # El <h1> suele estar dentro del <header> del artículo, que se
+            # descarta como cuerpo pero sigue valiendo como título
+            if not self.h1:
+                self.h1 = _text(element)
+            if self.article_depth and not self.article_h1:
+                self.article_h1 = _text(element)
+
+        # Un bloque cerrado ya no recibe párrafos: basta con su _Block
+        self.blocks.pop(element, None)
+
+        if tag in SKIP_TAGS:
+            self.skip_depth -= 1
+            if tag == 'script' and not self.ld_date and element.get('type') == 'application/ld+json':
+                match = _ld_date.search(element.text or '')
+                if match:
+                    self.ld_date = match.group(1)
+        elif not self.skip_depth:
+            if tag == 'p':
+                self._add_paragraph(element)
+            elif tag == 'title' and not self.title_tag:
+                self.title_tag = _text(element)
+            elif not self.title_class and {'title', 'headline'} & set((element.get('class') or '').split()):
+                self.title_class = _text(element)
+
+        if not self.chrome_depth:
+            # La fecha también suele venir en el <header> del artículo
+            if tag == 'time' and not self.time_datetime:
+                self.time_datetime = element.get('datetime', '')
+            if element.get('itemprop') == 'datePublished' and 'datepublished' not in self.meta:
+                self.meta['datepublished'] = element.get('content') or element.get('datetime') or _text(element)
+
+        if tag in TEXT_TAGS:
+            self.text_depth -= 1
+        if tag in RELEASE_TAGS and not self.text_depth:
+            self._release_previous(element)
+
+    def _release_previous(self, element):
+        """
+        Libera los hermanos anteriores, ya procesados: ningún evento futuro
+        los necesita. Su tail (texto entre hermanos) es del padre y se conserva.
+        """
+        parent = element.getparent()
+        if parent is None:
+            return
+        while element.getprevious() is not None:
+            sibling = parent[0]
+            if sibling.tail:
+                parent.text = (parent.text or '') + sibling.tail
+            del parent[0]
+
+    def _weight(self, element, tag):
+        weight = TAG_WEIGHTS[tag]
+        hints = f"{element.get('class', '')} {element.get('id', '')}"
+        if hints.strip():
+            if NEGATIVE_HINTS.search(hints):
+                weight *= 0.3
+            elif POSITIVE_HINTS.search(hints):
+                weight *= 1.25
+        return weight
+
+    def _collect_meta(self, element):
+        key = (element.get('property') or element.get('name') or element.get('itemprop') or '').lower()
+        value = element.get('content')
+        if key and value and key not in self.meta:
+            self.meta[key] = value.strip()
+
+    def _collect_image(self, element):
+        src = element.get('src') or element.get('data-src') or ''
+        if not src or src.startswith('data:'):
+            return
+        for ancestor in element.iterancestors():
+            block = self.blocks.get(ancestor)
+            if block is not None and not block.first_image:
+                block.first_image = src
+
+    def _add_paragraph(self, element):
+        text = _text(element)
+        if not text:
+            return
+
+        link_chars = sum(len(_text(link)) for link in element.iter('a'))
+        useful = len(text) * (1 - min(link_chars / len(text), 1))
+
+        containers = []
+        for depth, ancestor in enumerate(element.iterancestors()):
+            block = self.blocks.get(ancestor)
+            if block is None:
+                continue
+            containers.append(block)
+            block.chars += len(text) + 1
+            if depth == 0:
+                block.score += useful
+            elif depth == 1:
+                block.score += useful / 2
+            if self.best is None or block.score * block.weight > self.best.score * self.best.weight:
+                self.best = block
+
+        self.paragraphs.append((text, containers))
+
+    def _enough(self):
+        return self.best is not None and self.best.chars >= self.max_chars
+
+    # Resultado
+
+    def _content(self):
+        if self.best is not None and self.best.chars > MIN_CONTENT_CHARS:
+            texts = [text for text, containers in self.paragraphs if self.best in containers]
+        else:
+            texts = [text for text, _ in self.paragraphs]
+
+        content = ''
+        for text in texts:
+            if len(content) >= self.max_chars:
+                break
+            content = f"{content} {text}" if content else text
+        return content[:self.max_chars]
+
+    def _result(self):
+        title = next((self.meta[key] for key in TITLE_META if self.meta.get(key)), '')
+        title = self.article_h1 or self.h1 or title or self.title_tag or self.title_class
+
+        image = next((self.meta[key] for key in IMAGE_META if self.meta.get(key)), '')
+        if not image and self.best is not None:
+            image = self.best.first_image
+        if image and self.base_url:
+            image = urljoin(self.base_url, image)
+
+        published = next((self.meta[key] for key in DATE_META if self.meta.get(key)), '')
+        published = published or self.ld_date or self.time_datetime
+
+        return {
+            'title': title,
+            'content': self._content(),
+            'published_at': normalize_date(published),
+            'image': image,
+        }
+
+
+class _BufferedSoupExtractor:
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.chunks = []
+
+    def feed(self, chunk):
+        self.chunks.append(chunk)
+        return False
+
+    def finish(self):
+        return extract_with_selectors(b''.join(self.chunks), self.max_chars)
+
+
+def extract_with_selectors(html, max_chars):
+    """
+    Extractor por selectores sobre el árbol completo de BeautifulSoup: el de
+    respaldo sin lxml y la referencia de benchmark_extraction
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remover elementos no deseados
+    for element in soup(list(SKIP_TAGS)):
+        element.decompose()
+
+    title = ""
+    for selector in ['h1', 'title', '.title', '.headline']:
+        title_element = soup.select_one(selector)
+        if title_element:
+            title = title_element.get_text().strip()
+            break
+
+    content = ""
+    for selector in ['article', '.article-content', '.post-content', '.entry-content', '.content', 'main', '.story-body']:
+        element = soup.select_one(selector)
+        if element:
+            texts = [text for text in (p.get_text().strip() for p in element.find_all('p')) if text]
+            content = ' '.join(texts)
+            if len(content) > MIN_CONTENT_CHARS:
+                break
+
+    if len(content) < MIN_CONTENT_CHARS:
+        texts = [text for text in (p.get_text().strip() for p in soup.find_all('p')) if text]
+        content = ' '.join(texts)
+
+    return {'title': title, 'content': content[:max_chars], 'published_at': '', 'image': ''}
@@ -0,0 +1,84 @@
+"""
+Descarga concurrente de fuentes para la generación de noticias.
+
+Las URLs se reparten en un pool de threads con un límite global y un límite por
+dominio, de modo que un medio con muchas URLs no acapare el pool ni reciba
+demasiadas conexiones a la vez. Todo el lote tiene un plazo máximo: las URLs que
+no terminan a tiempo se reportan como fallidas y la generación sigue adelante.
+"""
+import contextvars
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def host_key(url):
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def fetch_concurrently(urls, fetch, on_failure, max_workers=None, per_host=None, deadline=None):
+    """
+    Aplica fetch(url) a cada URL en paralelo y devuelve los resultados en el
+    mismo orden de entrada. Las URLs que fallan o no terminan antes del plazo
+    devuelven on_failure(url).
+    """
+    max_workers = max_workers or settings.NEWS_FETCH_MAX_WORKERS
+    per_host = per_host or settings.NEWS_FETCH_PER_HOST
+    deadline = deadline or settings.NEWS_FETCH_DEADLINE
+
+    results = [None] * len(urls)
+    if not urls:
+        return results
+
+    pending = deque(enumerate(urls))
+    in_flight = {}
+    host_load = {}
+    expires = time.monotonic() + deadline
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)), thread_name_prefix='news-fetch')
+    try:
+        while pending or in_flight:
+            # Despachar todo lo que permitan los límites global y por dominio
+            skipped = deque()
+            while pending and len(in_flight) < max_workers:
+                index, url = pending.popleft()
+                host = host_key(url)
+                if host_load.get(host, 0) >= per_host:
+                    skipped.append((index, url))
+                    continue
+                host_load[host] = host_load.get(host, 0) + 1
+                # Cada thread corre con una copia del contexto (p.ej. el tracer de posts/tracing.py)
+                in_flight[executor.submit(contextvars.copy_context().run, fetch, url)] = (index, url, host)
+            pending.extendleft(reversed(skipped))
+
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                break
+
+            done, _ = wait(in_flight, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, url, host = in_flight.pop(future)
+                host_load[host] -= 1
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.warning(f"Fallo inesperado descargando {url}: {e}")
+                    results[index] = on_failure(url)
+    finally:
+        # No esperar a los hosts lentos: sus threads terminan solos con su timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for index, url in pending:
+        results[index] = on_failure(url)
+    for index, url, host in in_flight.values():
+        logger.warning(f"Plazo de {deadline}s agotado esperando {url}")
+        results[index] = on_failure(url)
+
+    return results
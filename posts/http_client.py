@@ -0,0 +1,128 @@
+"""
+Sesión HTTP compartida para descargar fuentes.
+
+Una única requests.Session por proceso mantiene conexiones keep-alive por
+dominio (el pool se dimensiona con los mismos límites que usa
+posts.fetching), reintenta 429/5xx con backoff exponencial con jitter
+respetando Retry-After y negocia compresión gzip/brotli. Los cuerpos se leen
+en streaming y con un tope de bytes (ver BoundedBody).
+"""
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class NonHTMLContent(Exception):
+    pass
+
+
+class BoundedBody:
+    """
+    Itera el cuerpo descomprimido de una respuesta en streaming sin superar
+    max_bytes. Rechaza de entrada las respuestas que no son HTML.
+    """
+
+    def __init__(self, response, max_bytes, chunk_size=16 * 1024):
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in HTML_CONTENT_TYPES:
+            raise NonHTMLContent(f"Tipo de contenido no soportado: {content_type}")
+
+        self.response = response
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self.truncated = False
+
+    @property
+    def charset(self):
+        """
+        Charset declarado en la cabecera (None si no viene, para que el parser
+        lo detecte desde el propio HTML)
+        """
+        _, _, params = self.response.headers.get('Content-Type', '').partition(';')
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'charset' and value.strip():
+                return value.strip().strip('"\'')
+        return None
+
+    def __iter__(self):
+        for chunk in self.response.iter_content(self.chunk_size):
+            remaining = self.max_bytes - self.bytes_read
+            if len(chunk) >= remaining:
+                self.bytes_read += remaining
+                self.truncated = len(chunk) > remaining
+                yield chunk[:remaining]
+                return
+            self.bytes_read += len(chunk)
+            yield chunk
+
+
+class CappedRetry(Retry):
+    """
+    Retry que no duerme más de RETRY_AFTER_MAX segundos aunque el servidor
+    pida un Retry-After mayor (el lote de descargas tiene su propio plazo).
+    """
+    RETRY_AFTER_MAX = 10
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.RETRY_AFTER_MAX)
+
+
+def build_session():
+    retry = CappedRetry(
+        total=settings.NEWS_HTTP_RETRIES,
+        connect=settings.NEWS_HTTP_RETRIES,
+        read=1,
+        status=settings.NEWS_HTTP_RETRIES,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        backoff_factor=settings.NEWS_HTTP_BACKOFF,
+        backoff_jitter=settings.NEWS_HTTP_BACKOFF,
+        backoff_max=settings.NEWS_HTTP_BACKOFF_MAX,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        # Un pool por dominio y tantas conexiones por dominio como descargas
+        # simultáneas permite posts.fetching
+        pool_connections=settings.NEWS_FETCH_MAX_WORKERS,
+        pool_maxsize=settings.NEWS_FETCH_PER_HOST,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.5',
+        # Incluye br si el paquete brotli está instalado (urllib3 lo decodifica)
+        'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding'],
+    })
+    return session
+
+
+def get_session():
+    """
+    Devuelve la sesión compartida del proceso, creándola la primera vez
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
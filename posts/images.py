@@ -0,0 +1,176 @@
+"""
+Variantes redimensionadas de Post.image para servir con srcset.
+
+Por cada ancho de POST_IMAGE_WIDTHS menor que el original (y siempre al menos
+uno) se guarda una versión WebP y otra JPEG junto al original, en el mismo
+storage (disco local o S3): posts/foto.jpg -> posts/foto-480w.webp. Los
+nombres y tamaños quedan en Post.image_variants:
+
+    {'source': 'posts/foto.jpg', 'width': 2000, 'height': 1333,
+     'webp': [[480, 'posts/foto-480w.webp'], ...], 'jpeg': [...]}
+
+Post.save vacía image_variants cuando cambia la imagen (dejando anotados en
+'stale' los archivos de las variantes anteriores) y
+`python manage.py generate_image_variants --watch`, un proceso aparte, procesa
+los pendientes y borra esos archivos, así que el request que sube la imagen no
+paga el redimensionado. Sin --watch procesa los pendientes y termina.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from . import page_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# (clave en image_variants, formato de Pillow, extensión)
+FORMATS = (
+    ('webp', 'WEBP', 'webp'),
+    ('jpeg', 'JPEG', 'jpg'),
+)
+
+
+def variant_name(name, width, extension):
+    return f"{os.path.splitext(name)[0]}-{width}w.{extension}"
+
+
+def target_widths(original_width):
+    # Sin agrandar: anchos mayores que el original se reemplazan por el original
+    widths = sorted({min(width, original_width) for width in settings.POST_IMAGE_WIDTHS})
+    return widths or [original_width]
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG no tiene transparencia: fondo blanco
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, 'white')
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=settings.POST_IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+        image.save(buffer, 'WEBP', quality=settings.POST_IMAGE_WEBP_QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def render_variants(field_file):
+    """
+    Genera y guarda las variantes de la imagen; devuelve el dict para
+    image_variants
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    variants = {'source': field_file.name, 'width': image.width, 'height': image.height}
+    for key, fmt, extension in FORMATS:
+        variants[key] = []
+        for width in target_widths(image.width):
+            height = max(round(image.height * width / image.width), 1)
+            resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+            name = variant_name(field_file.name, width, extension)
+            # Nombre fijo: reprocesar reemplaza el archivo en lugar de crear otro
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(_encode(resized, fmt)))
+            variants[key].append([width, name])
+    return variants
+
+
+def _files(variants):
+    return [name for key, _, _ in FORMATS for _, name in variants.get(key, ())]
+
+
+def delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as e:
+            logger.warning(f"No se pudo borrar la variante {name}: {e}")
+
+
+def generate(post):
+    """
+    Procesa la imagen actual del post, borra los archivos de las variantes
+    anteriores y devuelve image_variants, o None si la imagen cambió mientras
+    tanto (el resultado se descarta y queda pendiente la nueva)
+    """
+    name = post.image.name or ''
+    storage = post.image.storage
+    previous = post.image_variant_files()
+    if not name:
+        # Imagen quitada: sólo quedan los archivos viejos
+        variants = {}
+    else:
+        try:
+            variants = render_variants(post.image)
+        except Exception as e:
+            # Imagen corrupta o storage caído: se anota para no reintentar en cada vuelta
+            logger.warning(f"No se pudieron generar las variantes de la imagen del post {post.pk}: {e}")
+            variants = {'source': name, 'error': str(e)[:500]}
+
+    # updated_at cambia el ETag del detalle; los listados se invalidan a mano
+    # porque .update() no dispara los signals
+    same_image = Q(image=name) if name else Q(image='') | Q(image__isnull=True)
+    updated = Post.objects.filter(same_image, pk=post.pk).update(image_variants=variants, updated_at=timezone.now())
+    created = _files(variants)
+    if not updated:
+        # Los archivos recién escritos son de una imagen que ya no está
+        delete_files(storage, set(created) - set(previous))
+        return None
+
+    # Regenerar con los mismos anchos reescribe los mismos nombres
+    delete_files(storage, set(previous) - set(created))
+    if post.published:
+        page_cache.invalidate_lists(page_cache.ALL_POSTS, page_cache.category_scope(post.category_id))
+    return variants
+
+
+def pending():
+    """
+    Posts con imagen sin variantes o con archivos de variantes viejas por borrar
+    """
+    has_image = ~(Q(image='') | Q(image__isnull=True))
+    return Post.objects.filter((has_image & ~Q(image_variants__has_key='source')) | Q(image_variants__has_key='stale'))
+
+
+def process_pending(limit=None):
+    """
+    Genera las variantes de hasta `limit` posts pendientes; devuelve cuántos
+    """
+    count = 0
+    for post in pending().only('pk', 'image', 'image_variants', 'published', 'category_id').order_by('-created_at')[:limit or settings.POST_IMAGE_BATCH]:
+        generate(post)
+        count += 1
+    return count
+
+
+def variants_for(post):
+    """
+    image_variants si corresponden a la imagen actual y se generaron bien
+    """
+    variants = post.image_variants
+    if not post.image or not variants or variants.get('source') != post.image.name or 'error' in variants:
+        return None
+    return variants
+
+
+def srcset(post, key):
+    variants = variants_for(post)
+    if variants is None:
+        return ''
+    storage = post.image.storage
+    return ', '.join(f"{storage.url(name)} {width}w" for width, name in variants[key])
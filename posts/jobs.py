@@ -0,0 +1,151 @@
+"""
+Cola de trabajos persistente para NewsGeneration.
+
+La cola vive en la propia tabla de NewsGeneration: una fila en PENDING cuyo
+available_at ya venció está lista para procesarse. Los workers la reclaman con
+un UPDATE condicional (compare-and-swap), que es seguro entre procesos tanto en
+SQLite como en PostgreSQL, y mantienen un lease que renuevan mientras trabajan.
+Si un worker muere, el lease vence y otro worker retoma la fila.
+"""
+import logging
+import os
+import random
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import NewsGeneration
+
+logger = logging.getLogger(__name__)
+
+# Estados intermedios del ciclo de vida; una fila en alguno de ellos con el
+# lease vencido pertenece a un worker que murió a mitad de proceso.
+ACTIVE_STATUSES = ('SEARCHING', 'GENERATING')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue(news_gen, delay=0):
+    """
+    Deja la generación lista para que la tome un worker
+    """
+    NewsGeneration.objects.filter(pk=news_gen.pk).update(
+        status='PENDING',
+        available_at=timezone.now() + timedelta(seconds=delay),
+        attempts=0,
+        locked_by='',
+        locked_until=None,
+        error_message='',
+    )
+
+
+def claimable(now=None):
+    """
+    Filas que un worker puede tomar en este momento
+    """
+    now = now or timezone.now()
+    return NewsGeneration.objects.filter(
+        Q(status='PENDING', available_at__lte=now) | Q(status__in=ACTIVE_STATUSES),
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+    ).exclude(
+        # Una fila activa sin lease no es de la cola (p.ej. procesada a mano)
+        Q(status__in=ACTIVE_STATUSES) & Q(locked_until__isnull=True)
+    )
+
+
+def claim_next(worker_id, lease_seconds=None, max_attempts=None):
+    """
+    Reclama el siguiente trabajo disponible. Devuelve la NewsGeneration tomada o None.
+    """
+    lease_seconds = lease_seconds or settings.NEWS_WORKER_LEASE_SECONDS
+    max_attempts = max_attempts or settings.NEWS_WORKER_MAX_ATTEMPTS
+    now = timezone.now()
+
+    candidates = list(
+        claimable(now).order_by('available_at', 'id').values_list('id', 'attempts')[:10]
+    )
+    for pk, attempts in candidates:
+        if attempts >= max_attempts:
+            # Lease vencido de un trabajo que ya agotó sus intentos
+            _fail_abandoned(pk, now)
+            continue
+
+        claimed = claimable(now).filter(pk=pk).update(
+            locked_by=worker_id,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return NewsGeneration.objects.get(pk=pk)
+
+    return None
+
+
+def _fail_abandoned(pk, now):
+    updated = claimable(now).filter(pk=pk).update(
+        status='ERROR',
+        error_message='El worker abandonó el trabajo y se agotaron los reintentos',
+        locked_by='',
+        locked_until=None,
+    )
+    if updated:
+        logger.error(f"Generación {pk} abandonada sin reintentos disponibles")
+
+
+def heartbeat(pk, worker_id, lease_seconds=None):
+    """
+    Renueva el lease. Devuelve False si el trabajo ya no pertenece a este worker.
+    """
+    lease_seconds = lease_seconds or settings.NEWS_WORKER_LEASE_SECONDS
+    return bool(NewsGeneration.objects.filter(pk=pk, locked_by=worker_id).update(
+        locked_until=timezone.now() + timedelta(seconds=lease_seconds),
+    ))
+
+
+def release(pk, worker_id):
+    NewsGeneration.objects.filter(pk=pk, locked_by=worker_id).update(locked_by='', locked_until=None)
+
+
+def retry_delay(attempts):
+    """
+    Backoff exponencial con jitter para el reintento número `attempts`
+    """
+    base = settings.NEWS_WORKER_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    delay = min(base, settings.NEWS_WORKER_RETRY_BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_or_fail(pk, worker_id, error, max_attempts=None):
+    """
+    Reprograma el trabajo con backoff o lo marca como ERROR si no quedan intentos.
+    Devuelve True si se reprogramó.
+    """
+    max_attempts = max_attempts or settings.NEWS_WORKER_MAX_ATTEMPTS
+    attempts = NewsGeneration.objects.filter(pk=pk).values_list('attempts', flat=True).first() or 0
+    mine = NewsGeneration.objects.filter(pk=pk, locked_by=worker_id)
+
+    if attempts < max_attempts:
+        delay = retry_delay(attempts)
+        mine.update(
+            status='PENDING',
+            available_at=timezone.now() + timedelta(seconds=delay),
+            error_message=f"Intento {attempts}/{max_attempts} falló: {error}",
+            locked_by='',
+            locked_until=None,
+        )
+        logger.warning(f"Generación {pk} reprogramada en {delay:.0f}s (intento {attempts}/{max_attempts})")
+        return True
+
+    mine.update(
+        status='ERROR',
+        error_message=f"Falló tras {attempts} intentos: {error}",
+        locked_by='',
+        locked_until=None,
+    )
+    logger.error(f"Generación {pk} marcada como ERROR tras {attempts} intentos")
+    return False
@@ -0,0 +1,101 @@
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.extraction import extract_article, extract_with_selectors
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / 'benchmarks' / 'extraction'
+CHUNK_SIZE = 16 * 1024
+
+
+def streaming_extract(html, max_chars, base_url=None):
+    chunks = (html[i:i + CHUNK_SIZE] for i in range(0, len(html), CHUNK_SIZE))
+    return extract_article(chunks, max_chars, base_url=base_url)
+
+
+class Command(BaseCommand):
+    help = 'Compara velocidad, memoria y calidad del extractor de artículos contra el extractor anterior'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Repeticiones del corpus para medir velocidad')
+        parser.add_argument('--max-chars', type=int, default=settings.NEWS_EXTRACT_MAX_CHARS)
+        parser.add_argument('--fixtures', default=str(FIXTURES_DIR), help='Directorio con pares .html/.json')
+        parser.add_argument('--verbose-pages', action='store_true', help='Muestra el resultado de cada página')
+
+    def handle(self, *args, **options):
+        corpus = self._load_corpus(Path(options['fixtures']))
+        if not corpus:
+            self.stderr.write('No se encontraron fixtures')
+            return
+
+        self.stdout.write(f"Corpus: {len(corpus)} páginas, {sum(len(html) for _, html, _ in corpus) / 1024:.0f} KB")
+        extractors = [
+            ('anterior', lambda html, expected: extract_with_selectors(html, options['max_chars'])),
+            ('streaming', lambda html, expected: streaming_extract(html, options['max_chars'], expected.get('base_url'))),
+        ]
+
+        for label, extract in extractors:
+            quality = self._quality(corpus, extract, label if options['verbose_pages'] else None)
+            pages_per_sec = self._speed(corpus, extract, options['iterations'])
+            peak_kb = self._peak_memory(corpus, extract)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}"))
+            self.stdout.write(f"  páginas/seg:        {pages_per_sec:.1f}")
+            self.stdout.write(f"  memoria pico/pág:   {peak_kb:.0f} KB")
+            self.stdout.write(f"  títulos correctos:  {quality['title']:.0%}")
+            self.stdout.write(f"  texto esperado:     {quality['recall']:.0%}")
+            self.stdout.write(f"  ruido excluido:     {quality['precision']:.0%}")
+            self.stdout.write(f"  fechas correctas:   {quality['date']:.0%}")
+            self.stdout.write(f"  imágenes correctas: {quality['image']:.0%}")
+
+    def _load_corpus(self, directory):
+        corpus = []
+        for html_path in sorted(directory.glob('*.html')):
+            expected_path = html_path.with_suffix('.json')
+            if expected_path.exists():
+                corpus.append((html_path.stem, html_path.read_bytes(), json.loads(expected_path.read_text())))
+        return corpus
+
+    def _quality(self, corpus, extract, verbose_label=None):
+        totals = {'title': 0, 'recall': 0, 'precision': 0, 'date': 0, 'image': 0}
+        for name, html, expected in corpus:
+            result = extract(html, expected)
+            content = result['content']
+            include = expected.get('must_include', [])
+            exclude = expected.get('must_exclude', [])
+
+            scores = {
+                'title': result['title'] == expected['title'],
+                'recall': sum(phrase in content for phrase in include) / len(include) if include else 1,
+                'precision': sum(phrase not in content for phrase in exclude) / len(exclude) if exclude else 1,
+                'date': result['published_at'] == expected.get('published_at', ''),
+                'image': result['image'] == expected.get('image', ''),
+            }
+            for key, value in scores.items():
+                totals[key] += value
+
+            if verbose_label:
+                self.stdout.write(f"[{verbose_label}] {name}: " + ', '.join(f"{k}={float(v):.2f}" for k, v in scores.items()))
+
+        return {key: value / len(corpus) for key, value in totals.items()}
+
+    def _speed(self, corpus, extract, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for _, html, expected in corpus:
+                extract(html, expected)
+        return iterations * len(corpus) / (time.perf_counter() - started)
+
+    def _peak_memory(self, corpus, extract):
+        peaks = []
+        for _, html, expected in corpus:
+            tracemalloc.start()
+            extract(html, expected)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peaks.append(peak)
+        return max(peaks) / 1024
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from posts.models import NewsGeneration
+from posts.services_async import AsyncNewsGenerationService, AsyncResources
+from posts.services_simple import SimpleNewsGenerationService
+
+SAMPLE_ARTICLE = json.dumps({
+    'sources': [{'name': 'Fuente', 'type': 'Blog', 'focus': 'General', 'key_points': []}],
+    'title': 'Artículo de benchmark',
+    'excerpt': 'Resumen del artículo de benchmark.',
+    'content': '<p>' + 'Contenido de benchmark. ' * 100 + '</p>',
+    'meta_description': 'Artículo de benchmark.',
+    'meta_keywords': 'benchmark',
+})
+
+
+def _response():
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=SAMPLE_ARTICLE))],
+        usage=SimpleNamespace(prompt_tokens=500, completion_tokens=1500),
+    )
+
+
+def fake_client(latency):
+    def create(**kwargs):
+        time.sleep(latency)
+        return _response()
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def fake_async_client(latency):
+    async def create(**kwargs):
+        await asyncio.sleep(latency)
+        return _response()
+
+    async def close():
+        pass
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)), close=close)
+
+
+class Command(BaseCommand):
+    help = 'Compara generaciones/minuto del servicio síncrono y del pipeline asíncrono con un OpenAI simulado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generations', type=int, default=20, help='Generaciones por corrida')
+        parser.add_argument('--latency', type=float, default=2.0, help='Segundos que tarda cada llamada simulada a OpenAI')
+        parser.add_argument('--concurrency', type=int, default=None, help='Concurrencia del pipeline asíncrono')
+
+    def handle(self, *args, **options):
+        # Las generaciones de prueba van a una base descartable (la de tests),
+        # nunca a la del sitio; los hilos de sync_to_async también la usan
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            user = User.objects.create(username='benchmark-generation')
+            # Sin caché, límite de uso ni streaming: se mide sólo el pipeline
+            with override_settings(NEWS_RATE_LIMIT_ENABLED=False, NEWS_STREAM_COMPLETIONS=False):
+                sync_rate = self._run_sync(user, options)
+                async_rate = self._run_async(user, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f"síncrono:   {sync_rate:.1f} generaciones/minuto")
+        self.stdout.write(f"asíncrono:  {async_rate:.1f} generaciones/minuto ({async_rate / sync_rate:.1f}x)")
+
+    def _create(self, user, count, label):
+        return [
+            NewsGeneration.objects.create(tags=f"{label} {i}", created_by=user, bypass_completion_cache=True).pk
+            for i in range(count)
+        ]
+
+    def _run_sync(self, user, options):
+        ids = self._create(user, options['generations'], 'sync')
+        service = SimpleNewsGenerationService()
+        service.ai_generator.client = fake_client(options['latency'])
+        service.ai_generator.single_call = True
+
+        started = time.perf_counter()
+        for pk in ids:
+            service.process_news_generation(pk)
+        return self._rate(ids, time.perf_counter() - started)
+
+    def _run_async(self, user, options):
+        ids = self._create(user, options['generations'], 'async')
+
+        async def run():
+            resources = AsyncResources(client=fake_async_client(options['latency']))
+            try:
+                await AsyncNewsGenerationService(resources).process_many(ids, options['concurrency'])
+            finally:
+                await resources.aclose()
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        return self._rate(ids, time.perf_counter() - started)
+
+    def _rate(self, ids, elapsed):
+        completed = NewsGeneration.objects.filter(pk__in=ids, status='COMPLETED').count()
+        if completed < len(ids):
+            self.stderr.write(f"{len(ids) - completed} generaciones no terminaron")
+        return completed / elapsed * 60
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import sidebar, view_counts
+
+
+class Command(BaseCommand):
+    help = 'Vuelca a la base las visitas acumuladas en Redis (sin Redis las vuelca cada proceso web) y recalcula los posts populares (ejecutar periódicamente)'
+
+    def handle(self, *args, **options):
+        posts, views = view_counts.flush()
+        sidebar.refresh_popular_posts()
+        self.stdout.write(f"{views} visitas volcadas en {posts} posts")
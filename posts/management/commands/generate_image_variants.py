@@ -0,0 +1,56 @@
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import images
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes responsive (WebP/JPEG) de las imágenes de los posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Regenerar también las que ya tienen variantes (p. ej. tras cambiar POST_IMAGE_WIDTHS)')
+        parser.add_argument('--watch', action='store_true',
+                            help='Quedar esperando imágenes nuevas en lugar de terminar (un solo proceso)')
+        parser.add_argument('--poll-interval', type=float, default=settings.POST_IMAGE_POLL_INTERVAL,
+                            help='Segundos de espera con --watch cuando no hay imágenes pendientes')
+
+    def handle(self, *args, **options):
+        if options['watch']:
+            self._watch(options['poll_interval'])
+            return
+
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True) if options['all'] else images.pending()
+        count = failed = 0
+        for post in posts.only('pk', 'image', 'image_variants', 'published', 'category_id').order_by('-created_at').iterator():
+            variants = images.generate(post)
+            count += 1
+            if variants and 'error' in variants:
+                failed += 1
+        self.stdout.write(f"{count} imágenes procesadas ({failed} con error)")
+
+    def _watch(self, poll_interval):
+        stopping = threading.Event()
+        # Termina el lote en curso y sale
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+        self.stdout.write("Esperando imágenes nuevas")
+        while not stopping.is_set():
+            close_old_connections()
+            try:
+                processed = images.process_pending()
+            except Exception as e:
+                logger.warning(f"Error al generar variantes de imágenes: {e}")
+                processed = 0
+            if not processed:
+                stopping.wait(poll_interval)
+        self.stdout.write("Generación de variantes detenida")
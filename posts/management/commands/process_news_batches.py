@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import batching
+from posts.models import NewsBatch
+
+
+class Command(BaseCommand):
+    help = 'Envía las generaciones pendientes a la Batch API de OpenAI y vuelca los resultados de los lotes terminados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submit-only', action='store_true', help='Sólo envía lotes nuevos')
+        parser.add_argument('--poll-only', action='store_true', help='Sólo consulta los lotes en curso')
+        parser.add_argument('--wait', action='store_true', help='Espera a que terminen todos los lotes en curso')
+        parser.add_argument('--limit', type=int, default=settings.NEWS_BATCH_MAX_REQUESTS,
+                            help='Generaciones máximas por lote')
+        parser.add_argument('--poll-interval', type=float, default=settings.NEWS_BATCH_POLL_INTERVAL,
+                            help='Segundos entre consultas con --wait')
+
+    def handle(self, *args, **options):
+        client = batching.get_batch_client()
+
+        if not options['poll_only']:
+            while True:
+                batch = batching.submit_batch(limit=options['limit'], client=client)
+                if batch is None:
+                    break
+                self.stdout.write(f"{batch} ({batch.remote_id or batch.error_message})")
+                if batch.status == 'FAILED':
+                    # Las filas volvieron a la cola: reintentarlas ya fallaría igual
+                    self.stderr.write('No se pudo enviar el lote; no se envían más en esta ejecución')
+                    break
+
+        if options['submit_only']:
+            return
+
+        while True:
+            for batch in batching.poll_open_batches(client):
+                if batch.status != 'SUBMITTED':
+                    self.stdout.write(
+                        f"{batch}: {batch.completed_count} completadas, {batch.failed_count} reencoladas"
+                    )
+
+            pending = NewsBatch.objects.filter(status='SUBMITTED').count()
+            if not pending or not options['wait']:
+                break
+            self.stdout.write(f"{pending} lotes en curso, próxima consulta en {options['poll_interval']:.0f}s")
+            time.sleep(options['poll_interval'])
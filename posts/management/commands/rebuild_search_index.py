@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a armar el índice de búsqueda de texto completo de los posts'
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            self.stdout.write('El motor de base de datos no tiene índice de búsqueda; se usa icontains')
+            return
+        count = search.rebuild(Post.objects.all())
+        self.stdout.write(f"{count} posts indexados")
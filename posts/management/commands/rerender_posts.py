@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import page_cache
+from posts.models import Post
+
+CHUNK = 200
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a renderizar el HTML público de todos los posts (después de cambiar las reglas de posts/rendering.py)'
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        count = changed = 0
+        posts = []
+        categories = set()
+        for post in Post.objects.only('pk', 'content', 'category_id', *Post.RENDERED_FIELDS).order_by('pk').iterator(chunk_size=CHUNK):
+            before = [getattr(post, field) for field in Post.RENDERED_FIELDS]
+            post.render_content()
+            count += 1
+            if [getattr(post, field) for field in Post.RENDERED_FIELDS] == before:
+                continue
+            # updated_at nuevo: cambia el ETag y la caché del detalle deja de servirse
+            post.updated_at = now
+            posts.append(post)
+            categories.add(post.category_id)
+            if len(posts) == CHUNK:
+                Post.objects.bulk_update(posts, [*Post.RENDERED_FIELDS, 'updated_at'])
+                changed += len(posts)
+                posts = []
+        Post.objects.bulk_update(posts, [*Post.RENDERED_FIELDS, 'updated_at'])
+        changed += len(posts)
+
+        if changed:
+            page_cache.invalidate_lists(page_cache.ALL_POSTS, *(page_cache.category_scope(pk) for pk in categories))
+        self.stdout.write(f"{count} posts renderizados, {changed} con cambios")
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import signal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import jobs
+from posts.rate_limit import PRIORITY_HIGH, PRIORITY_LOW
+from posts.services_async import AsyncNewsGenerationService, AsyncResources
+from posts.services_simple import openai_configured
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de generaciones con el pipeline asíncrono (muchas generaciones a la vez en un proceso)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.NEWS_ASYNC_CONCURRENCY,
+                            help='Generaciones procesadas a la vez')
+        parser.add_argument('--once', action='store_true', help='Vacía la cola y termina en lugar de quedar esperando')
+        parser.add_argument('--poll-interval', type=float, default=settings.NEWS_WORKER_POLL_INTERVAL,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--lease', type=int, default=settings.NEWS_WORKER_LEASE_SECONDS,
+                            help='Duración del lease de cada trabajo en segundos')
+        parser.add_argument('--max-attempts', type=int, default=settings.NEWS_WORKER_MAX_ATTEMPTS,
+                            help='Intentos máximos por generación antes de marcarla como ERROR')
+        parser.add_argument('--worker-id', default='', help='Identificador del worker (por defecto host:pid)')
+        parser.add_argument('--priority', choices=[PRIORITY_HIGH, PRIORITY_LOW], default=PRIORITY_HIGH,
+                            help='Prioridad ante el límite de uso de OpenAI; "low" deja libre el margen reservado')
+
+    def handle(self, *args, **options):
+        if not openai_configured():
+            raise CommandError('El pipeline asíncrono necesita OPENAI_API_KEY; sin clave usar run_news_worker')
+
+        self.worker_id = options['worker_id'] or jobs.default_worker_id()
+        self.lease = options['lease']
+        self.max_attempts = options['max_attempts']
+        self.priority = options['priority']
+        asyncio.run(self._main(options))
+
+    async def _main(self, options):
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopping.set)
+
+        resources = AsyncResources()
+        service = AsyncNewsGenerationService(resources)
+        claim_next = sync_to_async(jobs.claim_next)
+        running = set()
+        self.stdout.write(f"Worker asíncrono {self.worker_id} iniciado (concurrencia {options['concurrency']})")
+
+        try:
+            while not stopping.is_set():
+                while len(running) < options['concurrency']:
+                    job = await claim_next(self.worker_id, self.lease, self.max_attempts)
+                    if job is None:
+                        break
+                    running.add(asyncio.create_task(self._run_job(service, job)))
+
+                if not running:
+                    if options['once']:
+                        break
+                    try:
+                        await asyncio.wait_for(stopping.wait(), options['poll_interval'])
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                _, running = await asyncio.wait(running, timeout=options['poll_interval'], return_when=asyncio.FIRST_COMPLETED)
+
+            # Terminar los trabajos en curso antes de salir
+            if running:
+                await asyncio.gather(*running)
+        finally:
+            await resources.aclose()
+
+        self.stdout.write(f"Worker asíncrono {self.worker_id} detenido")
+
+    async def _run_job(self, service, job):
+        self.stdout.write(f"Procesando generación #{job.id} (intento {job.attempts})")
+        keeper = asyncio.create_task(self._keep_lease(job.id))
+        try:
+            await service.process_news_generation(job.id, priority=self.priority)
+        except Exception as e:
+            await sync_to_async(jobs.retry_or_fail)(job.id, self.worker_id, e, self.max_attempts)
+            return
+        finally:
+            keeper.cancel()
+
+        await sync_to_async(jobs.release)(job.id, self.worker_id)
+        self.stdout.write(f"Generación #{job.id} completada")
+
+    async def _keep_lease(self, pk):
+        """
+        Renueva el lease mientras el trabajo siga en curso
+        """
+        heartbeat = sync_to_async(jobs.heartbeat)
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            if not await heartbeat(pk, self.worker_id, self.lease):
+                logger.warning(f"Worker {self.worker_id} perdió el lease de la generación {pk}")
+                return
@@ -0,0 +1,97 @@
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from posts import jobs
+from posts.rate_limit import PRIORITY_HIGH, PRIORITY_LOW
+from posts.services_simple import get_news_generation_service
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de generaciones de noticias IA (se pueden lanzar varios procesos en paralelo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Vacía la cola y termina en lugar de quedar esperando')
+        parser.add_argument('--poll-interval', type=float, default=settings.NEWS_WORKER_POLL_INTERVAL,
+                            help='Segundos de espera cuando la cola está vacía')
+        parser.add_argument('--lease', type=int, default=settings.NEWS_WORKER_LEASE_SECONDS,
+                            help='Duración del lease de cada trabajo en segundos')
+        parser.add_argument('--max-attempts', type=int, default=settings.NEWS_WORKER_MAX_ATTEMPTS,
+                            help='Intentos máximos por generación antes de marcarla como ERROR')
+        parser.add_argument('--worker-id', default='', help='Identificador del worker (por defecto host:pid)')
+        parser.add_argument('--priority', choices=[PRIORITY_HIGH, PRIORITY_LOW], default=PRIORITY_HIGH,
+                            help='Prioridad ante el límite de uso de OpenAI; "low" deja libre el margen reservado')
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        self.worker_id = options['worker_id'] or jobs.default_worker_id()
+        self.lease = options['lease']
+        self.max_attempts = options['max_attempts']
+        self.priority = options['priority']
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f"Worker {self.worker_id} iniciado")
+
+        while not self.stopping.is_set():
+            close_old_connections()
+            job = jobs.claim_next(self.worker_id, self.lease, self.max_attempts)
+
+            if job is None:
+                if options['once']:
+                    break
+                self.stopping.wait(options['poll_interval'])
+                continue
+
+            self._run_job(job)
+
+        self.stdout.write(f"Worker {self.worker_id} detenido")
+
+    def _request_stop(self, signum, frame):
+        # Termina el trabajo en curso y sale sin tomar uno nuevo
+        if not self.stopping.is_set():
+            logger.info(f"Worker {self.worker_id}: señal {signum} recibida, finalizando tras el trabajo actual")
+        self.stopping.set()
+
+    def _run_job(self, job):
+        self.stdout.write(f"Procesando generación #{job.id} (intento {job.attempts})")
+        done = threading.Event()
+        keeper = threading.Thread(target=self._keep_lease, args=(job.id, done), daemon=True)
+        keeper.start()
+
+        started = time.monotonic()
+        try:
+            service = get_news_generation_service()
+            if hasattr(service, 'ai_generator'):
+                service.ai_generator.priority = self.priority
+            service.process_news_generation(job.id)
+        except Exception as e:
+            done.set()
+            keeper.join()
+            jobs.retry_or_fail(job.id, self.worker_id, e, self.max_attempts)
+            return
+
+        done.set()
+        keeper.join()
+        jobs.release(job.id, self.worker_id)
+        self.stdout.write(f"Generación #{job.id} completada en {time.monotonic() - started:.1f}s")
+
+    def _keep_lease(self, pk, done):
+        """
+        Renueva el lease mientras el trabajo siga en curso
+        """
+        try:
+            while not done.wait(self.lease / 3):
+                if not jobs.heartbeat(pk, self.worker_id, self.lease):
+                    logger.warning(f"Worker {self.worker_id} perdió el lease de la generación {pk}")
+                    return
+        finally:
+            connection.close()
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_newsgeneration_manual_urls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text='Intentos de procesamiento realizados'),
+        ),
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='available_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Momento a partir del cual un worker puede tomar el trabajo'),
+        ),
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='locked_by',
+            field=models.CharField(blank=True, help_text='Worker que tiene tomado el trabajo', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, help_text='Vencimiento del lease del worker', null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_newsgeneration_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url_hash', models.CharField(max_length=64, unique=True)),
+                ('url', models.TextField(help_text='URL canónica')),
+                ('title', models.CharField(max_length=500)),
+                ('content', models.TextField()),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=64)),
+                ('size', models.PositiveIntegerField(default=0, help_text='Tamaño aproximado de la entrada en bytes')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('fetched_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Artículo en caché',
+                'verbose_name_plural': 'Artículos en caché',
+            },
+        ),
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='generation_metadata',
+            field=models.JSONField(blank=True, default=dict, help_text='Métricas del proceso de generación (caché, llamadas a la API, etc.)'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_articlecache_generation_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlecache',
+            name='image',
+            field=models.TextField(blank=True, help_text='Imagen principal del artículo'),
+        ),
+        migrations.AddField(
+            model_name='articlecache',
+            name='published_at',
+            field=models.CharField(blank=True, help_text='Fecha de publicación declarada por la fuente', max_length=64),
+        ),
+    ]
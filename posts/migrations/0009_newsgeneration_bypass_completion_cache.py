@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_articlecache_published_at_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='bypass_completion_cache',
+            field=models.BooleanField(default=False, help_text='Pedir respuestas nuevas al modelo aunque haya una idéntica en caché', verbose_name='Ignorar caché de IA'),
+        ),
+    ]
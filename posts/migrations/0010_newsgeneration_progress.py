@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_newsgeneration_bypass_completion_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='progress_tokens',
+            field=models.PositiveIntegerField(default=0, help_text='Tokens recibidos del modelo hasta el momento'),
+        ),
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
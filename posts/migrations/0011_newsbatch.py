@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_newsgeneration_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('SUBMITTED', 'Enviado'), ('COMPLETED', 'Completado'), ('FAILED', 'Fallido')], default='SUBMITTED', max_length=20)),
+                ('remote_id', models.CharField(blank=True, help_text='ID del batch en el proveedor', max_length=100)),
+                ('remote_status', models.CharField(blank=True, help_text='Último estado informado por el proveedor', max_length=30)),
+                ('input_file', models.CharField(blank=True, help_text='Archivo JSONL enviado', max_length=500)),
+                ('input_file_id', models.CharField(blank=True, max_length=100)),
+                ('output_file_id', models.CharField(blank=True, max_length=100)),
+                ('error_file_id', models.CharField(blank=True, max_length=100)),
+                ('request_count', models.PositiveIntegerField(default=0)),
+                ('completed_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('checked_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Lote de generación',
+                'verbose_name_plural': 'Lotes de generación',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='newsgeneration',
+            name='batch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generations', to='posts.newsbatch', verbose_name='Lote'),
+        ),
+    ]
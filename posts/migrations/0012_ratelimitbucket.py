@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_newsbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('tokens', models.FloatField(help_text='Nivel del bucket en updated_at')),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Límite de uso de API',
+                'verbose_name_plural': 'Límites de uso de API',
+            },
+        ),
+    ]
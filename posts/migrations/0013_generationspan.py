@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('total', 'Generación completa'), ('fetch', 'Descarga'), ('extract', 'Extracción'), ('context', 'Armado de contexto'), ('completion', 'Llamada al modelo'), ('db_write', 'Escritura en base de datos')], max_length=20)),
+                ('label', models.CharField(blank=True, help_text='URL, modelo o columnas escritas', max_length=500)),
+                ('started_at', models.DateTimeField()),
+                ('duration_ms', models.FloatField()),
+                ('prompt_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('completion_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('cached', models.BooleanField(default=False, help_text='Resuelto desde caché sin llamar al servicio externo')),
+                ('error', models.CharField(blank=True, max_length=500)),
+                ('generation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spans', to='posts.newsgeneration', verbose_name='Generación')),
+            ],
+            options={
+                'verbose_name': 'Tramo de generación',
+                'verbose_name_plural': 'Tramos de generación',
+                'ordering': ['started_at'],
+                'indexes': [models.Index(fields=['stage', 'started_at'], name='posts_gener_stage_6aa377_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_generationspan'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='newsgeneration',
+            index=models.Index(fields=['-created_at'], name='newsgen_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsgeneration',
+            index=models.Index(fields=['status', '-created_at'], name='newsgen_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsgeneration',
+            index=models.Index(fields=['created_by', '-created_at'], name='newsgen_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('published', True)), fields=['-created_at', '-id'], name='post_published_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('published', False)), fields=['-created_at'], name='post_draft_recent_idx'),
+        ),
+    ]
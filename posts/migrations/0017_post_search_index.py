@@ -0,0 +1,87 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:46
+
+import html
+
+from django.conf import settings
+from django.db import migrations
+from django.utils.html import strip_tags
+
+# Copia fija de posts/search.py al crear esta migración: si el módulo cambia,
+# la migración tiene que seguir creando lo mismo
+FTS_TABLE = 'posts_post_fts'
+FIELDS = ('title', 'excerpt', 'content', 'meta_keywords')
+POSTGRES_WEIGHTS = ('A', 'B', 'D', 'B')
+CHUNK = 500
+
+
+def _plain_text(value):
+    return html.unescape(strip_tags(value or ''))
+
+
+def _index_rows(cursor, vendor, rows):
+    documents = [(row[0], *(_plain_text(value) for value in row[1:])) for row in rows]
+    if not documents:
+        return
+    if vendor == 'sqlite':
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) VALUES ({', '.join(['%s'] * (len(FIELDS) + 1))})",
+            documents,
+        )
+    else:
+        vector = ' || '.join(f"setweight(to_tsvector(%s::regconfig, %s), '{weight}')" for weight in POSTGRES_WEIGHTS)
+        cursor.executemany(
+            f"UPDATE posts_post SET search_vector = {vector} WHERE id = %s",
+            [
+                [param for value in values for param in (settings.SEARCH_CONFIG, value)] + [pk]
+                for pk, *values in documents
+            ],
+        )
+
+
+def create_search_index(apps, schema_editor):
+    # Tabla FTS5 (SQLite) o columna tsvector + GIN (PostgreSQL), fuera del modelo
+    connection = schema_editor.connection
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return
+
+    Post = apps.get_model('posts', 'Post')
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{', '.join(FIELDS)}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            cursor.execute('ALTER TABLE posts_post ADD COLUMN IF NOT EXISTS search_vector tsvector')
+            cursor.execute('CREATE INDEX IF NOT EXISTS post_search_vector_idx ON posts_post USING gin (search_vector)')
+
+        rows = Post.objects.using(connection.alias).order_by('pk').values_list('pk', *FIELDS)
+        chunk = []
+        for row in rows.iterator(chunk_size=CHUNK):
+            chunk.append(row)
+            if len(chunk) == CHUNK:
+                _index_rows(cursor, connection.vendor, chunk)
+                chunk = []
+        _index_rows(cursor, connection.vendor, chunk)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS post_search_vector_idx')
+            cursor.execute('ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_category_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.auth.models import User
 
+from . import rendering
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -24,12 +27,21 @@ class Category(models.Model):
 
 
 class Post(models.Model):
+    RENDERED_FIELDS = ('rendered_content', 'word_count', 'reading_time', 'toc')
+
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=220, unique=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Categoría')
     excerpt = models.CharField(max_length=300, blank=True)
     image = models.ImageField(upload_to='posts/', blank=True, null=True, help_text='Imagen ilustrativa del post')
+    # Versiones redimensionadas de la imagen (ver posts/images.py); sin 'source' = pendiente
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     content = models.TextField()
+    # HTML final y datos derivados de content, calculados al guardar (ver posts/rendering.py)
+    rendered_content = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Palabras')
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Minutos de lectura')
+    toc = models.JSONField(default=list, blank=True, editable=False, verbose_name='Índice')
     
     # SEO fields
     meta_description = models.CharField(max_length=160, blank=True, help_text='Descripción para motores de búsqueda (máx. 160 caracteres)')
@@ -38,15 +50,51 @@ class Post(models.Model):
     published = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Se actualiza en bloque desde Redis o con cada visita (ver posts/view_counts.py)
+    view_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Visitas')
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listado público: published=True ordenado por fecha (id desempata)
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(published=True), name='post_published_recent_idx'),
+            # Archivo por categoría: (categoría, fecha, id) de los publicados
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(published=True), name='post_category_recent_idx'),
+            # Admin: filtro de borradores. Parcial porque el filtro booleano se
+            # escribe como "WHERE NOT published", que no usa un índice compuesto
+            models.Index(fields=['-created_at'], condition=models.Q(published=False), name='post_draft_recent_idx'),
+        ]
+
+    def image_variant_files(self):
+        """
+        Archivos de image_variants, incluidos los de imágenes anteriores
+        todavía sin borrar (claves de posts/images.py)
+        """
+        variants = self.image_variants or {}
+        return [*variants.get('stale', ()), *(name for key in ('webp', 'jpeg') for _, name in variants.get(key, ()))]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)[:220]
+        # Imagen nueva o quitada: las variantes se regeneran fuera del request y
+        # los archivos de las anteriores quedan anotados para borrarlos entonces
+        if self.image_variants and self.image_variants.get('source') != (self.image.name or None):
+            stale = self.image_variant_files()
+            self.image_variants = {'stale': stale} if stale else {}
+        update_fields = kwargs.get('update_fields')
+        if 'content' not in self.get_deferred_fields() and (update_fields is None or 'content' in update_fields):
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.RENDERED_FIELDS}
         super().save(*args, **kwargs)
 
+    def render_content(self):
+        rendered = rendering.render(self.content)
+        self.rendered_content = rendered['content']
+        self.word_count = rendered['word_count']
+        self.reading_time = rendered['reading_time']
+        self.toc = rendered['toc']
+
     def __str__(self):
         return self.title
 
@@ -64,6 +112,7 @@ class NewsGeneration(models.Model):
     tags = models.CharField(max_length=500, help_text='Tags separados por comas para buscar noticias')
     manual_urls = models.TextField(blank=True, help_text='URLs manuales separadas por saltos de línea (opcional - si se proporcionan, se usarán en lugar de búsqueda automática)')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    bypass_completion_cache = models.BooleanField(default=False, verbose_name='Ignorar caché de IA', help_text='Pedir respuestas nuevas al modelo aunque haya una idéntica en caché')
     
     # Contenido generado por IA
     generated_title = models.CharField(max_length=200, blank=True)
@@ -72,9 +121,14 @@ class NewsGeneration(models.Model):
     generated_meta_description = models.CharField(max_length=160, blank=True)
     generated_meta_keywords = models.CharField(max_length=255, blank=True)
     
+    # Progreso de la respuesta en streaming (contenido parcial en generated_content)
+    progress_tokens = models.PositiveIntegerField(default=0, help_text='Tokens recibidos del modelo hasta el momento')
+    progress_updated_at = models.DateTimeField(null=True, blank=True)
+    
     # Metadata de fuentes
     source_articles = models.JSONField(default=list, help_text='Lista de artículos fuente con URLs y metadata')
     total_sources_found = models.IntegerField(default=0)
+    generation_metadata = models.JSONField(default=dict, blank=True, help_text='Métricas del proceso de generación (caché, llamadas a la API, etc.)')
     
     # Gestión
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Creado por')
@@ -87,10 +141,25 @@ class NewsGeneration(models.Model):
     # Campos de error
     error_message = models.TextField(blank=True)
     
+    # Cola de procesamiento (ver posts/jobs.py)
+    attempts = models.PositiveIntegerField(default=0, help_text='Intentos de procesamiento realizados')
+    available_at = models.DateTimeField(default=timezone.now, help_text='Momento a partir del cual un worker puede tomar el trabajo')
+    locked_by = models.CharField(max_length=100, blank=True, help_text='Worker que tiene tomado el trabajo')
+    locked_until = models.DateTimeField(null=True, blank=True, help_text='Vencimiento del lease del worker')
+    
+    # Procesamiento por lotes (ver posts/batching.py)
+    batch = models.ForeignKey('NewsBatch', null=True, blank=True, on_delete=models.SET_NULL, related_name='generations', verbose_name='Lote')
+    
     class Meta:
         verbose_name = 'Generación de Noticia IA'
         verbose_name_plural = 'Generaciones de Noticias IA'
         ordering = ['-created_at']
+        # Filtros del changelist (estado, autor, fecha), siempre ordenados por fecha
+        indexes = [
+            models.Index(fields=['-created_at'], name='newsgen_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='newsgen_status_created_idx'),
+            models.Index(fields=['created_by', '-created_at'], name='newsgen_author_created_idx'),
+        ]
     
     def __str__(self):
         return f"IA Gen: {self.tags[:50]}... ({self.get_status_display()})"
@@ -102,4 +171,113 @@ class NewsGeneration(models.Model):
     @property
     def can_publish(self):
         return self.status == 'COMPLETED' and self.generated_title and self.generated_content
-    
+
+
+class ArticleCache(models.Model):
+    """
+    Resultado de extraer una URL fuente, reutilizable entre generaciones.
+    Se revalida con If-None-Match/If-Modified-Since (ver posts/article_cache.py).
+    """
+    url_hash = models.CharField(max_length=64, unique=True)
+    url = models.TextField(help_text='URL canónica')
+    title = models.CharField(max_length=500)
+    content = models.TextField()
+    published_at = models.CharField(max_length=64, blank=True, help_text='Fecha de publicación declarada por la fuente')
+    image = models.TextField(blank=True, help_text='Imagen principal del artículo')
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    size = models.PositiveIntegerField(default=0, help_text='Tamaño aproximado de la entrada en bytes')
+    hits = models.PositiveIntegerField(default=0)
+    fetched_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'Artículo en caché'
+        verbose_name_plural = 'Artículos en caché'
+
+    def __str__(self):
+        return self.url
+
+
+class NewsBatch(models.Model):
+    """
+    Lote de generaciones enviado a la Batch API de OpenAI (ver posts/batching.py)
+    """
+    STATUS_CHOICES = [
+        ('SUBMITTED', 'Enviado'),
+        ('COMPLETED', 'Completado'),
+        ('FAILED', 'Fallido'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='SUBMITTED')
+    remote_id = models.CharField(max_length=100, blank=True, help_text='ID del batch en el proveedor')
+    remote_status = models.CharField(max_length=30, blank=True, help_text='Último estado informado por el proveedor')
+    input_file = models.CharField(max_length=500, blank=True, help_text='Archivo JSONL enviado')
+    input_file_id = models.CharField(max_length=100, blank=True)
+    output_file_id = models.CharField(max_length=100, blank=True)
+    error_file_id = models.CharField(max_length=100, blank=True)
+    request_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Lote de generación'
+        verbose_name_plural = 'Lotes de generación'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Lote #{self.pk} ({self.get_status_display()}, {self.request_count} generaciones)"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Estado compartido de un token bucket (ver posts/rate_limit.py)
+    """
+    name = models.CharField(max_length=50, unique=True)
+    tokens = models.FloatField(help_text='Nivel del bucket en updated_at')
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Límite de uso de API'
+        verbose_name_plural = 'Límites de uso de API'
+
+    def __str__(self):
+        return self.name
+
+
+class GenerationSpan(models.Model):
+    """
+    Tramo cronometrado de una generación: descarga, extracción, llamada al
+    modelo, escritura en base de datos... (ver posts/tracing.py)
+    """
+    STAGE_CHOICES = [
+        ('total', 'Generación completa'),
+        ('fetch', 'Descarga'),
+        ('extract', 'Extracción'),
+        ('context', 'Armado de contexto'),
+        ('completion', 'Llamada al modelo'),
+        ('db_write', 'Escritura en base de datos'),
+    ]
+
+    generation = models.ForeignKey(NewsGeneration, on_delete=models.CASCADE, related_name='spans', verbose_name='Generación')
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    label = models.CharField(max_length=500, blank=True, help_text='URL, modelo o columnas escritas')
+    started_at = models.DateTimeField()
+    duration_ms = models.FloatField()
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cached = models.BooleanField(default=False, help_text='Resuelto desde caché sin llamar al servicio externo')
+    error = models.CharField(max_length=500, blank=True)
+
+    class Meta:
+        verbose_name = 'Tramo de generación'
+        verbose_name_plural = 'Tramos de generación'
+        ordering = ['started_at']
+        indexes = [models.Index(fields=['stage', 'started_at'])]
+
+    def __str__(self):
+        return f"{self.get_stage_display()} ({self.duration_ms:.0f} ms)"
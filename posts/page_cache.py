@@ -0,0 +1,159 @@
+"""
+Caché de las páginas públicas del blog para lectores anónimos.
+
+Las respuestas se guardan completas en el alias PAGE_CACHE, compartido entre
+procesos. Cada listado (el general y el de cada categoría) tiene su número de
+versión dentro de la clave; los signals de posts/signals.py lo incrementan cuando
+cambia algo que ese listado muestra, así sus páginas cacheadas dejan de usarse a
+la vez, las de los demás listados siguen sirviéndose y las viejas expiran solas.
+
+El sidebar (populares y categorías) aparece en todas las páginas: su versión
+entra en la clave de cada listado y en el ETag de cada post, y se incrementa
+cuando cambia lo que muestra (posts/sidebar.py).
+
+La página de cada post se guarda con su ETag (ver posts/views.py): sólo se
+sirve si coincide con el ETag actual, y se borra al guardar o borrar el post.
+Cada página se guarda con sus encabezados (Content-Type, Cache-Control, Vary)
+y se devuelve con los mismos.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .pagination import decode_cursor
+
+logger = logging.getLogger(__name__)
+
+ALL_POSTS = 'all'
+SIDEBAR = 'sidebar'
+
+
+def _cache():
+    return caches[settings.PAGE_CACHE]
+
+
+def is_cacheable(request):
+    """
+    Sólo GET/HEAD anónimos y sin mensajes pendientes, que de otro modo
+    quedarían guardados en la página
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _new_version():
+    # Basada en la hora: si el backend descarta la clave de versión, la nueva
+    # no coincide con la de páginas guardadas antes
+    return int(time.time() * 1000)
+
+
+def _version(key):
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key) or _new_version()
+    return version
+
+
+def bump(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_version(), timeout=None)
+
+
+def category_scope(category_id):
+    return f"category:{category_id}"
+
+
+def _list_version_key(scope):
+    return f"posts:list:version:{scope}"
+
+
+def list_key(params, scope=ALL_POSTS):
+    """
+    Clave de una página del listado `scope` según ?after, ?before o ?page
+    (numeración anterior); None si el parámetro no es válido y no conviene
+    cachearla
+    """
+    if params.get('after') or params.get('before'):
+        name = 'after' if params.get('after') else 'before'
+        position = params[name]
+        if decode_cursor(position) is None:
+            return None
+    elif 'page' in params:
+        name, position = 'page', params['page'] or '1'
+        if not position.isdigit() or len(position) > 6:
+            return None
+    else:
+        name, position = 'first', ''
+    try:
+        version = f"v{_version(_list_version_key(scope))}.{_version(_list_version_key(SIDEBAR))}"
+        return f"posts:list:{scope}:{version}:{name}:{position}"
+    except Exception as e:
+        logger.warning(f"Caché de páginas no disponible: {e}")
+        return None
+
+
+def invalidate_lists(*scopes):
+    try:
+        for scope in set(scopes or (ALL_POSTS,)):
+            bump(_list_version_key(scope))
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la caché de páginas: {e}")
+
+
+def sidebar_version():
+    """
+    Versión actual del sidebar ('' si la caché no está disponible)
+    """
+    try:
+        return _version(_list_version_key(SIDEBAR))
+    except Exception as e:
+        logger.warning(f"Caché de páginas no disponible: {e}")
+        return ''
+
+
+def detail_key(slug):
+    return f"posts:detail:{slug}"
+
+
+def invalidate_detail(*slugs):
+    try:
+        _cache().delete_many([detail_key(slug) for slug in slugs if slug])
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la caché de páginas: {e}")
+
+
+def get_response(key, etag=None):
+    try:
+        cached = _cache().get(key)
+    except Exception as e:
+        # Sin caché la página se genera igual
+        logger.warning(f"Caché de páginas no disponible: {e}")
+        return None
+    # Entradas de otro formato (guardadas por una versión anterior) no se usan
+    if not isinstance(cached, dict) or cached.get('etag') != etag:
+        return None
+    response = HttpResponse(cached['content'])
+    for header, value in cached['headers'].items():
+        response[header] = value
+    return response
+
+
+def store_response(key, response, etag=None):
+    if response.status_code != 200:
+        return
+    try:
+        _cache().set(key, {'content': response.content, 'headers': dict(response.items()), 'etag': etag})
+    except Exception as e:
+        logger.warning(f"Caché de páginas no disponible: {e}")
@@ -0,0 +1,100 @@
+"""
+Paginación por cursor (keyset) para el listado público.
+
+Cada página se pide relativa a un post: `?after=<cursor>` trae los siguientes
+más antiguos y `?before=<cursor>` los anteriores más nuevos. La consulta filtra
+por (created_at, id) y usa el índice post_published_recent_idx, así que cuesta
+lo mismo en la primera página que en la número mil y no necesita COUNT(*).
+"""
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(post):
+    raw = f"{post.created_at.isoformat()}|{post.pk}"
+    return urlsafe_b64encode(raw.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(value):
+    """
+    (created_at, id) del cursor, o None si no es válido
+    """
+    if not value or len(value) > 64:
+        return None
+    try:
+        raw = urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('ascii')
+        created_at, pk = raw.split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+class KeysetPage:
+    keyset = True
+
+    def __init__(self, object_list, has_previous, has_next):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0])
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1])
+
+
+class KeysetPaginator:
+    """
+    Pagina un queryset ordenado por fecha de creación descendente
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.order_by('-created_at', '-id')
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        after = decode_cursor(after)
+        before = decode_cursor(before)
+
+        if before is not None:
+            created_at, pk = before
+            rows = list(
+                self.queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, id__lte=pk)
+                .order_by('created_at', 'id')[:self.per_page + 1]
+            )
+            if len(rows) <= self.per_page:
+                # Se llegó a los más nuevos: mostrar la primera página completa
+                return self.page()
+            return KeysetPage(rows[:self.per_page][::-1], has_previous=True, has_next=True)
+
+        queryset = self.queryset
+        if after is not None:
+            created_at, pk = after
+            queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=pk)
+
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], has_previous=after is not None, has_next=len(rows) > self.per_page)
@@ -0,0 +1,241 @@
+"""
+Límite de uso de la API de OpenAI compartido entre procesos.
+
+Cada límite (peticiones/minuto y tokens/minuto) es un token bucket guardado en
+la tabla RateLimitBucket. Los procesos descuentan del bucket con un UPDATE
+condicional sobre el nivel y la hora leídos (compare-and-swap, como la cola de
+posts/jobs.py), así que gunicorn y los workers comparten el mismo cupo sin
+bloqueos. Antes de cada llamada se reserva el tamaño estimado (prompt +
+max_tokens) y después se devuelve lo que no se usó.
+
+Si no hay cupo el proceso espera a que el bucket se recargue. No hay una cola
+de prioridad entre procesos (haría falta una tabla de espera y turnos): la
+prioridad es un piso. Las llamadas de prioridad baja no pueden bajar el bucket
+del margen NEWS_RATE_LIMIT_RESERVE, así que cuando el cupo escasea esperan
+ellas y las de prioridad alta siguen encontrando lugar; entre llamadas de la
+misma prioridad no hay orden garantizado. Un 429 vacía los buckets durante el
+Retry-After para que todos los procesos frenen a la vez.
+
+Lo reservado vuelve al bucket si la llamada falla (reconcile con 0 tokens
+usados) o si la reserva se interrumpe a mitad de camino (release).
+"""
+import asyncio
+import logging
+import math
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 'high'
+PRIORITY_LOW = 'low'
+
+REQUESTS_BUCKET = 'openai:requests'
+TOKENS_BUCKET = 'openai:tokens'
+
+
+class RateLimitExceeded(Exception):
+    """
+    No se consiguió cupo dentro del tiempo máximo de espera
+    """
+
+
+def estimate_tokens(text):
+    """
+    Estimación conservadora de tokens de un texto (~4 caracteres por token)
+    """
+    return math.ceil(len(text) / 4)
+
+
+class Bucket:
+
+    def __init__(self, name, per_minute):
+        self.name = name
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+
+    def _row(self):
+        try:
+            return RateLimitBucket.objects.get_or_create(
+                name=self.name, defaults={'tokens': self.capacity, 'updated_at': timezone.now()},
+            )[0]
+        except IntegrityError:
+            # Otro proceso lo creó al mismo tiempo
+            return RateLimitBucket.objects.get(name=self.name)
+
+    def level(self, row, now):
+        elapsed = max((now - row.updated_at).total_seconds(), 0)
+        return min(self.capacity, row.tokens + elapsed * self.rate)
+
+    def try_take(self, amount, floor=0.0):
+        """
+        Descuenta `amount` si el bucket no queda por debajo de `floor`.
+        Devuelve 0 si lo consiguió o los segundos a esperar para reintentar.
+        """
+        # Una petición más grande que el bucket se deja pasar con el bucket lleno
+        amount = min(amount, self.capacity - floor)
+        while True:
+            row = self._row()
+            now = timezone.now()
+            level = self.level(row, now)
+            if level - amount < floor:
+                return (amount + floor - level) / self.rate
+
+            updated = RateLimitBucket.objects.filter(
+                pk=row.pk, tokens=row.tokens, updated_at=row.updated_at,
+            ).update(tokens=level - amount, updated_at=now)
+            if updated:
+                return 0
+            # Otro proceso modificó el bucket entre la lectura y el UPDATE
+
+    def give_back(self, amount):
+        """
+        Ajusta el bucket en `amount` (positivo devuelve cupo, negativo lo consume)
+        """
+        while True:
+            row = self._row()
+            now = timezone.now()
+            level = min(self.capacity, self.level(row, now) + amount)
+            updated = RateLimitBucket.objects.filter(
+                pk=row.pk, tokens=row.tokens, updated_at=row.updated_at,
+            ).update(tokens=level, updated_at=now)
+            if updated:
+                return
+
+    def drain(self, seconds):
+        """
+        Deja el bucket en negativo para que nadie consuma durante `seconds`
+        """
+        now = timezone.now()
+        RateLimitBucket.objects.filter(name=self.name).update(
+            tokens=-seconds * self.rate, updated_at=now,
+        )
+
+
+class OpenAIRateLimiter:
+
+    def __init__(self):
+        self.requests = Bucket(REQUESTS_BUCKET, settings.NEWS_RATE_LIMIT_RPM)
+        self.tokens = Bucket(TOKENS_BUCKET, settings.NEWS_RATE_LIMIT_TPM)
+
+    @property
+    def enabled(self):
+        return settings.NEWS_RATE_LIMIT_ENABLED
+
+    def _try_acquire(self, estimated_tokens, reserve):
+        """
+        Reserva una petición y `estimated_tokens` tokens, o ninguna de las dos.
+        Devuelve 0 si lo consiguió o los segundos a esperar para reintentar.
+        """
+        wait = self.requests.try_take(1, floor=reserve * self.requests.capacity)
+        if wait:
+            return wait
+        try:
+            wait = self.tokens.try_take(estimated_tokens, floor=reserve * self.tokens.capacity)
+        except BaseException:
+            self.requests.give_back(1)
+            raise
+        if wait:
+            # Sin tokens: devolver la petición reservada y esperar
+            self.requests.give_back(1)
+        return wait
+
+    def _exceeded(self, started, estimated_tokens, priority):
+        return RateLimitExceeded(
+            f"Sin cupo de OpenAI tras esperar {time.monotonic() - started:.0f}s "
+            f"(necesarios {estimated_tokens} tokens, prioridad {priority})"
+        )
+
+    def acquire(self, estimated_tokens, priority=PRIORITY_HIGH, max_wait=None):
+        """
+        Espera hasta reservar una petición y `estimated_tokens` tokens.
+        Devuelve los segundos esperados; lanza RateLimitExceeded si se supera max_wait.
+        """
+        if not self.enabled:
+            return 0.0
+
+        max_wait = settings.NEWS_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        reserve = settings.NEWS_RATE_LIMIT_RESERVE if priority == PRIORITY_LOW else 0.0
+        started = time.monotonic()
+        deadline = started + max_wait
+
+        while True:
+            wait = self._try_acquire(estimated_tokens, reserve)
+            if not wait:
+                return time.monotonic() - started
+            if time.monotonic() + wait > deadline:
+                raise self._exceeded(started, estimated_tokens, priority)
+            time.sleep(min(wait, settings.NEWS_RATE_LIMIT_POLL_INTERVAL))
+
+    async def aacquire(self, estimated_tokens, priority=PRIORITY_HIGH, max_wait=None):
+        """
+        Versión asíncrona de acquire: la espera no bloquea el event loop
+        """
+        if not self.enabled:
+            return 0.0
+
+        max_wait = settings.NEWS_RATE_LIMIT_MAX_WAIT if max_wait is None else max_wait
+        reserve = settings.NEWS_RATE_LIMIT_RESERVE if priority == PRIORITY_LOW else 0.0
+        started = time.monotonic()
+        deadline = started + max_wait
+
+        while True:
+            attempt = asyncio.ensure_future(sync_to_async(self._try_acquire)(estimated_tokens, reserve))
+            try:
+                wait = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                # La reserva sigue en su hilo: si llegó a tomar cupo, se devuelve
+                if not await attempt:
+                    await sync_to_async(self.release)(estimated_tokens)
+                raise
+            if not wait:
+                return time.monotonic() - started
+            if time.monotonic() + wait > deadline:
+                raise self._exceeded(started, estimated_tokens, priority)
+            await asyncio.sleep(min(wait, settings.NEWS_RATE_LIMIT_POLL_INTERVAL))
+
+    def release(self, estimated_tokens):
+        """
+        Devuelve una reserva completa de una llamada que no llegó a hacerse
+        """
+        if self.enabled:
+            self.requests.give_back(1)
+            self.tokens.give_back(estimated_tokens)
+
+    def reconcile(self, estimated_tokens, used_tokens):
+        """
+        Devuelve al bucket lo reservado de más (o descuenta lo que faltó)
+        """
+        if self.enabled and used_tokens is not None and used_tokens != estimated_tokens:
+            self.tokens.give_back(estimated_tokens - used_tokens)
+
+    def throttled(self, retry_after):
+        """
+        La API respondió 429: frenar a todos los procesos durante retry_after segundos
+        """
+        if not self.enabled:
+            return
+        logger.warning(f"OpenAI devolvió 429; pausando las llamadas {retry_after:.1f}s")
+        self.requests.drain(retry_after)
+        self.tokens.drain(retry_after)
+
+
+def retry_after_seconds(error, default=None):
+    """
+    Segundos de espera que indica un openai.RateLimitError
+    """
+    default = settings.NEWS_RATE_LIMIT_BACKOFF if default is None else default
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    for header, scale in (('retry-after-ms', 0.001), ('retry-after', 1)):
+        try:
+            return float(headers[header]) * scale
+        except (KeyError, TypeError, ValueError):
+            continue
+    return default
@@ -0,0 +1,163 @@
+"""
+Renderizado del HTML de los posts al guardarlos, no al mostrarlos.
+
+Post.save pasa `content` por `render` cuando cambia y guarda el resultado en
+rendered_content junto con word_count, reading_time y toc; post_detail sólo
+emite esos bytes. `render`:
+
+- quita restos del modelo de IA: bloques ```html, envoltorios <html>/<body>,
+  comentarios y párrafos vacíos;
+- normaliza los títulos: el más alto pasa a ser <h2> (el <h1> es el título del
+  post) y no se saltean niveles;
+- deja sólo las etiquetas y atributos de ALLOWED_TAGS, sin scripts, estilos ni
+  URLs javascript:, vbscript:, data: o file: (las rutas relativas se conservan);
+- agrega ids a los <h2>/<h3> para el índice (toc) y colapsa espacios.
+
+Si cambian estas reglas, `python manage.py rerender_posts` vuelve a procesar
+todos los posts.
+"""
+import math
+import re
+
+from bs4 import BeautifulSoup, Comment, NavigableString
+from django.conf import settings
+from django.utils.text import slugify
+
+# Etiqueta -> atributos permitidos
+ALLOWED_TAGS = {
+    'p': (), 'br': (), 'hr': (),
+    'h2': (), 'h3': (), 'h4': (), 'h5': (), 'h6': (),
+    'strong': (), 'b': (), 'em': (), 'i': (), 'u': (), 's': (), 'sub': (), 'sup': (), 'mark': (), 'small': (),
+    'a': ('href', 'title'),
+    'ul': (), 'ol': ('start',), 'li': (),
+    'blockquote': ('cite',), 'q': (), 'cite': (), 'code': (), 'pre': (), 'abbr': ('title',),
+    'table': (), 'caption': (), 'thead': (), 'tbody': (), 'tfoot': (), 'tr': (),
+    'th': ('colspan', 'rowspan', 'scope'), 'td': ('colspan', 'rowspan'),
+    'figure': (), 'figcaption': (), 'img': ('src', 'alt', 'title', 'width', 'height'),
+}
+# Se borran con su contenido; las demás etiquetas desconocidas se reemplazan por su contenido
+DROP_TAGS = (
+    'script', 'style', 'iframe', 'object', 'embed', 'form', 'input', 'button', 'select', 'textarea',
+    'noscript', 'template', 'svg', 'math', 'head', 'title', 'meta', 'link',
+)
+BLOCK_TAGS = frozenset((
+    'p', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'blockquote', 'pre', 'table', 'caption',
+    'thead', 'tbody', 'tfoot', 'tr', 'th', 'td', 'figure', 'figcaption', 'hr', 'br',
+))
+# Esquemas que ejecutan código o incrustan documentos; las rutas relativas y los
+# demás esquemas pasan
+UNSAFE_URL = re.compile(r'^(javascript|vbscript|data|file):', re.IGNORECASE)
+TOC_LEVELS = ('h2', 'h3')
+
+_fence = re.compile(r'^\s*```[\w-]*\s*$', re.MULTILINE)
+_spaces = re.compile(r'\s+')
+_controls = re.compile(r'[\x00-\x20]+')
+_words = re.compile(r'\w+', re.UNICODE)
+
+
+def _strip_fences(html):
+    # El modelo a veces devuelve el HTML dentro de un bloque de código markdown
+    return _fence.sub('', html)
+
+
+def _safe_url(url):
+    # Los navegadores ignoran espacios y caracteres de control dentro del esquema ("java\tscript:")
+    return not UNSAFE_URL.match(_controls.sub('', url))
+
+
+def _sanitize(soup):
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    for tag in soup.find_all(DROP_TAGS):
+        tag.decompose()
+
+    for tag in soup.find_all(True):
+        if tag.name == 'h1':
+            tag.name = 'h2'
+        if tag.name not in ALLOWED_TAGS:
+            tag.unwrap()
+            continue
+        allowed = ALLOWED_TAGS[tag.name]
+        tag.attrs = {name: value for name, value in tag.attrs.items() if name in allowed}
+        for name in ('href', 'src'):
+            if name in tag.attrs and not _safe_url(str(tag[name])):
+                del tag[name]
+        if tag.name == 'img' and 'src' not in tag.attrs:
+            tag.decompose()
+        elif tag.name == 'a' and 'href' not in tag.attrs:
+            tag.unwrap()
+        elif tag.name == 'a' and str(tag['href']).lower().startswith('http'):
+            tag['rel'] = 'nofollow noopener'
+
+
+def _normalize_headings(soup):
+    headings = soup.find_all(('h2', 'h3', 'h4', 'h5', 'h6'))
+    levels = sorted({int(tag.name[1]) for tag in headings})
+    # 2, 4, 5 -> 2, 3, 4
+    mapping = {level: min(index + 2, 6) for index, level in enumerate(levels)}
+    for tag in headings:
+        tag.name = f"h{mapping[int(tag.name[1])]}"
+
+
+def _drop_empty(soup):
+    for tag in soup.find_all(('p', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'strong', 'em', 'b', 'i')):
+        if not tag.get_text(strip=True) and not tag.find(('img', 'br')):
+            tag.decompose()
+
+
+def _next_to_block(text):
+    # Un espacio junto a un bloque, o al principio o al final de uno, no se ve
+    for sibling in (text.previous_sibling, text.next_sibling):
+        if sibling is None and text.parent.name in BLOCK_TAGS | {'[document]'}:
+            return True
+        if getattr(sibling, 'name', None) in BLOCK_TAGS:
+            return True
+    return False
+
+
+def _collapse_whitespace(soup):
+    for text in soup.find_all(string=True):
+        if text.find_parent('pre'):
+            continue
+        collapsed = _spaces.sub(' ', str(text))
+        if not collapsed.strip() and _next_to_block(text):
+            text.extract()
+        elif collapsed != str(text):
+            text.replace_with(NavigableString(collapsed))
+
+
+def _table_of_contents(soup):
+    toc = []
+    used = set()
+    for tag in soup.find_all(TOC_LEVELS):
+        title = _spaces.sub(' ', tag.get_text()).strip()
+        base = slugify(title)[:60] or 'seccion'
+        anchor, number = base, 2
+        while anchor in used:
+            anchor, number = f"{base}-{number}", number + 1
+        used.add(anchor)
+        tag['id'] = anchor
+        toc.append({'level': int(tag.name[1]), 'id': anchor, 'title': title})
+    return toc
+
+
+def render(html):
+    """
+    HTML final del artículo y sus datos derivados: dict con content,
+    word_count, reading_time (minutos) y toc
+    """
+    soup = BeautifulSoup(_strip_fences(html or ''), 'html.parser')
+    _sanitize(soup)
+    _normalize_headings(soup)
+    _drop_empty(soup)
+    toc = _table_of_contents(soup)
+    _collapse_whitespace(soup)
+
+    content = str(soup).strip()
+    word_count = len(_words.findall(soup.get_text(' ')))
+    return {
+        'content': content,
+        'word_count': word_count,
+        'reading_time': math.ceil(word_count / settings.READING_WORDS_PER_MINUTE) if word_count else 0,
+        'toc': toc,
+    }
@@ -0,0 +1,203 @@
+"""
+Búsqueda de texto completo sobre título, bajada, contenido y palabras clave.
+
+En SQLite los posts se indexan en la tabla FTS5 posts_post_fts (rowid = id del
+post) y en PostgreSQL en la columna tsvector posts_post.search_vector con un
+índice GIN. Ninguna de las dos está en el modelo: las crea y llena la migración
+0017. posts/signals.py reindexa cada post al guardarlo, así que una búsqueda
+recorre sólo las entradas del índice para los términos pedidos, no la tabla.
+Con otros motores se cae a icontains.
+
+`python manage.py rebuild_search_index` arma el índice completo de nuevo (por
+ejemplo después de un .update() masivo, que no dispara signals).
+"""
+import html
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'posts_post_fts'
+FIELDS = ('title', 'excerpt', 'content', 'meta_keywords')
+# Peso de cada campo en el ranking, en el orden de FIELDS
+SQLITE_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+POSTGRES_WEIGHTS = ('A', 'B', 'D', 'B')
+
+MAX_TERMS = 10
+REBUILD_CHUNK = 500
+
+_terms = re.compile(r'\w+', re.UNICODE)
+
+
+def backend(connection=None):
+    vendor = (connection or default_connection).vendor
+    return vendor if vendor in ('sqlite', 'postgresql') else None
+
+
+def plain_text(value):
+    return html.unescape(strip_tags(value or ''))
+
+
+def create_index(connection):
+    with connection.cursor() as cursor:
+        if backend(connection) == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{', '.join(FIELDS)}, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        elif backend(connection) == 'postgresql':
+            cursor.execute('ALTER TABLE posts_post ADD COLUMN IF NOT EXISTS search_vector tsvector')
+            cursor.execute('CREATE INDEX IF NOT EXISTS post_search_vector_idx ON posts_post USING gin (search_vector)')
+
+
+def drop_index(connection):
+    with connection.cursor() as cursor:
+        if backend(connection) == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        elif backend(connection) == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS post_search_vector_idx')
+            cursor.execute('ALTER TABLE posts_post DROP COLUMN IF EXISTS search_vector')
+
+
+def index_rows(rows, connection=None):
+    """
+    Indexa filas (id, title, excerpt, content, meta_keywords), reemplazando
+    lo que hubiera para esos posts
+    """
+    connection = connection or default_connection
+    documents = [(row[0], *(plain_text(value) for value in row[1:])) for row in rows]
+    if not documents:
+        return
+
+    with connection.cursor() as cursor:
+        if backend(connection) == 'sqlite':
+            ids = [document[0] for document in documents]
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids)
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) VALUES ({', '.join(['%s'] * (len(FIELDS) + 1))})",
+                documents,
+            )
+        elif backend(connection) == 'postgresql':
+            vector = ' || '.join(f"setweight(to_tsvector(%s::regconfig, %s), '{weight}')" for weight in POSTGRES_WEIGHTS)
+            cursor.executemany(
+                f"UPDATE posts_post SET search_vector = {vector} WHERE id = %s",
+                [
+                    [param for value in values for param in (settings.SEARCH_CONFIG, value)] + [pk]
+                    for pk, *values in documents
+                ],
+            )
+
+
+def index_posts(posts):
+    index_rows([(post.pk, *(getattr(post, field) for field in FIELDS)) for post in posts])
+
+
+def remove_posts(post_ids):
+    # En PostgreSQL el vector se borra con la fila
+    if backend() == 'sqlite' and post_ids:
+        with default_connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(post_ids))})", list(post_ids))
+
+
+def rebuild(queryset, connection=None):
+    """
+    Reindexa todos los posts de `queryset` por bloques; devuelve cuántos
+    """
+    connection = connection or default_connection
+    if backend(connection) == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    count = 0
+    rows = queryset.order_by('pk').values_list('pk', *FIELDS)
+    chunk = []
+    for row in rows.iterator(chunk_size=REBUILD_CHUNK):
+        chunk.append(row)
+        if len(chunk) == REBUILD_CHUNK:
+            index_rows(chunk, connection)
+            count += len(chunk)
+            chunk = []
+    index_rows(chunk, connection)
+    return count + len(chunk)
+
+
+def _match_expression(query):
+    # Cada palabra entre comillas (sin operadores de FTS5) y como prefijo:
+    # "inteligencia artificial" busca inteligencia* AND artificial*
+    return ' '.join(f'"{term}"*' for term in _terms.findall(query)[:MAX_TERMS])
+
+
+def _matching_sql(query):
+    """
+    (sql, params) de una subconsulta con los ids que coinciden, o None si la
+    búsqueda no tiene términos
+    """
+    if not _terms.search(query):
+        return None
+    if backend() == 'sqlite':
+        return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_match_expression(query)]
+    return (
+        "SELECT id FROM posts_post WHERE search_vector @@ websearch_to_tsquery(%s::regconfig, %s)",
+        [settings.SEARCH_CONFIG, query],
+    )
+
+
+def _fallback_filter(query):
+    condition = Q()
+    for term in _terms.findall(query)[:MAX_TERMS]:
+        condition &= Q(*[Q(**{f"{field}__icontains": term}) for field in FIELDS], _connector=Q.OR)
+    return condition
+
+
+def filter_posts(queryset, query):
+    """
+    Posts de `queryset` que coinciden con la búsqueda, sin cambiar el orden
+    (lo usa el buscador del admin)
+    """
+    if backend() is None:
+        return queryset.filter(_fallback_filter(query))
+    matching = _matching_sql(query)
+    if matching is None:
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(*matching))
+
+
+def ranked_ids(query, limit=None):
+    """
+    Ids de los posts publicados que coinciden, del más relevante al menos
+    """
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    if backend() is None:
+        return list(
+            Post.objects.filter(_fallback_filter(query), published=True).values_list('id', flat=True)[:limit]
+        )
+    if not _terms.search(query):
+        return []
+
+    if backend() == 'sqlite':
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        sql = (
+            f"SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} JOIN posts_post ON posts_post.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH %s AND posts_post.published "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}), posts_post.created_at DESC LIMIT %s"
+        )
+        params = [_match_expression(query), limit]
+    else:
+        sql = (
+            "SELECT id FROM posts_post, websearch_to_tsquery(%s::regconfig, %s) query "
+            "WHERE posts_post.published AND search_vector @@ query "
+            "ORDER BY ts_rank_cd(search_vector, query) DESC, created_at DESC LIMIT %s"
+        )
+        params = [settings.SEARCH_CONFIG, query, limit]
+
+    with default_connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,303 @@
+"""
+Variante asíncrona del pipeline de generación (descarga, extracción, prompt y
+guardado) para procesar muchas NewsGeneration a la vez en un solo event loop.
+
+Usa los mismos prompts, caché de completions y límite de uso que
+OpenAINewsGenerator, pero con openai.AsyncOpenAI y httpx.AsyncClient
+compartidos entre todas las generaciones del proceso. La concurrencia se acota
+con NEWS_ASYNC_CONCURRENCY (generaciones en curso), NEWS_ASYNC_OPENAI_CONCURRENCY
+(llamadas simultáneas a OpenAI) y los límites de descarga de posts.fetching.
+
+Las generaciones sin URLs manuales usan siempre el prompt de llamada única y
+las respuestas no se reciben en streaming.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+
+import httpx
+import openai
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.conf import settings
+
+from . import article_cache, context_packing, tracing
+from .extraction import incremental_extractor
+from .fetching import host_key
+from .http_client import HTML_CONTENT_TYPES, USER_AGENT, CappedRetry, NonHTMLContent
+from .models import NewsGeneration
+from .rate_limit import RateLimitExceeded, retry_after_seconds
+from .services_simple import RESULT_FIELDS, OpenAINewsGenerator, apply_generation_result, simulated_sources
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AsyncResources:
+    """
+    Clientes y semáforos compartidos por todas las generaciones de un event loop
+    """
+
+    def __init__(self, client=None, http=None):
+        self.client = client or openai.AsyncOpenAI(api_key=config('OPENAI_API_KEY', default=''))
+        self.http = http or httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT, 'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.5'},
+            follow_redirects=True,
+            timeout=httpx.Timeout(settings.NEWS_HTTP_TIMEOUT, connect=5),
+            limits=httpx.Limits(max_connections=settings.NEWS_FETCH_MAX_WORKERS * settings.NEWS_FETCH_PER_HOST),
+            transport=httpx.AsyncHTTPTransport(retries=settings.NEWS_HTTP_RETRIES),
+        )
+        self.openai_slots = asyncio.Semaphore(settings.NEWS_ASYNC_OPENAI_CONCURRENCY)
+        self.fetch_slots = asyncio.Semaphore(settings.NEWS_FETCH_MAX_WORKERS)
+        self.host_slots = defaultdict(lambda: asyncio.Semaphore(settings.NEWS_FETCH_PER_HOST))
+
+    async def aclose(self):
+        await self.http.aclose()
+        await self.client.close()
+
+
+class AsyncNewsGenerator(OpenAINewsGenerator):
+    """
+    Generador para una sola NewsGeneration; los métodos síncronos heredados
+    (prompts, validación, métricas) se reutilizan tal cual
+    """
+
+    def __init__(self, resources):
+        super().__init__(client=resources.client)
+        self.resources = resources
+        self.single_call = True
+
+    async def _acomplete(self, prompt, max_tokens, temperature, **params):
+        messages = [{"role": "user", "content": prompt}]
+        request = dict(params, max_tokens=max_tokens, temperature=temperature)
+        key = self.completion_cache.key(self.model, messages, request)
+
+        cached = await asyncio.to_thread(self._cached_completion, key)
+        if cached is not None:
+            return cached
+
+        # tiktoken puede descargar su codificación la primera vez: fuera del event loop
+        estimated = await asyncio.to_thread(context_packing.count_tokens, prompt, self.model) + max_tokens
+        retries = settings.NEWS_RATE_LIMIT_RETRIES
+        for attempt in range(retries + 1):
+            waited = await self.rate_limiter.aacquire(estimated, self.priority)
+            if waited:
+                self.metadata['rate_limit_wait'] = round(self.metadata.get('rate_limit_wait', 0) + waited, 3)
+
+            self.metadata['api_calls'] = self.metadata.get('api_calls', 0) + 1
+            started = time.monotonic()
+            try:
+                async with self.resources.openai_slots:
+                    with tracing.span('completion', self.model) as call:
+                        response = await self.client.chat.completions.create(model=self.model, messages=messages, **request)
+                        self._trace_usage(call, response.usage)
+            except openai.RateLimitError as e:
+                await sync_to_async(self.rate_limiter.reconcile)(estimated, 0)
+                self.metadata['rate_limited'] = self.metadata.get('rate_limited', 0) + 1
+                if attempt == retries:
+                    raise RateLimitExceeded(f"OpenAI sigue devolviendo 429 tras {retries} reintentos") from e
+                await sync_to_async(self.rate_limiter.throttled)(retry_after_seconds(e))
+                continue
+            except BaseException:
+                # Error de red o de la API (o cancelación): los tokens reservados no se usaron
+                await asyncio.shield(sync_to_async(self.rate_limiter.reconcile)(estimated, 0))
+                raise
+            break
+
+        content = (response.choices[0].message.content or '').strip()
+        usage = response.usage
+        used = usage.prompt_tokens + usage.completion_tokens if usage else None
+        await sync_to_async(self.rate_limiter.reconcile)(estimated, used)
+        self._count_usage(usage)
+        await asyncio.to_thread(self._store_completion, key, content, usage, started)
+        return content
+
+    async def _afetch_article(self, url, cached=None):
+        """
+        Descarga y extrae una URL leyendo el cuerpo por bloques hasta tener
+        suficiente texto (o NEWS_FETCH_MAX_BYTES)
+        """
+        if cached is not None and not article_cache.revalidates(cached):
+            return self._cached_article(url, cached)
+        try:
+            async with self.resources.fetch_slots, self.resources.host_slots[host_key(url)]:
+                http = self.resources.http
+                request = http.build_request('GET', url, headers=self._conditional_headers(cached))
+                for attempt in range(settings.NEWS_HTTP_RETRIES + 1):
+                    # El tramo de descarga llega hasta los headers; la lectura del cuerpo cuenta como extracción
+                    with tracing.span('fetch', url) as fetch:
+                        response = await http.send(request, stream=True)
+                        self._trace_response(fetch, response, cached)
+                    try:
+                        if response.status_code in RETRY_STATUSES and attempt < settings.NEWS_HTTP_RETRIES:
+                            delay = self._retry_delay(response, attempt)
+                        else:
+                            return await self._read_article(url, cached, response)
+                    finally:
+                        await response.aclose()
+                    await asyncio.sleep(delay)
+
+        except Exception as e:
+            logger.warning(f"No se pudo extraer contenido de {url}: {e}")
+            return self._extraction_error(url, str(e))
+
+    async def _read_article(self, url, cached, response):
+        if response.status_code == 304 and cached is not None:
+            return self._cached_article(url, cached)
+        response.raise_for_status()
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in HTML_CONTENT_TYPES:
+            raise NonHTMLContent(f"Tipo de contenido no soportado: {content_type}")
+
+        extractor = incremental_extractor(
+            settings.NEWS_EXTRACT_MAX_CHARS, encoding=response.charset_encoding, base_url=str(response.url),
+        )
+        bytes_read = 0
+        with tracing.span('extract', url):
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                chunk = chunk[:settings.NEWS_FETCH_MAX_BYTES - bytes_read]
+                bytes_read += len(chunk)
+                if extractor.feed(chunk) or bytes_read >= settings.NEWS_FETCH_MAX_BYTES:
+                    break
+            extracted = extractor.finish()
+
+        return self._extracted_article(url, extracted, response.headers, bytes_read)
+
+    def _retry_delay(self, response, attempt):
+        """
+        Backoff exponencial con jitter, o el Retry-After del servidor con el
+        mismo tope que la sesión síncrona
+        """
+        try:
+            return min(float(response.headers['Retry-After']), CappedRetry.RETRY_AFTER_MAX)
+        except (KeyError, ValueError):
+            delay = min(settings.NEWS_HTTP_BACKOFF * (2 ** attempt), settings.NEWS_HTTP_BACKOFF_MAX)
+            return delay + random.uniform(0, settings.NEWS_HTTP_BACKOFF)
+
+    async def _afetch_all(self, urls, cached):
+        """
+        Descarga todas las URLs con el plazo global NEWS_FETCH_DEADLINE; las que
+        no terminan a tiempo se reportan como error
+        """
+        tasks = [asyncio.ensure_future(self._afetch_article(url, cached.get(url))) for url in urls]
+        done, pending = await asyncio.wait(tasks, timeout=settings.NEWS_FETCH_DEADLINE)
+        for task in pending:
+            task.cancel()
+        return [
+            task.result() if task in done else self._extraction_error(url, 'tiempo de descarga agotado')
+            for url, task in zip(urls, tasks)
+        ]
+
+    async def agenerate_from_manual_urls(self, urls, tags):
+        urls = [url.strip() for url in urls if url.strip()]
+
+        cached = await sync_to_async(article_cache.lookup_many)(urls)
+        extracted_articles = await self._afetch_all(urls, cached)
+        self.metadata['article_cache'] = await sync_to_async(article_cache.record_results)(extracted_articles, cached)
+        self.metadata['bytes_downloaded'] = sum(article.get('bytes_read', 0) for article in extracted_articles)
+
+        if not extracted_articles:
+            raise ValueError("No se pudo extraer contenido de ninguna URL proporcionada")
+
+        tags_text = ', '.join(tags)
+        # Deduplicación, ranking de oraciones y conteo de tokens son CPU: en un
+        # thread para no frenar las demás generaciones del event loop
+        sources_context = await asyncio.to_thread(self.sources_context, extracted_articles, tags)
+        prompt, params = self.real_sources_request(tags_text, sources_context)
+        try:
+            content = await self._acomplete(prompt, **params)
+            return self.parse_real_sources_result(content, extracted_articles)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error generando artículo desde URLs reales: {e}")
+            await asyncio.to_thread(self._forget_last_completion)
+            return self._generate_fallback_content(tags_text, str(e))
+
+    async def agenerate_news_article(self, tags):
+        tags_text = ', '.join(tags)
+        prompt, params = self.single_call_request(tags_text)
+        try:
+            content = await self._acomplete(prompt, **params)
+            return self.parse_single_call_result(content)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error generando artículo en una llamada: {e}")
+            await asyncio.to_thread(self._forget_last_completion)
+            return self._generate_fallback_content(tags_text, str(e))
+
+
+class AsyncNewsGenerationService:
+
+    def __init__(self, resources):
+        self.resources = resources
+
+    async def process_news_generation(self, news_generation_id, priority=None):
+        """
+        Procesa una generación; mismo ciclo de estados y registro de tramos que
+        SimpleNewsGenerationService
+        """
+        with tracing.trace(news_generation_id) as tracer:
+            try:
+                with tracing.span('total'):
+                    return await self._process_news_generation(news_generation_id, priority)
+            finally:
+                await sync_to_async(tracer.save)()
+
+    async def _process_news_generation(self, news_generation_id, priority):
+        generator = AsyncNewsGenerator(self.resources)
+        if priority:
+            generator.priority = priority
+
+        try:
+            news_gen = await NewsGeneration.objects.aget(id=news_generation_id)
+            generator.reset_metadata(bypass_cache=news_gen.bypass_completion_cache)
+            generator.metadata['pipeline'] = 'async'
+
+            news_gen.status = 'SEARCHING'
+            news_gen.progress_tokens = 0
+            await self._save(news_gen, ['status', 'progress_tokens'])
+
+            manual_urls = [url.strip() for url in news_gen.manual_urls.strip().split('\n') if url.strip()]
+            news_gen.status = 'GENERATING'
+            await self._save(news_gen, ['status'])
+
+            if manual_urls:
+                generated = await generator.agenerate_from_manual_urls(manual_urls, news_gen.tags_list)
+                source_articles = generated.get('source_articles', [])
+            else:
+                generated = await generator.agenerate_news_article(news_gen.tags_list)
+                source_articles = simulated_sources(news_gen.tags_list)
+
+            apply_generation_result(news_gen, generated, source_articles, generator.metadata)
+            await self._save(news_gen, RESULT_FIELDS)
+
+            logger.info(f"Generación completada exitosamente para ID {news_generation_id}")
+            return news_gen
+
+        except Exception as e:
+            logger.error(f"Error procesando generación {news_generation_id}: {e}")
+            await NewsGeneration.objects.filter(id=news_generation_id).aupdate(status='ERROR', error_message=str(e))
+            raise
+
+    async def _save(self, news_gen, fields):
+        with tracing.span('db_write', ', '.join(fields)):
+            await news_gen.asave(update_fields=fields)
+
+    async def process_many(self, news_generation_ids, concurrency=None):
+        """
+        Procesa varias generaciones a la vez; devuelve un resultado o excepción por ID
+        """
+        slots = asyncio.Semaphore(concurrency or settings.NEWS_ASYNC_CONCURRENCY)
+
+        async def run(pk):
+            async with slots:
+                return await self.process_news_generation(pk)
+
+        return await asyncio.gather(*(run(pk) for pk in news_generation_ids), return_exceptions=True)
@@ -1,116 +1,437 @@
 import openai
-import requests
-from bs4 import BeautifulSoup
 from django.conf import settings
 from django.utils import timezone
 from decouple import config
 from .models import NewsGeneration
+from .fetching import fetch_concurrently
+from .http_client import BoundedBody, get_session
+from .extraction import extract_article
+from . import article_cache, context_packing, dedup, tracing
+from .completion_cache import CompletionCache
+from .rate_limit import PRIORITY_HIGH, OpenAIRateLimiter, RateLimitExceeded, retry_after_seconds
+import json
 import logging
+import re
+import time
 
 logger = logging.getLogger(__name__)
 
+# Columnas que escribe una generación terminada. Se guardan con update_fields
+# para no pisar el lease que el worker renueva en paralelo (ver posts/jobs.py).
+RESULT_FIELDS = [
+    'status', 'completed_at', 'source_articles', 'total_sources_found', 'generation_metadata',
+    'generated_title', 'generated_content', 'generated_excerpt',
+    'generated_meta_description', 'generated_meta_keywords',
+]
+
+
+_lone_surrogate = re.compile('[\ud800-\udbff]$')
+
+
+def partial_json_field(text, field):
+    """
+    Extrae el valor (posiblemente incompleto) de un campo string de un JSON
+    que todavía se está recibiendo
+    """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), text)
+    if not match:
+        return ''
+    
+    raw = []
+    escaped = False
+    for char in text[match.end():]:
+        if char == '"' and not escaped:
+            break
+        raw.append(char)
+        escaped = char == '\\' and not escaped
+    raw = ''.join(raw)
+    
+    # El corte puede caer en medio de un escape (\ o \uXXXX). strict=False
+    # acepta saltos de línea sin escapar, que el modelo a veces emite.
+    for trim in range(0, 7):
+        try:
+            value = json.loads(f'"{raw[:len(raw) - trim]}"', strict=False)
+        except ValueError:
+            continue
+        # Un emoji cortado entre sus dos \uXXXX deja medio par sustituto, que la base rechaza
+        return _lone_surrogate.sub('', value)
+    return ''
+
+
+def simulated_sources(tags_list):
+    """
+    Fuentes especializadas que se muestran cuando el artículo no parte de URLs reales
+    """
+    return [
+        {
+            'type': 'ai_research',
+            'source_name': f'Tech Research {tags_list[0].title()} Journal',
+            'focus': f'Análisis técnico de {tags_list[0]}',
+            'description': f'Investigación especializada en tendencias de {tags_list[0]}'
+        },
+        {
+            'type': 'ai_industry',  
+            'source_name': 'Industry Innovation Report',
+            'focus': f'Impacto industrial de {", ".join(tags_list[:2])}',
+            'description': f'Reporte de industria sobre innovaciones en {", ".join(tags_list[:2])}'
+        },
+        {
+            'type': 'ai_academic',
+            'source_name': f'{tags_list[0].title()} Academic Review',
+            'focus': f'Perspectiva académica sobre {tags_list[0]}',
+            'description': f'Análisis académico de desarrollos en {tags_list[0]}'
+        },
+        {
+            'type': 'ai_market',
+            'source_name': 'Market Trends Analysis',
+            'focus': f'Tendencias de mercado en {", ".join(tags_list)}',
+            'description': f'Análisis de mercado y proyecciones para {", ".join(tags_list)}'
+        },
+        {
+            'type': 'ai_expert',
+            'source_name': 'Expert Opinion Network',
+            'focus': f'Opiniones de expertos sobre {", ".join(tags_list)}',
+            'description': f'Compilación de opiniones expertas en {", ".join(tags_list)}'
+        }
+    ]
+
+
+def apply_generation_result(news_gen, generated, source_articles, metadata):
+    """
+    Copia el artículo generado a la NewsGeneration y la deja COMPLETED
+    (sin guardar: usar save(update_fields=RESULT_FIELDS))
+    """
+    news_gen.generated_title = generated['title']
+    news_gen.generated_content = generated['content']
+    news_gen.generated_excerpt = generated['excerpt']
+    news_gen.generated_meta_description = generated['meta_description']
+    news_gen.generated_meta_keywords = generated['meta_keywords']
+    news_gen.source_articles = source_articles
+    news_gen.total_sources_found = len(source_articles)
+    news_gen.generation_metadata = metadata
+    news_gen.status = 'COMPLETED'
+    news_gen.completed_at = timezone.now()
+
+
+def openai_configured():
+    api_key = config('OPENAI_API_KEY', default='')
+    return bool(api_key) and api_key != 'your-openai-api-key-here' and len(api_key) > 20
+
+
+def get_news_generation_service():
+    """
+    Decide si usar OpenAI real o simulado según la API key configurada
+    """
+    if openai_configured():
+        return SimpleNewsGenerationService()
+    return MockSimpleNewsGenerationService()
+
+
 class OpenAINewsGenerator:
-    def __init__(self):
-        self.client = openai.OpenAI(api_key=config('OPENAI_API_KEY', default=''))
+    model = "gpt-4o-mini"
+    
+    def __init__(self, client=None):
+        self.client = client or openai.OpenAI(api_key=config('OPENAI_API_KEY', default=''))
+        self.completion_cache = CompletionCache()
+        self.rate_limiter = OpenAIRateLimiter()
+        self.priority = PRIORITY_HIGH
+        self.bypass_cache = False
+        self.single_call = settings.NEWS_GENERATION_MODE == 'single'
+        self.progress_callback = None  # callable(texto_parcial, tokens_acumulados)
+        self.streamed_tokens = 0
+        self._last_completion_key = None
+        self.metadata = {}
+    
+    def reset_metadata(self, bypass_cache=False):
+        """
+        Limpia las métricas acumuladas antes de procesar una nueva generación
+        """
+        self.metadata = {
+            'generation_mode': 'single' if self.single_call else 'multi',
+            'api_calls': 0,
+        }
+        self.bypass_cache = bypass_cache
+        self.streamed_tokens = 0
+    
+    def _complete(self, prompt, max_tokens, temperature, **params):
+        """
+        Ejecuta una chat completion y devuelve el texto de la respuesta.
+        Las respuestas se guardan en la caché de completions; una petición
+        idéntica (modelo, prompt y parámetros) se responde desde la caché salvo
+        que la generación pida saltearla.
+        """
+        messages = [{"role": "user", "content": prompt}]
+        request = dict(params, max_tokens=max_tokens, temperature=temperature)
+        key = self.completion_cache.key(self.model, messages, request)
+        
+        cached = self._cached_completion(key)
+        if cached is not None:
+            return cached
+        
+        content, usage, started = self._limited_completion(
+            messages, request, context_packing.count_tokens(prompt, self.model) + max_tokens,
+        )
+        self._store_completion(key, content, usage, started)
+        return content
+    
+    def _cached_completion(self, key):
+        """
+        Respuesta en caché para la clave (None si no hay o se pidió saltear la
+        caché), llevando la cuenta de aciertos y fallos de la generación
+        """
+        self._last_completion_key = None
+        stats = self.metadata.setdefault('completion_cache', {
+            'hits': 0, 'misses': 0, 'saved_seconds': 0.0, 'saved_tokens': 0,
+        })
+        
+        if not self.bypass_cache:
+            cached = self.completion_cache.get(key)
+            if cached is not None:
+                stats['hits'] += 1
+                stats['saved_seconds'] = round(stats['saved_seconds'] + cached['latency'], 3)
+                stats['saved_tokens'] += cached['prompt_tokens'] + cached['completion_tokens']
+                return cached['content']
+        
+        stats['misses'] += 1
+        return None
+    
+    def _store_completion(self, key, content, usage, started):
+        self.completion_cache.set(key, {
+            'content': content,
+            'prompt_tokens': usage.prompt_tokens if usage else 0,
+            'completion_tokens': usage.completion_tokens if usage else 0,
+            'latency': round(time.monotonic() - started, 3),
+        })
+        self._last_completion_key = key
+    
+    def _limited_completion(self, messages, request, estimated_tokens):
+        """
+        Hace la llamada dentro del cupo compartido entre procesos (ver
+        posts/rate_limit.py). Ante un 429 frena a todos los procesos y reintenta
+        en lugar de caer en el contenido de respaldo.
+        """
+        retries = settings.NEWS_RATE_LIMIT_RETRIES
+        for attempt in range(retries + 1):
+            waited = self.rate_limiter.acquire(estimated_tokens, self.priority)
+            if waited:
+                self.metadata['rate_limit_wait'] = round(self.metadata.get('rate_limit_wait', 0) + waited, 3)
+            
+            self.metadata['api_calls'] = self.metadata.get('api_calls', 0) + 1
+            started = time.monotonic()
+            try:
+                with tracing.span('completion', self.model) as call:
+                    if self.progress_callback is not None and settings.NEWS_STREAM_COMPLETIONS:
+                        content, usage = self._stream_completion(messages, request)
+                    else:
+                        response = self.client.chat.completions.create(model=self.model, messages=messages, **request)
+                        content = (response.choices[0].message.content or '').strip()
+                        usage = response.usage
+                    self._trace_usage(call, usage)
+            except openai.RateLimitError as e:
+                self.rate_limiter.reconcile(estimated_tokens, 0)
+                self.metadata['rate_limited'] = self.metadata.get('rate_limited', 0) + 1
+                if attempt == retries:
+                    raise RateLimitExceeded(f"OpenAI sigue devolviendo 429 tras {retries} reintentos") from e
+                self.rate_limiter.throttled(retry_after_seconds(e))
+                continue
+            except BaseException:
+                # Error de red o de la API (o interrupción): los tokens reservados no se usaron
+                self.rate_limiter.reconcile(estimated_tokens, 0)
+                raise
+            
+            used = usage.prompt_tokens + usage.completion_tokens if usage else None
+            self.rate_limiter.reconcile(estimated_tokens, used)
+            self._count_usage(usage)
+            return content, usage, started
+    
+    def _trace_usage(self, call, usage):
+        if usage:
+            call['prompt_tokens'] = usage.prompt_tokens
+            call['completion_tokens'] = usage.completion_tokens
     
-    def _extract_content_from_url(self, url):
+    def _count_usage(self, usage):
+        if usage:
+            self.metadata['prompt_tokens'] = self.metadata.get('prompt_tokens', 0) + usage.prompt_tokens
+            self.metadata['completion_tokens'] = self.metadata.get('completion_tokens', 0) + usage.completion_tokens
+    
+    def _stream_completion(self, messages, request):
         """
-        Extrae el contenido completo del artículo desde la URL
+        Recibe la respuesta en streaming e informa el progreso cada
+        NEWS_STREAM_FLUSH_TOKENS tokens o NEWS_STREAM_FLUSH_SECONDS segundos
         """
+        stream = self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True,
+            stream_options={"include_usage": True}, **request
+        )
+        parts = []
+        usage = None
+        pending = 0
+        last_flush = time.monotonic()
+        
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            
+            parts.append(delta)
+            self.streamed_tokens += 1
+            pending += 1
+            now = time.monotonic()
+            if pending >= settings.NEWS_STREAM_FLUSH_TOKENS or now - last_flush >= settings.NEWS_STREAM_FLUSH_SECONDS:
+                self._report_progress(''.join(parts))
+                pending = 0
+                last_flush = now
+        
+        content = ''.join(parts)
+        self._report_progress(content)
+        return content.strip(), usage
+    
+    def _report_progress(self, text):
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remover elementos no deseados
-            for element in soup(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-                element.decompose()
-            
-            # Extraer título
-            title = ""
-            title_selectors = ['h1', 'title', '.title', '.headline']
-            for selector in title_selectors:
-                title_element = soup.select_one(selector)
-                if title_element:
-                    title = title_element.get_text().strip()
-                    break
-            
-            # Buscar el contenido principal
-            content = ""
-            selectors = [
-                'article',
-                '.article-content',
-                '.post-content', 
-                '.entry-content',
-                '.content',
-                'main',
-                '.story-body'
-            ]
+            self.progress_callback(text, self.streamed_tokens)
+        except Exception as e:
+            # El progreso es informativo: nunca debe cortar la generación
+            logger.warning(f"No se pudo registrar el progreso: {e}")
+    
+    def _forget_last_completion(self):
+        """
+        Descarta de la caché la última respuesta obtenida de la API (p.ej. JSON
+        inválido) para que un reintento vuelva a consultar al modelo
+        """
+        if self._last_completion_key:
+            self.completion_cache.delete(self._last_completion_key)
+            self._last_completion_key = None
+    
+    def _extract_content_from_url(self, url, cached=None):
+        """
+        Extrae el contenido completo del artículo desde la URL.
+        Si hay una entrada en caché se revalida con un GET condicional, o se
+        usa sin petición si la página no tenía ETag ni Last-Modified.
+        """
+        if cached is not None and not article_cache.revalidates(cached):
+            return self._cached_article(url, cached)
+        try:
+            headers = self._conditional_headers(cached)
+            
+            # Sesión compartida: reutiliza conexiones y reintenta 429/5xx.
+            # El cuerpo se lee en streaming y con tope de bytes.
+            with tracing.span('fetch', url) as fetch:
+                response = get_session().get(url, headers=headers, stream=True, timeout=(5, settings.NEWS_HTTP_TIMEOUT))
+                self._trace_response(fetch, response, cached)
+            with response:
+                if response.status_code == 304 and cached is not None:
+                    # Sin cambios: reutilizar la extracción guardada
+                    return self._cached_article(url, cached)
+                
+                response.raise_for_status()
+                
+                # El cuerpo se descarga a medida que el extractor lo consume
+                with tracing.span('extract', url):
+                    body = BoundedBody(response, settings.NEWS_FETCH_MAX_BYTES)
+                    extracted = extract_article(body, settings.NEWS_EXTRACT_MAX_CHARS, encoding=body.charset, base_url=response.url)
             
-            for selector in selectors:
-                element = soup.select_one(selector)
-                if element:
-                    # Extraer solo párrafos de texto
-                    paragraphs = element.find_all('p')
-                    content = ' '.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
-                    if len(content) > 200:  # Contenido suficiente
-                        break
-            
-            # Fallback: buscar todos los párrafos
-            if len(content) < 200:
-                paragraphs = soup.find_all('p')
-                content = ' '.join([p.get_text().strip() for p in paragraphs if p.get_text().strip()])
-            
-            return {
-                'title': title or 'Artículo sin título',
-                'content': content[:3000],  # Limitar contenido
-                'url': url
-            }
+            return self._extracted_article(url, extracted, response.headers, body.bytes_read)
             
         except Exception as e:
             logger.warning(f"No se pudo extraer contenido de {url}: {e}")
-            return {
-                'title': f'Error extrayendo: {url}',
-                'content': f'No se pudo acceder al contenido de esta URL: {str(e)}',
-                'url': url
-            }
+            return self._extraction_error(url, str(e))
+    
+    def _trace_response(self, fetch, response, cached):
+        fetch['cached'] = response.status_code == 304 and cached is not None
+        if response.status_code >= 400:
+            fetch['error'] = f"HTTP {response.status_code}"
+    
+    def _conditional_headers(self, cached):
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        return headers
+    
+    def _cached_article(self, url, cached):
+        return {
+            'title': cached.title,
+            'content': cached.content,
+            'published_at': cached.published_at,
+            'image': cached.image,
+            'url': url,
+            'cache_status': 'hit',
+            'bytes_read': 0,
+        }
+    
+    def _extracted_article(self, url, extracted, headers, bytes_read):
+        return {
+            'title': extracted['title'] or 'Artículo sin título',
+            'content': extracted['content'],
+            'published_at': extracted['published_at'],
+            'image': extracted['image'],
+            'url': url,
+            'cache_status': 'miss',
+            'etag': headers.get('ETag', ''),
+            'last_modified': headers.get('Last-Modified', ''),
+            'bytes_read': bytes_read,
+        }
+    
+    def _extraction_error(self, url, reason):
+        return {
+            'title': f'Error extrayendo: {url}',
+            'content': f'No se pudo acceder al contenido de esta URL: {reason}',
+            'url': url
+        }
     
     def generate_from_manual_urls(self, urls, tags):
         """
         Genera un artículo basándose en URLs proporcionadas manualmente
         """
-        extracted_articles = []
+        urls = [url.strip() for url in urls if url.strip()]  # Solo procesar URLs no vacías
         
-        for url in urls:
-            if url.strip():  # Solo procesar URLs no vacías
-                article_data = self._extract_content_from_url(url.strip())
-                extracted_articles.append(article_data)
+        # Descarga en paralelo, con límite por dominio y un plazo global.
+        # La caché se consulta y actualiza desde este thread; los threads de
+        # descarga no tocan la base de datos.
+        cached = article_cache.lookup_many(urls)
+        extracted_articles = fetch_concurrently(
+            urls,
+            lambda url: self._extract_content_from_url(url, cached.get(url)),
+            on_failure=lambda url: self._extraction_error(url, 'tiempo de descarga agotado'),
+        )
+        self.metadata['article_cache'] = article_cache.record_results(extracted_articles, cached)
+        self.metadata['bytes_downloaded'] = sum(article.get('bytes_read', 0) for article in extracted_articles)
         
         if not extracted_articles:
             raise ValueError("No se pudo extraer contenido de ninguna URL proporcionada")
         
-        # Preparar contexto para la IA
-        sources_context = ""
-        for i, article in enumerate(extracted_articles, 1):
-            sources_context += f"\nArtículo {i} - {article['title']}\n"
-            sources_context += f"URL: {article['url']}\n"
-            sources_context += f"Contenido: {article['content'][:1000]}...\n\n"
-        
         tags_text = ', '.join(tags)
         
         # Generar artículo basado en el contenido real
-        article_content = self._generate_article_from_real_sources(tags_text, sources_context, extracted_articles)
+        article_content = self._generate_article_from_real_sources(tags_text, self.sources_context(extracted_articles, tags), extracted_articles)
         
         return article_content
     
-    def _generate_article_from_real_sources(self, tags_text, sources_context, extracted_articles):
+    def sources_context(self, extracted_articles, tags=()):
         """
-        Genera un artículo basado en fuentes reales extraídas de URLs
+        Contexto de las fuentes extraídas para el prompt. Las copias casi
+        idénticas de una misma nota entran una sola vez (ver posts/dedup.py) y
+        el texto se ajusta a NEWS_CONTEXT_TOKEN_BUDGET (ver posts/context_packing.py).
+        """
+        with tracing.span('context'):
+            unique, self.metadata['dedup'] = dedup.merge_near_duplicates(extracted_articles)
+            sources_context, self.metadata['context'] = context_packing.pack_sources(unique, self.model, tags)
+        
+        if self.metadata['dedup']['duplicates']:
+            logger.info(f"{self.metadata['dedup']['duplicates']} fuentes casi duplicadas omitidas del prompt")
+        if self.metadata['context']['omitted']:
+            logger.info(f"{self.metadata['context']['omitted']} fuentes no entraron en el presupuesto de tokens")
+        return sources_context
+    
+    def real_sources_request(self, tags_text, sources_context):
+        """
+        Prompt y parámetros del artículo basado en fuentes reales
         """
         comprehensive_prompt = f"""
         Eres un periodista senior escribiendo un artículo de investigación sobre {tags_text}.
@@ -150,47 +471,66 @@ class OpenAINewsGenerator:
         IMPORTANTE: El contenido debe estar basado en las fuentes reales proporcionadas y ser sustancioso, informativo y parecer escrito por un experto en {tags_text}.
         """
         
+        if self.single_call:
+            # Modo de una sola llamada: JSON estricto y presupuesto de salida según el largo objetivo
+            params = {'max_tokens': self._output_budget(), 'temperature': 0.6, 'response_format': {"type": "json_object"}}
+        else:
+            params = {'max_tokens': 3000, 'temperature': 0.6}
+        return comprehensive_prompt, params
+    
+    def parse_real_sources_result(self, content, extracted_articles):
+        """
+        Interpreta la respuesta JSON y le agrega las fuentes reales
+        """
+        if not content:
+            raise ValueError("La API devolvió una respuesta vacía")
+        
+        # Limpiar saltos de línea problemáticos que rompen el JSON
+        # Reemplazar todos los saltos de línea por espacios para mantener JSON válido
+        content = content.replace('\n', ' ').replace('\r', ' ')
+        # Limpiar espacios múltiples
+        content = re.sub(r'\s+', ' ', content)
+        
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": comprehensive_prompt}],
-                max_tokens=3000,
-                temperature=0.6
-            )
-            
-            import json
-            import re
-            content = response.choices[0].message.content.strip()
-            if not content:
-                raise ValueError("La API devolvió una respuesta vacía")
-            
-            # Limpiar saltos de línea problemáticos que rompen el JSON
-            # Reemplazar todos los saltos de línea por espacios para mantener JSON válido
-            content = content.replace('\n', ' ').replace('\r', ' ')
-            # Limpiar espacios múltiples
-            content = re.sub(r'\s+', ' ', content)
-            
-            try:
-                result = json.loads(content)
-            except json.JSONDecodeError as json_error:
-                logger.error(f"Respuesta de API no es JSON válido después de limpieza: {content}")
-                raise ValueError(f"Error parsing JSON: {json_error}")
-            
-            # Agregar información de las fuentes reales al resultado
-            result['source_articles'] = [
-                {
-                    'type': 'manual_url',
-                    'title': article['title'],
-                    'url': article['url'],
-                    'content_preview': article['content'][:200] + '...' if len(article['content']) > 200 else article['content']
-                }
-                for article in extracted_articles
-            ]
-            
-            return result
+            result = json.loads(content)
+        except json.JSONDecodeError as json_error:
+            logger.error(f"Respuesta de API no es JSON válido después de limpieza: {content}")
+            raise ValueError(f"Error parsing JSON: {json_error}")
+        
+        # Agregar información de las fuentes reales al resultado
+        result['source_articles'] = [
+            {
+                'type': 'manual_url',
+                'title': article['title'],
+                'url': article['url'],
+                'published_at': article.get('published_at', ''),
+                'image': article.get('image', ''),
+                'content_preview': article['content'][:200] + '...' if len(article['content']) > 200 else article['content']
+            }
+            for article in extracted_articles
+        ]
+        for source, article in zip(result['source_articles'], extracted_articles):
+            if article.get('duplicate_of'):
+                source['duplicate_of'] = article['duplicate_of']
+                source['similarity'] = article['similarity']
+        
+        return result
+    
+    def _generate_article_from_real_sources(self, tags_text, sources_context, extracted_articles):
+        """
+        Genera un artículo basado en fuentes reales extraídas de URLs
+        """
+        prompt, params = self.real_sources_request(tags_text, sources_context)
+        try:
+            content = self._complete(prompt, **params)
+            return self.parse_real_sources_result(content, extracted_articles)
             
+        except RateLimitExceeded:
+            # Sin cupo: que la cola reintente más tarde en vez de publicar el respaldo
+            raise
         except Exception as e:
             logger.error(f"Error generando artículo desde URLs reales: {e}")
+            self._forget_last_completion()
             return self._generate_fallback_content(tags_text, str(e))
     
     def generate_news_article(self, tags):
@@ -200,6 +540,9 @@ class OpenAINewsGenerator:
         """
         tags_text = ', '.join(tags)
         
+        if self.single_call:
+            return self._generate_single_call_article(tags_text)
+        
         # Primero generar información de fuentes simuladas
         sources_info = self._generate_sources_context(tags_text)
         
@@ -208,6 +551,93 @@ class OpenAINewsGenerator:
         
         return article_content
     
+    def _output_budget(self, extra_tokens=0):
+        """
+        Tokens de salida necesarios para el largo objetivo del artículo:
+        ~1.6 tokens por palabra en español, +25% de marcado HTML, más los
+        campos cortos del JSON (título, extracto, SEO)
+        """
+        words = settings.NEWS_ARTICLE_TARGET_WORDS
+        budget = int(words * 1.6 * 1.25) + 400 + extra_tokens
+        return min(budget, settings.NEWS_MAX_OUTPUT_TOKENS)
+    
+    def single_call_request(self, tags_text):
+        """
+        Prompt y parámetros de la llamada única (también los usa el modo batch)
+        """
+        words = settings.NEWS_ARTICLE_TARGET_WORDS
+        single_prompt = f"""
+        Actúa como un periodista senior que investigó múltiples fuentes especializadas sobre {tags_text}.
+        
+        PASO 1: Define 5 fuentes creíbles y diferentes (revistas, blogs, periódicos, reportes) que habrían
+        cubierto {tags_text}, cada una con un enfoque único y 3 puntos clave específicos.
+        
+        PASO 2: Escribe un artículo de investigación basado en esas fuentes.
+        
+        REQUISITOS DEL ARTÍCULO:
+        - Entre {words} y {int(words * 1.2)} palabras (muy importante)
+        - MÍNIMO 6 párrafos principales
+        - Incluir al menos 3 subtítulos <h3>
+        - Estructura: introducción (2 párrafos), desarrollo con subtítulos (4-5 párrafos),
+          análisis de impacto (2 párrafos), perspectivas futuras (2 párrafos), conclusión (1 párrafo)
+        - Mencionar diferentes perspectivas basadas en las fuentes
+        - Incluir datos específicos y ejemplos concretos
+        - Tono profesional y periodístico
+        
+        Responde ÚNICAMENTE con un objeto JSON con esta forma:
+        {{
+            "sources": [
+                {{"name": "Nombre de la publicación", "type": "Tipo de fuente", "focus": "Enfoque", "key_points": ["punto 1", "punto 2", "punto 3"]}}
+            ],
+            "title": "Título impactante (máximo 65 caracteres)",
+            "excerpt": "Resumen ejecutivo del artículo (200-250 caracteres)",
+            "content": "Artículo completo en HTML con estructura profesional",
+            "meta_description": "Descripción SEO optimizada (150-160 caracteres)",
+            "meta_keywords": "15-20 palabras clave relevantes separadas por comas"
+        }}
+        """
+        # ~60 tokens por fuente simulada además del artículo
+        params = {
+            'max_tokens': self._output_budget(extra_tokens=300),
+            'temperature': 0.6,
+            'response_format': {"type": "json_object"},
+        }
+        return single_prompt, params
+    
+    def parse_single_call_result(self, content):
+        """
+        Valida la respuesta JSON de la llamada única. Lanza ValueError si está incompleta.
+        """
+        result = json.loads(content)
+        
+        missing = [field for field in ('title', 'excerpt', 'content', 'meta_description', 'meta_keywords') if not result.get(field)]
+        if missing:
+            raise ValueError(f"Faltan campos en la respuesta: {', '.join(missing)}")
+        
+        content_length = len(result['content'])
+        if content_length < 2000:
+            # No se hace una llamada extra: el presupuesto ya se fijó por el largo objetivo
+            logger.warning(f"Contenido generado en una llamada más corto de lo esperado ({content_length} chars)")
+        
+        self.metadata['simulated_sources'] = len(result.pop('sources', []) or [])
+        return result
+    
+    def _generate_single_call_article(self, tags_text):
+        """
+        Genera fuentes simuladas y artículo en una única llamada con respuesta JSON estricta
+        """
+        prompt, params = self.single_call_request(tags_text)
+        try:
+            content = self._complete(prompt, **params)
+            return self.parse_single_call_result(content)
+            
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error(f"Error generando artículo en una llamada: {e}")
+            self._forget_last_completion()
+            return self._generate_fallback_content(tags_text, str(e))
+    
     def _generate_sources_context(self, tags_text):
         """
         Genera contexto de múltiples fuentes simuladas para enriquecer el contenido
@@ -239,19 +669,17 @@ class OpenAINewsGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": sources_prompt}],
-                max_tokens=1500,
-                temperature=0.8
-            )
+            content = self._complete(sources_prompt, max_tokens=1500, temperature=0.8)
             
             import json
-            sources_data = json.loads(response.choices[0].message.content.strip())
+            sources_data = json.loads(content)
             return sources_data.get('sources', [])
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.warning(f"Error generando fuentes: {e}")
+            self._forget_last_completion()
             return self._generate_default_sources(tags_text)
     
     def _generate_default_sources(self, tags_text):
@@ -319,15 +747,14 @@ class OpenAINewsGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": comprehensive_prompt}],
+            content = self._complete(
+                comprehensive_prompt,
                 max_tokens=3000,  # Aumentado para contenido más extenso
                 temperature=0.6
             )
             
             import json
-            result = json.loads(response.choices[0].message.content.strip())
+            result = json.loads(content)
             
             # Validar longitud mínima
             content_length = len(result.get('content', ''))
@@ -337,8 +764,11 @@ class OpenAINewsGenerator:
             
             return result
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error generando artículo comprensivo: {e}")
+            self._forget_last_completion()
             return self._generate_fallback_content(tags_text, str(e))
     
     def _generate_extended_content(self, tags_text, base_result):
@@ -372,19 +802,17 @@ class OpenAINewsGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": extension_prompt}],
-                max_tokens=3500,
-                temperature=0.6
-            )
+            content = self._complete(extension_prompt, max_tokens=3500, temperature=0.6)
             
             import json
-            extended_result = json.loads(response.choices[0].message.content.strip())
+            extended_result = json.loads(content)
             return extended_result
             
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error extendiendo contenido: {e}")
+            self._forget_last_completion()
             return base_result  # Devolver el contenido original si falla
     
     def _generate_fallback_content(self, tags_text, raw_content):
@@ -406,14 +834,26 @@ class SimpleNewsGenerationService:
     
     def process_news_generation(self, news_generation_id):
         """
-        Procesa una generación de noticias usando URLs manuales u OpenAI simulado
+        Procesa una generación de noticias usando URLs manuales u OpenAI simulado.
+        Los tiempos y tokens de cada etapa quedan en GenerationSpan.
         """
+        with tracing.trace(news_generation_id) as tracer:
+            try:
+                with tracing.span('total'):
+                    return self._process_news_generation(news_generation_id)
+            finally:
+                tracer.save()
+    
+    def _process_news_generation(self, news_generation_id):
         try:
             news_gen = NewsGeneration.objects.get(id=news_generation_id)
+            self.ai_generator.reset_metadata(bypass_cache=news_gen.bypass_completion_cache)
+            self.ai_generator.progress_callback = lambda text, tokens: self._save_progress(news_generation_id, text, tokens)
             
             # Actualizar estado a buscando fuentes
             news_gen.status = 'SEARCHING'
-            news_gen.save()
+            news_gen.progress_tokens = 0
+            self._save(news_gen, ['status', 'progress_tokens'])
             
             # Verificar si hay URLs manuales
             if news_gen.manual_urls and news_gen.manual_urls.strip():
@@ -424,7 +864,7 @@ class SimpleNewsGenerationService:
                 
                 # Actualizar a generando contenido
                 news_gen.status = 'GENERATING'
-                news_gen.save()
+                self._save(news_gen, ['status'])
                 
                 logger.info(f"Generando contenido desde {len(manual_urls)} URLs manuales")
                 
@@ -440,7 +880,7 @@ class SimpleNewsGenerationService:
                 
                 # Actualizar a generando contenido
                 news_gen.status = 'GENERATING'
-                news_gen.save()
+                self._save(news_gen, ['status'])
                 
                 logger.info(f"Generando contenido IA comprensivo para tags: {news_gen.tags}")
                 
@@ -448,52 +888,14 @@ class SimpleNewsGenerationService:
                 generated = self.ai_generator.generate_news_article(news_gen.tags_list)
                 
                 # Simular múltiples fuentes especializadas (solo si no hay URLs manuales)
-                simulated_sources = [
-                    {
-                        'type': 'ai_research',
-                        'source_name': f'Tech Research {news_gen.tags_list[0].title()} Journal',
-                        'focus': f'Análisis técnico de {news_gen.tags_list[0]}',
-                        'description': f'Investigación especializada en tendencias de {news_gen.tags_list[0]}'
-                    },
-                    {
-                        'type': 'ai_industry',  
-                        'source_name': 'Industry Innovation Report',
-                        'focus': f'Impacto industrial de {", ".join(news_gen.tags_list[:2])}',
-                        'description': f'Reporte de industria sobre innovaciones en {", ".join(news_gen.tags_list[:2])}'
-                    },
-                    {
-                        'type': 'ai_academic',
-                        'source_name': f'{news_gen.tags_list[0].title()} Academic Review',
-                        'focus': f'Perspectiva académica sobre {news_gen.tags_list[0]}',
-                        'description': f'Análisis académico de desarrollos en {news_gen.tags_list[0]}'
-                    },
-                    {
-                        'type': 'ai_market',
-                        'source_name': 'Market Trends Analysis',
-                        'focus': f'Tendencias de mercado en {", ".join(news_gen.tags_list)}',
-                        'description': f'Análisis de mercado y proyecciones para {", ".join(news_gen.tags_list)}'
-                    },
-                    {
-                        'type': 'ai_expert',
-                        'source_name': 'Expert Opinion Network',
-                        'focus': f'Opiniones de expertos sobre {", ".join(news_gen.tags_list)}',
-                        'description': f'Compilación de opiniones expertas en {", ".join(news_gen.tags_list)}'
-                    }
-                ]
+                simulated = simulated_sources(news_gen.tags_list)
                 
-                news_gen.source_articles = simulated_sources
-                news_gen.total_sources_found = len(simulated_sources)
+                news_gen.source_articles = simulated
+                news_gen.total_sources_found = len(simulated)
             
             # Actualizar modelo con contenido generado
-            news_gen.generated_title = generated['title']
-            news_gen.generated_content = generated['content']
-            news_gen.generated_excerpt = generated['excerpt']
-            news_gen.generated_meta_description = generated['meta_description']
-            news_gen.generated_meta_keywords = generated['meta_keywords']
-            
-            news_gen.status = 'COMPLETED'
-            news_gen.completed_at = timezone.now()
-            news_gen.save()
+            apply_generation_result(news_gen, generated, news_gen.source_articles, self.ai_generator.metadata)
+            self._save(news_gen, RESULT_FIELDS)
             
             logger.info(f"Generación completada exitosamente para ID {news_generation_id}")
             return news_gen
@@ -505,11 +907,26 @@ class SimpleNewsGenerationService:
                 news_gen = NewsGeneration.objects.get(id=news_generation_id)
                 news_gen.status = 'ERROR'
                 news_gen.error_message = str(e)
-                news_gen.save()
+                news_gen.save(update_fields=['status', 'error_message'])
             except:
                 pass
             
             raise
+    
+    def _save(self, news_gen, fields):
+        with tracing.span('db_write', ', '.join(fields)):
+            news_gen.save(update_fields=fields)
+
+    def _save_progress(self, news_generation_id, text, tokens):
+        """
+        Guarda el progreso del streaming actualizando sólo las columnas necesarias
+        """
+        fields = {'progress_tokens': tokens, 'progress_updated_at': timezone.now()}
+        partial_content = partial_json_field(text, 'content')
+        if partial_content:
+            fields['generated_content'] = partial_content
+        with tracing.span('db_write', 'progress'):
+            NewsGeneration.objects.filter(pk=news_generation_id).update(**fields)
 
 
 # Versión de desarrollo que simula OpenAI sin usar la API real
@@ -522,7 +939,7 @@ class MockSimpleNewsGenerationService:
             news_gen = NewsGeneration.objects.get(id=news_generation_id)
             
             news_gen.status = 'GENERATING'
-            news_gen.save()
+            news_gen.save(update_fields=['status'])
             
             # Simular procesamiento
             import time
@@ -564,7 +981,7 @@ class MockSimpleNewsGenerationService:
             
             news_gen.status = 'COMPLETED'
             news_gen.completed_at = timezone.now()
-            news_gen.save()
+            news_gen.save(update_fields=RESULT_FIELDS)
             
             logger.info(f"[MODO DEV] Generación simulada completada para ID {news_generation_id}")
             return news_gen
@@ -576,7 +993,7 @@ class MockSimpleNewsGenerationService:
                 news_gen = NewsGeneration.objects.get(id=news_generation_id)
                 news_gen.status = 'ERROR'
                 news_gen.error_message = f"[DEV] {str(e)}"
-                news_gen.save()
+                news_gen.save(update_fields=['status', 'error_message'])
             except:
                 pass
                 
@@ -0,0 +1,115 @@
+"""
+Datos del sidebar público: posts más vistos y categorías con posts publicados.
+
+Ambas listas se guardan ya calculadas en la caché PAGE_CACHE. Los populares se
+recalculan al volcar las visitas (posts/view_counts.py) y ambas cuando
+posts/signals.py avisa de un cambio; si falta alguna se calcula en el momento.
+Cuando cambia lo que muestran se incrementa la versión del sidebar de
+posts/page_cache.py, que invalida las páginas cacheadas y el ETag de los posts.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q
+
+from . import page_cache
+from .models import Category, Post
+
+logger = logging.getLogger(__name__)
+
+POPULAR_KEY = 'sidebar:popular'
+CATEGORIES_KEY = 'sidebar:categories'
+
+
+def _cache():
+    return caches[settings.PAGE_CACHE]
+
+
+def _cached(key, compute):
+    try:
+        value = _cache().get(key)
+    except Exception as e:
+        logger.warning(f"Caché del sidebar no disponible: {e}")
+        return compute()
+    if value is None:
+        value = compute()
+        try:
+            _cache().set(key, value)
+        except Exception as e:
+            logger.warning(f"Caché del sidebar no disponible: {e}")
+    return value
+
+
+def compute_popular_posts():
+    return list(
+        Post.objects.filter(published=True, view_count__gt=0)
+        .order_by('-view_count', '-created_at')
+        .values('title', 'slug', 'created_at', 'view_count')[:settings.POPULAR_POSTS_COUNT]
+    )
+
+
+def compute_categories():
+    return list(
+        Category.objects.annotate(post_count=Count('post', filter=Q(post__published=True)))
+        .filter(post_count__gt=0)
+        .order_by('-post_count', 'name')
+        .values('name', 'slug', 'post_count')
+    )
+
+
+def popular_posts():
+    return _cached(POPULAR_KEY, compute_popular_posts)
+
+
+def categories():
+    return _cached(CATEGORIES_KEY, compute_categories)
+
+
+def category_count(slug):
+    """
+    Posts publicados de la categoría según la lista ya calculada
+    """
+    for category in categories():
+        if category['slug'] == slug:
+            return category['post_count']
+    return 0
+
+
+def _shown_popular(popular):
+    # Lo que se ve de cada popular: el número de visitas no aparece en la página
+    return [(post['slug'], post['title']) for post in popular]
+
+
+def _shown_categories(categories):
+    return [(category['slug'], category['name'], category['post_count']) for category in categories]
+
+
+def _refresh(key, compute, shown):
+    """
+    Recalcula una lista; devuelve True si cambió lo que se muestra de ella
+    """
+    previous = _cache().get(key)
+    value = compute()
+    _cache().set(key, value)
+    return previous is None or shown(value) != shown(previous)
+
+
+def refresh_popular_posts():
+    if _refresh(POPULAR_KEY, compute_popular_posts, _shown_popular):
+        page_cache.invalidate_lists(page_cache.SIDEBAR)
+
+
+def invalidate():
+    """
+    Recalcula ambas listas tras un cambio de posts o categorías; la versión del
+    sidebar sólo cambia si cambió lo que muestra
+    """
+    try:
+        changed = _refresh(POPULAR_KEY, compute_popular_posts, _shown_popular)
+        changed = _refresh(CATEGORIES_KEY, compute_categories, _shown_categories) or changed
+    except Exception as e:
+        logger.warning(f"Caché del sidebar no disponible: {e}")
+        changed = True
+    if changed:
+        page_cache.invalidate_lists(page_cache.SIDEBAR)
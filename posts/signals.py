@@ -0,0 +1,63 @@
+"""
+Invalidación de la caché de páginas públicas y del sidebar (ver
+posts/page_cache.py y posts/sidebar.py) y actualización del índice de búsqueda
+(posts/search.py); volcado de las visitas acumuladas en memoria
+(posts/view_counts.py)
+"""
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import page_cache, search, sidebar, view_counts
+from .models import Category, Post
+
+
+@receiver(post_init, sender=Post)
+def remember_published(sender, instance, **kwargs):
+    # Sin leer los campos si fueron diferidos (.only/.defer): None cuenta como publicado
+    instance._was_published = instance.__dict__.get('published')
+    instance._loaded_slug = instance.__dict__.get('slug')
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    # Un borrador que sigue sin publicar no aparece en ninguna página pública
+    if instance.published or instance._was_published is not False:
+        page_cache.invalidate_lists(
+            page_cache.ALL_POSTS,
+            page_cache.category_scope(instance.category_id),
+            page_cache.category_scope(instance._loaded_category_id),
+        )
+        page_cache.invalidate_detail(instance.slug, instance._loaded_slug)
+        sidebar.invalidate()
+    instance._was_published = instance.published
+    instance._loaded_slug = instance.slug
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Post)
+def reindex_post(sender, instance, update_fields=None, **kwargs):
+    # Guardados parciales que no tocan texto (p. ej. sólo published) no reindexan
+    if update_fields is None or set(update_fields) & set(search.FIELDS):
+        search.index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # El nombre aparece en el listado general y en el de la propia categoría
+    page_cache.invalidate_lists(page_cache.ALL_POSTS, page_cache.category_scope(instance.pk))
+    sidebar.invalidate()
+
+
+@receiver(request_finished)
+def flush_view_counts(sender, **kwargs):
+    # Después de enviar la respuesta: el lector no espera el UPDATE
+    view_counts.flush_local_if_due()
@@ -0,0 +1,31 @@
+from django import template
+
+from posts import images
+
+register = template.Library()
+
+# Ancho de la variante JPEG que usan como src los navegadores sin srcset
+FALLBACK_WIDTH = 960
+
+
+@register.inclusion_tag('partials/post_picture.html')
+def post_picture(post, sizes='100vw', css_class='', style='', loading='lazy'):
+    """
+    <picture> con WebP y JPEG en srcset; si las variantes todavía no existen,
+    la imagen original
+    """
+    context = {
+        'post': post, 'sizes': sizes, 'css_class': css_class, 'style': style, 'loading': loading,
+        'variants': images.variants_for(post),
+    }
+    if context['variants']:
+        jpeg = context['variants']['jpeg']
+        fallback_width, fallback = next(((width, name) for width, name in jpeg if width >= FALLBACK_WIDTH), jpeg[-1])
+        context.update(
+            webp_srcset=images.srcset(post, 'webp'),
+            jpeg_srcset=images.srcset(post, 'jpeg'),
+            fallback_url=post.image.storage.url(fallback),
+            width=fallback_width,
+            height=max(round(context['variants']['height'] * fallback_width / context['variants']['width']), 1),
+        )
+    return context
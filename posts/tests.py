@@ -1,3 +1,1877 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+import openai
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    article_cache, batching, completion_cache, context_packing, dedup, extraction, fetching, images, jobs,
+    page_cache, rate_limit, rendering, search, sidebar, tracing, view_counts,
+)
+from .pagination import KeysetPaginator, encode_cursor
+from .models import ArticleCache, Category, GenerationSpan, NewsBatch, NewsGeneration, Post
+from .http_client import CappedRetry
+from .services_async import AsyncNewsGenerationService, AsyncNewsGenerator, AsyncResources
+from .services_simple import OpenAINewsGenerator, SimpleNewsGenerationService, partial_json_field
+
+# Los tests no leen ni escriben las cachés en disco (o Redis) del proyecto: cada
+# alias pasa a memoria
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f"test-{alias}"}
+    for alias in settings.CACHES
+}
+
+
+
+class FetchConcurrentlyTests(SimpleTestCase):
+    """
+    Descarga concurrente de fuentes (posts/fetching.py): orden de salida,
+    límites global y por dominio, plazo y URLs fallidas
+    """
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.running = defaultdict(int)
+        self.peak = defaultdict(int)
+        self.started = []
+
+    def fetch(self, url, seconds=0.05):
+        host = fetching.host_key(url)
+        with self.lock:
+            self.started.append(url)
+            for key in (host, '*'):
+                self.running[key] += 1
+                self.peak[key] = max(self.peak[key], self.running[key])
+        try:
+            time.sleep(seconds)
+            return f"ok {url}"
+        finally:
+            with self.lock:
+                for key in (host, '*'):
+                    self.running[key] -= 1
+
+    def failed(self, url):
+        return f"fallo {url}"
+
+    def test_results_keep_the_input_order(self):
+        urls = [f"https://medio{i}.test/nota" for i in range(5)]
+        # Las primeras terminan últimas
+        delays = {url: 0.02 * (len(urls) - i) for i, url in enumerate(urls)}
+
+        results = fetching.fetch_concurrently(
+            urls, lambda url: self.fetch(url, delays[url]), self.failed, max_workers=5, per_host=1, deadline=5,
+        )
+
+        self.assertEqual(results, [f"ok {url}" for url in urls])
+
+    def test_global_and_per_host_limits(self):
+        urls = [f"https://{host}/nota-{i}" for i in range(4) for host in ('a.test', 'www.b.test', 'c.test')]
+
+        results = fetching.fetch_concurrently(urls, self.fetch, self.failed, max_workers=4, per_host=2, deadline=5)
+
+        self.assertEqual(results, [f"ok {url}" for url in urls])
+        self.assertEqual(self.peak['*'], 4)
+        for host in ('a.test', 'b.test', 'c.test'):
+            self.assertEqual(self.peak[host], 2, host)
+
+    def test_deadline_reports_slow_and_queued_urls_as_failed(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        urls = ['https://lento.test/1', 'https://lento.test/2', 'https://rapido.test/1']
+
+        def fetch(url):
+            if url.startswith('https://lento.test'):
+                release.wait(5)
+            return self.fetch(url, 0)
+
+        started = time.monotonic()
+        with self.assertLogs('posts.fetching', 'WARNING') as logs:
+            results = fetching.fetch_concurrently(urls, fetch, self.failed, max_workers=4, per_host=1, deadline=0.2)
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIn('Plazo de 0.2s agotado esperando https://lento.test/1', logs.output[0])
+        self.assertEqual(results, ['fallo https://lento.test/1', 'fallo https://lento.test/2', 'ok https://rapido.test/1'])
+        # La segunda URL del host lento seguía en cola: no llega a descargarse
+        release.set()
+        time.sleep(0.05)
+        self.assertNotIn('https://lento.test/2', self.started)
+
+    def test_exceptions_go_through_on_failure(self):
+        urls = ['https://a.test/ok', 'https://a.test/roto', 'https://b.test/ok']
+
+        def fetch(url):
+            if url.endswith('roto'):
+                raise ConnectionError('sin conexión')
+            return self.fetch(url, 0)
+
+        with self.assertLogs('posts.fetching', 'WARNING'):
+            results = fetching.fetch_concurrently(urls, fetch, self.failed, max_workers=2, per_host=2, deadline=5)
+
+        self.assertEqual(results, ['ok https://a.test/ok', 'fallo https://a.test/roto', 'ok https://b.test/ok'])
+
+    def test_empty_list(self):
+        self.assertEqual(fetching.fetch_concurrently([], self.fetch, self.failed), [])
+
+
+@override_settings(CACHES=TEST_CACHES, NEWS_ARTICLE_CACHE_TTL=3600, NEWS_ARTICLE_CACHE_UNVALIDATED_TTL=600)
+class ArticleCacheTests(TestCase):
+    """
+    Caché de artículos extraídos (posts/article_cache.py): URL canónica,
+    revalidación con 304, páginas sin validadores y desalojo
+    """
+    url = 'https://www.Medio.test:443/nota?b=2&utm_source=x&a=1&fbclid=y#comentarios'
+
+    def setUp(self):
+        self.generator = OpenAINewsGenerator(client=SimpleNamespace())
+        self.requests = []
+
+    def article(self, url=None, **fields):
+        article = {
+            'url': url or self.url, 'title': 'Nota', 'content': 'Texto de la nota', 'published_at': '', 'image': '',
+            'cache_status': 'miss', 'etag': '', 'last_modified': '',
+        }
+        article.update(fields)
+        return article
+
+    def response(self, status, body=b'', headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers or {})
+        response.raw = io.BytesIO(body)
+        response.url = self.url
+        return response
+
+    def session(self, response):
+        def get(url, headers=None, **kwargs):
+            self.requests.append(headers)
+            return response
+        return mock.patch('posts.services_simple.get_session', return_value=SimpleNamespace(get=get))
+
+    def age(self, seconds):
+        ArticleCache.objects.update(fetched_at=timezone.now() - timedelta(seconds=seconds))
+
+    def test_canonical_url_drops_tracking_params_port_and_fragment(self):
+        self.assertEqual(article_cache.canonical_url(self.url), 'https://www.medio.test/nota?a=1&b=2')
+        self.assertEqual(article_cache.url_hash(self.url), article_cache.url_hash('https://www.medio.test/nota?a=1&b=2'))
+        self.assertEqual(article_cache.canonical_url('http://medio.test:8080'), 'http://medio.test:8080/')
+
+    def test_not_modified_reuses_the_entry_and_renews_it(self):
+        article_cache.record_results([self.article(etag='"v1"')], {})
+        self.age(3000)
+        cached = article_cache.lookup_many([self.url])[self.url]
+
+        with self.session(self.response(304)):
+            result = self.generator._extract_content_from_url(self.url, cached)
+
+        self.assertEqual(self.requests, [{'If-None-Match': '"v1"'}])
+        self.assertEqual((result['content'], result['cache_status']), ('Texto de la nota', 'hit'))
+        self.assertEqual(article_cache.record_results([result], {self.url: cached}), {'hits': 1, 'misses': 0})
+
+        entry = ArticleCache.objects.get()
+        self.assertEqual(entry.hits, 1)
+        # El 304 confirmó la entrada: el TTL vuelve a empezar
+        self.assertLess((timezone.now() - entry.fetched_at).total_seconds(), 60)
+
+    def test_changed_page_replaces_the_entry(self):
+        article_cache.record_results([self.article(last_modified='Mon, 01 Jan 2024 00:00:00 GMT')], {})
+        cached = article_cache.lookup_many([self.url])[self.url]
+        html = b'<html><head><title>Nueva</title></head><body><article><p>' + b'Texto nuevo de la nota. ' * 20 + b'</p></article></body></html>'
+
+        with self.session(self.response(200, html, {'Content-Type': 'text/html', 'ETag': '"v2"'})):
+            result = self.generator._extract_content_from_url(self.url, cached)
+        article_cache.record_results([result], {self.url: cached})
+
+        self.assertEqual(self.requests, [{'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}])
+        entry = ArticleCache.objects.get()
+        self.assertEqual(entry.etag, '"v2"')
+        self.assertIn('Texto nuevo de la nota.', entry.content)
+
+    def test_page_without_validators_is_reused_without_a_request(self):
+        article_cache.record_results([self.article()], {})
+        cached = article_cache.lookup_many([self.url])[self.url]
+
+        with self.session(self.response(500)):
+            result = self.generator._extract_content_from_url(self.url, cached)
+        article_cache.record_results([result], {self.url: cached})
+
+        self.assertEqual(self.requests, [])
+        self.assertEqual(result['cache_status'], 'hit')
+        # Sin 304 no se renueva: pasado UNVALIDATED_TTL hay que descargarla otra vez
+        self.age(601)
+        self.assertEqual(article_cache.lookup_many([self.url]), {})
+
+    def test_entries_past_the_ttl_are_ignored_and_evicted(self):
+        article_cache.record_results([self.article(etag='"v1"')], {})
+        self.age(3601)
+
+        self.assertEqual(article_cache.lookup_many([self.url]), {})
+        article_cache.evict()
+        self.assertFalse(ArticleCache.objects.exists())
+
+    def test_size_limit_evicts_the_least_recently_used(self):
+        for i in range(4):
+            article_cache.record_results([self.article(f"https://medio.test/{i}", content='x' * 96, etag='"v"')], {})
+        for i, pk in enumerate(ArticleCache.objects.order_by('url').values_list('pk', flat=True)):
+            ArticleCache.objects.filter(pk=pk).update(last_used_at=timezone.now() - timedelta(minutes=10 - i))
+        ArticleCache.objects.filter(url='https://medio.test/0').update(last_used_at=timezone.now())
+
+        # Cada entrada ocupa 100 bytes (contenido y título)
+        with override_settings(NEWS_ARTICLE_CACHE_MAX_BYTES=250):
+            article_cache.evict()
+
+        self.assertEqual(
+            sorted(ArticleCache.objects.values_list('url', flat=True)), ['https://medio.test/0', 'https://medio.test/3'],
+        )
+
+@skipUnless(extraction.etree, 'lxml no está instalado')
+class StreamingExtractionTests(SimpleTestCase):
+    """
+    El extractor en streaming conserva el texto de los párrafos con marcado
+    inline y cuenta todos sus enlaces
+    """
+
+    def extract(self, html):
+        # Bloques chicos: cada cierre llega en un feed() distinto
+        html = html.encode('utf-8')
+        return extraction.extract_article((html[i:i + 16] for i in range(0, len(html), 16)), 5000)
+
+    def test_inline_markup_mid_paragraph(self):
+        result = self.extract(
+            '<html><body><article>'
+            '<p>Según <a href="/fuente">la agencia</a>, el gobierno <strong>anunció</strong> hoy</p>'
+            '<p>Hola <b>mundo</b> cruel y <a href="/x">enlace</a> final</p>'
+            '<p><em>Primero</em> <i>segundo</i>, <span>tercero</span> y cierre.</p>'
+            '</article></body></html>'
+        )
+        self.assertEqual(
+            result['content'],
+            'Según la agencia, el gobierno anunció hoy Hola mundo cruel y enlace final Primero segundo, tercero y cierre.',
+        )
+
+    def test_link_density_counts_every_link(self):
+        links = ' '.join(f'<a href="/nota-{i}">Otra nota relacionada con el tema número {i}</a>' for i in range(6))
+        plain = 'El informe oficial detalla la evolución de la cosecha en cada provincia productora.'
+        result = self.extract(
+            '<html><body>'
+            f'<div id="listado"><p>{links}</p><p>{links}</p></div>'
+            f'<div id="nota"><p>{plain}</p><p>{plain}</p><p>{plain}</p></div>'
+            '</body></html>'
+        )
+        self.assertIn(plain, result['content'])
+        self.assertNotIn('Otra nota relacionada', result['content'])
+
+
+
+@override_settings(NEWS_DEDUP_MAX_DISTANCE=10)
+class DedupTests(SimpleTestCase):
+    """
+    Fuentes casi duplicadas (posts/dedup.py): SimHash y agrupamiento
+    """
+    obras = (
+        "El gobierno provincial anunció este martes un plan de obras para reparar los caminos rurales dañados por las "
+        "lluvias de marzo. La inversión prevista alcanza los cuatro mil millones de pesos y se financiará con fondos "
+        "propios y un crédito del Banco Mundial. Según el ministro de Infraestructura, las primeras licitaciones se "
+        "abrirán en mayo y los trabajos comenzarán antes del invierno. Los productores reclamaban desde hace meses una "
+        "respuesta, porque varios tramos quedaron intransitables y la cosecha de soja se retrasó. El plan incluye además "
+        "la limpieza de canales y la construcción de alcantarillas en los departamentos más afectados del norte."
+    )
+    hockey = (
+        "La selección femenina de hockey venció a Países Bajos por tres a dos en un partido vibrante disputado en el "
+        "estadio de Amstelveen. Los goles llegaron en el último cuarto, después de que las locales dominaran buena parte "
+        "del encuentro con presión alta. La entrenadora destacó la solidez defensiva del equipo y la eficacia en los "
+        "córners cortos, que definieron el resultado. El próximo compromiso será frente a Alemania el domingo, con la "
+        "clasificación al torneo final todavía en juego para ambos planteles. La capitana aseguró que el grupo llega "
+        "con confianza aunque reconoció que todavía deben corregir errores en la salida."
+    )
+
+    def article(self, url, content, **fields):
+        return dict({'url': url, 'title': url, 'content': content, 'cache_status': 'miss'}, **fields)
+
+    def edited(self):
+        # Copia sindicada con retoques y un párrafo más
+        return (
+            self.obras.replace('este martes', 'el martes').replace('de pesos', 'de pesos argentinos')
+            + ' La oposición pidió conocer el detalle de cada obra.'
+        )
+
+    def test_simhash_distance(self):
+        self.assertEqual(dedup.simhash(self.obras), dedup.simhash(self.obras.upper()))
+        self.assertLessEqual(dedup.distance(dedup.simhash(self.obras), dedup.simhash(self.edited())), 10)
+        self.assertGreater(dedup.distance(dedup.simhash(self.obras), dedup.simhash(self.hockey)), 10)
+
+    def test_near_duplicates_keep_the_richest_copy(self):
+        cable = self.article('https://agencia.test/obras', self.obras)
+        copia = self.article('https://diario.test/obras', self.edited(), image='https://diario.test/foto.jpg')
+        otra = self.article('https://deportes.test/hockey', self.hockey)
+
+        unique, stats = dedup.merge_near_duplicates([cable, otra, copia])
+
+        self.assertEqual([article['url'] for article in unique], ['https://diario.test/obras', 'https://deportes.test/hockey'])
+        self.assertEqual(cable['duplicate_of'], 'https://diario.test/obras')
+        self.assertGreaterEqual(cable['similarity'], 54)
+        self.assertNotIn('duplicate_of', copia)
+        self.assertNotIn('duplicate_of', otra)
+        self.assertEqual(stats, {'duplicates': 1, 'chars_saved': len(self.obras)})
+        self.assertFalse(any('_fingerprint' in article for article in (cable, copia, otra)))
+
+    def test_different_articles_stay_separate(self):
+        articles = [self.article('https://a.test/obras', self.obras), self.article('https://b.test/hockey', self.hockey)]
+
+        unique, stats = dedup.merge_near_duplicates(articles)
+
+        self.assertEqual(unique, articles)
+        self.assertEqual(stats['duplicates'], 0)
+
+    def test_errors_and_short_texts_are_never_merged(self):
+        error = {'url': 'https://a.test/caida', 'title': 'Error', 'content': self.obras}
+        short = [self.article(f"https://{host}.test/breve", 'Breve de agencia.') for host in ('a', 'b')]
+
+        unique, stats = dedup.merge_near_duplicates([error, self.article('https://b.test/obras', self.obras), *short])
+
+        self.assertEqual(len(unique), 4)
+        self.assertEqual(stats['duplicates'], 0)
+
+@override_settings(NEWS_CONTEXT_MIN_SOURCE_TOKENS=150)
+class ContextPackingTests(SimpleTestCase):
+    """
+    Reparto del presupuesto de tokens entre las fuentes del prompt
+    """
+    model = 'gpt-4o-mini'
+
+    def sources(self, count):
+        text = ' '.join(
+            f"La oración número {i} describe con detalle el avance del proyecto y sus consecuencias económicas."
+            for i in range(40)
+        )
+        return [{'title': f"Fuente {i}", 'url': f"https://fuente{i}.test/nota", 'content': text} for i in range(count)]
+
+    def test_every_included_source_keeps_its_minimum(self):
+        context, stats = context_packing.pack_sources(self.sources(40), self.model, budget=6000)
+
+        # 40 fuentes no entran con 150 tokens cada una: sobran las últimas
+        self.assertLessEqual(stats['sources'] * 150, 6000)
+        self.assertEqual(stats['sources'] + stats['omitted'], 40)
+        self.assertGreater(stats['omitted'], 0)
+        self.assertLessEqual(stats['tokens'], 6000)
+
+        contents = re.split(r'\nArtículo \d+ - Fuente \d+\nURL: \S+\nContenido: ', context)[1:]
+        self.assertEqual(len(contents), stats['sources'])
+        for content in contents:
+            # El extracto se arma con oraciones enteras: puede quedar una corta del mínimo
+            self.assertGreater(context_packing.count_tokens(content, self.model), 150 - 30)
+
+    def test_few_sources_share_the_whole_budget(self):
+        context, stats = context_packing.pack_sources(self.sources(3), self.model, budget=6000)
+
+        self.assertEqual((stats['sources'], stats['omitted'], stats['summarized']), (3, 0, 0))
+
+
+@override_settings(CACHES=TEST_CACHES, NEWS_WORKER_MAX_ATTEMPTS=3, NEWS_WORKER_LEASE_SECONDS=60,
+                   NEWS_WORKER_RETRY_BACKOFF=10, NEWS_WORKER_RETRY_BACKOFF_MAX=60)
+class JobQueueTests(TestCase):
+    """
+    Reclamo, lease y reintentos de la cola de generaciones (posts/jobs.py)
+    """
+
+    def setUp(self):
+        self.news_gen = NewsGeneration.objects.create(tags='ia', created_by=User.objects.create(username='editor'))
+
+    def _expire_lease(self):
+        NewsGeneration.objects.filter(pk=self.news_gen.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_concurrent_claims_have_a_single_winner(self):
+        claimable = jobs.claimable
+        calls = []
+
+        def racing_claimable(now=None):
+            calls.append(now)
+            if len(calls) == 2:
+                # El otro worker gana entre la lectura de candidatos y el UPDATE condicional
+                with mock.patch.object(jobs, 'claimable', claimable):
+                    self.assertEqual(jobs.claim_next('worker-a').pk, self.news_gen.pk)
+            return claimable(now)
+
+        with mock.patch.object(jobs, 'claimable', racing_claimable):
+            self.assertIsNone(jobs.claim_next('worker-b'))
+
+        self.news_gen.refresh_from_db()
+        self.assertEqual((self.news_gen.locked_by, self.news_gen.attempts), ('worker-a', 1))
+
+    def test_expired_lease_is_reclaimed_by_another_worker(self):
+        jobs.claim_next('worker-a')
+        self.assertIsNone(jobs.claim_next('worker-b'))
+
+        self._expire_lease()
+        claimed = jobs.claim_next('worker-b')
+
+        self.assertEqual((claimed.pk, claimed.locked_by, claimed.attempts), (self.news_gen.pk, 'worker-b', 2))
+        self.assertFalse(jobs.heartbeat(self.news_gen.pk, 'worker-a'))
+        self.assertTrue(jobs.heartbeat(self.news_gen.pk, 'worker-b'))
+
+    def test_retry_delay_grows_exponentially_with_jitter_and_cap(self):
+        for attempts, low, high in ((1, 5, 10), (2, 10, 20), (3, 20, 40), (10, 30, 60)):
+            for _ in range(20):
+                self.assertTrue(low <= jobs.retry_delay(attempts) <= high, attempts)
+
+    def test_failed_attempt_is_rescheduled_with_backoff(self):
+        jobs.claim_next('worker-a')
+
+        with mock.patch.object(jobs.random, 'uniform', return_value=0):
+            self.assertTrue(jobs.retry_or_fail(self.news_gen.pk, 'worker-a', 'timeout'))
+
+        self.news_gen.refresh_from_db()
+        self.assertEqual((self.news_gen.status, self.news_gen.locked_by), ('PENDING', ''))
+        self.assertAlmostEqual((self.news_gen.available_at - timezone.now()).total_seconds(), 5, delta=1)
+        self.assertIn('Intento 1/3', self.news_gen.error_message)
+        self.assertIsNone(jobs.claim_next('worker-b'))
+
+    def test_last_attempt_marks_the_generation_as_error(self):
+        for attempt in range(3):
+            NewsGeneration.objects.filter(pk=self.news_gen.pk).update(available_at=timezone.now())
+            self.assertEqual(jobs.claim_next('worker-a').attempts, attempt + 1)
+            rescheduled = jobs.retry_or_fail(self.news_gen.pk, 'worker-a', 'timeout')
+
+        self.assertFalse(rescheduled)
+        self.news_gen.refresh_from_db()
+        self.assertEqual((self.news_gen.status, self.news_gen.attempts), ('ERROR', 3))
+        self.assertIn('Falló tras 3 intentos', self.news_gen.error_message)
+        self.assertIsNone(jobs.claim_next('worker-a'))
+
+    def test_abandoned_job_without_attempts_left_goes_to_error(self):
+        NewsGeneration.objects.filter(pk=self.news_gen.pk).update(attempts=2)
+        jobs.claim_next('worker-a')
+        NewsGeneration.objects.filter(pk=self.news_gen.pk).update(status='GENERATING')
+        self._expire_lease()
+
+        self.assertIsNone(jobs.claim_next('worker-b'))
+        self.news_gen.refresh_from_db()
+        self.assertEqual((self.news_gen.status, self.news_gen.locked_by), ('ERROR', ''))
+
+
+
+@override_settings(CACHES=TEST_CACHES, NEWS_RATE_LIMIT_ENABLED=False)
+class CompletionCacheTests(SimpleTestCase):
+    """
+    Caché de respuestas de OpenAI (posts/completion_cache.py) y su uso desde
+    el generador
+    """
+
+    def setUp(self):
+        caches[settings.NEWS_COMPLETION_CACHE].clear()
+        self.cache = completion_cache.CompletionCache()
+        self.calls = []
+
+    def openai_client(self):
+        def create(**kwargs):
+            self.calls.append(kwargs)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=f"Respuesta {len(self.calls)}"))],
+                usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20),
+            )
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def test_key_depends_on_model_messages_and_params(self):
+        messages = [{'role': 'user', 'content': 'Hola'}]
+        key = self.cache.key('gpt-4o-mini', messages, {'max_tokens': 100, 'temperature': 0.5})
+
+        self.assertEqual(key, self.cache.key('gpt-4o-mini', messages, {'temperature': 0.5, 'max_tokens': 100}))
+        self.assertNotEqual(key, self.cache.key('gpt-4o', messages, {'max_tokens': 100, 'temperature': 0.5}))
+        self.assertNotEqual(key, self.cache.key(
+            'gpt-4o-mini', [{'role': 'user', 'content': 'Chau'}], {'max_tokens': 100, 'temperature': 0.5},
+        ))
+        self.assertNotEqual(key, self.cache.key('gpt-4o-mini', messages, {'max_tokens': 100, 'temperature': 0.7}))
+
+    def test_empty_responses_are_not_stored(self):
+        self.cache.set('vacia', {'content': ''})
+        self.cache.set('llena', {'content': 'texto'})
+
+        self.assertIsNone(self.cache.get('vacia'))
+        self.assertEqual(self.cache.get('llena'), {'content': 'texto'})
+
+    def test_identical_request_is_answered_from_the_cache(self):
+        generator = OpenAINewsGenerator(client=self.openai_client())
+        generator.reset_metadata()
+
+        self.assertEqual(generator._complete('Hola', 100, 0.5), 'Respuesta 1')
+        self.assertEqual(generator._complete('Hola', 100, 0.5), 'Respuesta 1')
+        self.assertEqual(len(self.calls), 1)
+        stats = generator.metadata['completion_cache']
+        self.assertEqual((stats['hits'], stats['misses'], stats['saved_tokens']), (1, 1, 30))
+
+        # Otro prompt u otros parámetros son otra petición
+        self.assertEqual(generator._complete('Hola', 100, 0.7), 'Respuesta 2')
+        self.assertEqual(generator._complete('Chau', 100, 0.5), 'Respuesta 3')
+        self.assertEqual(len(self.calls), 3)
+
+    def test_bypass_asks_the_model_again(self):
+        generator = OpenAINewsGenerator(client=self.openai_client())
+        generator.reset_metadata()
+        generator._complete('Hola', 100, 0.5)
+
+        generator.reset_metadata(bypass_cache=True)
+        self.assertEqual(generator._complete('Hola', 100, 0.5), 'Respuesta 2')
+        self.assertEqual(generator.metadata['completion_cache']['hits'], 0)
+
+        # La respuesta nueva reemplaza a la anterior en la caché
+        generator.reset_metadata()
+        self.assertEqual(generator._complete('Hola', 100, 0.5), 'Respuesta 2')
+        self.assertEqual(len(self.calls), 2)
+
+
+class PartialJSONFieldTests(SimpleTestCase):
+    """
+    Contenido parcial de un JSON que todavía se está recibiendo en streaming
+    """
+
+    def test_complete_and_missing_fields(self):
+        text = '{"title": "Título", "content": "<p>Hola</p>"}'
+        self.assertEqual(partial_json_field(text, 'content'), '<p>Hola</p>')
+        self.assertEqual(partial_json_field(text, 'title'), 'Título')
+        self.assertEqual(partial_json_field(text, 'excerpt'), '')
+        self.assertEqual(partial_json_field('{"title": "Tít', 'content'), '')
+
+    def test_truncated_value(self):
+        self.assertEqual(partial_json_field('{"content": "<p>Hola mun', 'content'), '<p>Hola mun')
+        self.assertEqual(partial_json_field('{"content" : ""', 'content'), '')
+
+    def test_escapes(self):
+        text = json.dumps({'content': 'Dijo "basta" en C:\\temp\ny siguió'})
+        self.assertEqual(partial_json_field(text, 'content'), 'Dijo "basta" en C:\\temp\ny siguió')
+        # Una comilla escapada no cierra el valor; una barra escapada sí deja cerrarlo
+        self.assertEqual(partial_json_field(r'{"content": "a\"b", "x": 1}', 'content'), 'a"b')
+        self.assertEqual(partial_json_field(r'{"content": "a\\", "x": 1}', 'content'), 'a\\')
+
+    def test_cut_inside_an_escape(self):
+        for text, expected in (
+            ('{"content": "Hola \\', 'Hola '),
+            ('{"content": "Hola \\u00', 'Hola '),
+            ('{"content": "Hola \\u00e1', 'Hola á'),
+            ('{"content": "Hola \\\\', 'Hola \\'),
+        ):
+            self.assertEqual(partial_json_field(text, 'content'), expected, text)
+
+    def test_raw_newlines_and_split_surrogate_pairs(self):
+        self.assertEqual(partial_json_field('{"content": "uno\ndos', 'content'), 'uno\ndos')
+        self.assertEqual(partial_json_field(r'{"content": "Listo \ud83d', 'content'), 'Listo ')
+        self.assertEqual(partial_json_field(r'{"content": "Listo \ud83d\ude80', 'content'), 'Listo 🚀')
+
+
+@override_settings(CACHES=TEST_CACHES, NEWS_RATE_LIMIT_ENABLED=False, NEWS_STREAM_COMPLETIONS=True,
+                   NEWS_STREAM_FLUSH_TOKENS=2, NEWS_STREAM_FLUSH_SECONDS=60)
+class GenerationProgressTests(TestCase):
+    """
+    Progreso de las generaciones en streaming: escrituras acotadas a las
+    columnas de progreso y endpoint JSON del admin
+    """
+    chunks = ['{"title": "T", ', '"content": "<p>Hola', ' \\"mundo\\"', '</p>\\n<p>Adiós', '</p>"', '}']
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.news_gen = NewsGeneration.objects.create(
+            tags='ia', created_by=self.user, status='GENERATING', generated_title='Título anterior',
+        )
+
+    def streaming_client(self):
+        def create(**kwargs):
+            self.assertTrue(kwargs['stream'])
+            for text in self.chunks:
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+            yield SimpleNamespace(usage=SimpleNamespace(prompt_tokens=5, completion_tokens=6), choices=[])
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def progress(self, news_id=None):
+        return self.client.get(reverse('admin:news_progress', args=[news_id or self.news_gen.pk]))
+
+    def test_streaming_writes_only_the_progress_columns(self):
+        service = SimpleNewsGenerationService()
+        generator = service.ai_generator
+        generator.client = self.streaming_client()
+        generator.reset_metadata(bypass_cache=True)
+        generator.progress_callback = lambda text, tokens: service._save_progress(self.news_gen.pk, text, tokens)
+
+        with CaptureQueriesContext(connection) as queries:
+            content = generator._complete('Prompt', 100, 0.5)
+
+        self.assertEqual(content, ''.join(self.chunks))
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        # Cada 2 tokens y al terminar
+        self.assertEqual(len(updates), 4)
+        for sql in updates:
+            columns = set(re.findall(r'"(\w+)" = ', sql.split(' WHERE ')[0]))
+            self.assertLessEqual(columns, {'progress_tokens', 'progress_updated_at', 'generated_content'}, sql)
+
+        self.news_gen.refresh_from_db()
+        self.assertEqual(self.news_gen.generated_content, '<p>Hola "mundo"</p>\n<p>Adiós</p>')
+        self.assertEqual(self.news_gen.progress_tokens, 6)
+        self.assertEqual((self.news_gen.status, self.news_gen.generated_title), ('GENERATING', 'Título anterior'))
+
+    def test_progress_endpoint_returns_the_tail_of_the_content(self):
+        NewsGeneration.objects.filter(pk=self.news_gen.pk).update(
+            generated_content='a' * 400 + 'b' * 500, progress_tokens=120, progress_updated_at=timezone.now(),
+        )
+        self.client.force_login(self.user)
+
+        data = self.progress().json()
+
+        self.assertEqual(set(data), {
+            'status', 'progress_tokens', 'progress_updated_at', 'generated_title', 'error_message',
+            'content_chars', 'content_tail',
+        })
+        self.assertEqual((data['status'], data['progress_tokens'], data['content_chars']), ('GENERATING', 120, 900))
+        self.assertEqual(data['content_tail'], 'b' * 500)
+        self.assertEqual(self.progress(self.news_gen.pk + 1000).status_code, 404)
+
+    def test_progress_endpoint_requires_view_permission(self):
+        self.assertEqual(self.progress().status_code, 302)
+
+        staff = User.objects.create_user('redactor', password='clave', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.progress().status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='view_newsgeneration'))
+        self.client.force_login(User.objects.get(pk=staff.pk))
+        self.assertEqual(self.progress().status_code, 200)
+
+@override_settings(CACHES=TEST_CACHES, NEWS_RATE_LIMIT_ENABLED=True, NEWS_RATE_LIMIT_RPM=60, NEWS_RATE_LIMIT_TPM=600,
+                   NEWS_RATE_LIMIT_RESERVE=0.5, NEWS_RATE_LIMIT_RETRIES=0)
+class RateLimiterTests(TestCase):
+    """
+    Reservas del límite de uso de OpenAI: piso de prioridad y devolución del
+    cupo cuando la llamada falla
+    """
+
+    def setUp(self):
+        self.limiter = rate_limit.OpenAIRateLimiter()
+
+    def assertLevels(self, requests, tokens):
+        now = timezone.now()
+        # Los buckets se recargan mientras corre el test (1 petición y 10 tokens por segundo)
+        self.assertAlmostEqual(self.limiter.requests.level(self.limiter.requests._row(), now), requests, delta=1)
+        self.assertAlmostEqual(self.limiter.tokens.level(self.limiter.tokens._row(), now), tokens, delta=10)
+
+    def failing_client(self, error, asynchronous=False):
+        def create(**kwargs):
+            raise error
+
+        async def acreate(**kwargs):
+            raise error
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=acreate if asynchronous else create)))
+
+    def test_low_priority_stops_at_the_reserve(self):
+        self.limiter.acquire(250, rate_limit.PRIORITY_LOW, max_wait=0)
+
+        with self.assertRaises(rate_limit.RateLimitExceeded):
+            self.limiter.acquire(100, rate_limit.PRIORITY_LOW, max_wait=0)
+        # La petición reservada antes de descubrir que faltaban tokens se devolvió
+        self.assertLevels(59, 350)
+
+        self.limiter.acquire(300, rate_limit.PRIORITY_HIGH, max_wait=0)
+        self.assertLevels(58, 50)
+
+    def test_failed_call_returns_the_reserved_tokens(self):
+        error = openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.test/v1/chat/completions'))
+        generator = OpenAINewsGenerator(client=self.failing_client(error))
+        generator.reset_metadata(bypass_cache=True)
+
+        with self.assertRaises(openai.APIConnectionError):
+            generator._complete('Hola', 200, 0.5)
+        self.assertLevels(59, 600)
+
+    async def test_failed_async_call_returns_the_reserved_tokens(self):
+        error = openai.APIStatusError(
+            'Error interno', response=httpx.Response(500, request=httpx.Request('POST', 'https://api.openai.test')), body=None,
+        )
+        generator = AsyncNewsGenerator(AsyncResources(client=self.failing_client(error, asynchronous=True), http=object()))
+        generator.reset_metadata(bypass_cache=True)
+
+        with self.assertRaises(openai.APIStatusError):
+            await generator._acomplete('Hola', 200, 0.5)
+        await sync_to_async(self.assertLevels)(59, 600)
+
+    async def test_cancelled_acquire_returns_what_it_took(self):
+        loop = asyncio.get_running_loop()
+        try_take = self.limiter.tokens.try_take
+
+        def cancel_while_taking(amount, floor=0.0):
+            # La tarea se cancela mientras la reserva corre en su hilo
+            loop.call_soon_threadsafe(acquiring.cancel)
+            return try_take(amount, floor)
+
+        self.limiter.tokens.try_take = cancel_while_taking
+        acquiring = asyncio.ensure_future(self.limiter.aacquire(400))
+        with self.assertRaises(asyncio.CancelledError):
+            await acquiring
+        await sync_to_async(self.assertLevels)(60, 600)
+
+
+
+@override_settings(CACHES=TEST_CACHES, NEWS_RATE_LIMIT_ENABLED=False, NEWS_ASYNC_OPENAI_CONCURRENCY=10,
+                   NEWS_HTTP_RETRIES=2, NEWS_HTTP_BACKOFF=0.01, NEWS_HTTP_BACKOFF_MAX=0.05)
+class AsyncPipelineTests(TestCase):
+    """
+    Pipeline asíncrono (posts/services_async.py) contra un transporte httpx
+    falso: reintentos de descarga, plazo global y generaciones concurrentes
+    """
+    html = (
+        '<html><head><title>Nota de prueba</title></head><body><article>'
+        + '<p>El informe oficial detalla la evolución de la cosecha en cada provincia productora.</p>' * 5
+        + '</article></body></html>'
+    ).encode('utf-8')
+
+    def setUp(self):
+        self.requests = []
+        self.running = 0
+        self.peak = 0
+
+    def page(self, request):
+        self.requests.append(str(request.url))
+        return httpx.Response(200, headers={'Content-Type': 'text/html; charset=utf-8'}, content=self.html)
+
+    async def create(self, **kwargs):
+        if 'sin cupo' in kwargs['messages'][0]['content']:
+            raise openai.RateLimitError(
+                'Demasiadas peticiones', body=None,
+                response=httpx.Response(429, request=httpx.Request('POST', 'https://api.openai.test')),
+            )
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            self.running -= 1
+        content = json.dumps({
+            'title': 'Artículo', 'excerpt': 'Resumen', 'content': '<p>Texto</p>' * 200,
+            'meta_description': 'Descripción', 'meta_keywords': 'a, b',
+        })
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20),
+        )
+
+    def generator(self, http):
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.create)))
+        generator = AsyncNewsGenerator(AsyncResources(client=client, http=http))
+        generator.reset_metadata(bypass_cache=True)
+        return generator
+
+    async def test_retries_transient_errors_before_extracting(self):
+        statuses = [503, 502]
+
+        def handler(request):
+            if statuses:
+                self.requests.append(str(request.url))
+                return httpx.Response(statuses.pop(0))
+            return self.page(request)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            article = await self.generator(http)._afetch_article('https://medio.test/nota')
+
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(article['cache_status'], 'miss')
+        self.assertIn('evolución de la cosecha', article['content'])
+
+    async def test_gives_up_after_the_last_retry(self):
+        def handler(request):
+            self.requests.append(str(request.url))
+            return httpx.Response(503)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            with self.assertLogs('posts.services_async', 'WARNING'):
+                article = await self.generator(http)._afetch_article('https://medio.test/nota')
+
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(article['title'], 'Error extrayendo: https://medio.test/nota')
+        self.assertIn('503', article['content'])
+
+    def test_retry_delay_uses_backoff_or_capped_retry_after(self):
+        generator = self.generator(http=object())
+
+        self.assertEqual(generator._retry_delay(httpx.Response(429, headers={'Retry-After': '3'}), 0), 3)
+        self.assertEqual(
+            generator._retry_delay(httpx.Response(429, headers={'Retry-After': '120'}), 0), CappedRetry.RETRY_AFTER_MAX,
+        )
+        for attempt, low, high in ((0, 0.01, 0.02), (1, 0.02, 0.03), (5, 0.05, 0.06)):
+            for _ in range(20):
+                self.assertTrue(low <= generator._retry_delay(httpx.Response(503), attempt) <= high, attempt)
+
+    @override_settings(NEWS_FETCH_DEADLINE=0.2)
+    async def test_deadline_cancels_slow_downloads(self):
+        async def handler(request):
+            if request.url.host == 'lento.test':
+                await asyncio.sleep(5)
+            return self.page(request)
+
+        started = time.monotonic()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            articles = await self.generator(http)._afetch_all(['https://lento.test/nota', 'https://rapido.test/nota'], {})
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(articles[0]['content'], 'No se pudo acceder al contenido de esta URL: tiempo de descarga agotado')
+        self.assertIn('evolución de la cosecha', articles[1]['content'])
+
+    async def test_source_packing_and_token_counting_run_off_the_event_loop(self):
+        threads = defaultdict(set)
+        merge, count = dedup.merge_near_duplicates, context_packing.count_tokens
+
+        def recording(name, function):
+            def wrapper(*args, **kwargs):
+                threads[name].add(threading.get_ident())
+                return function(*args, **kwargs)
+            return wrapper
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(self.page)) as http:
+            with mock.patch.object(dedup, 'merge_near_duplicates', recording('dedup', merge)), \
+                    mock.patch.object(context_packing, 'count_tokens', recording('tokens', count)):
+                await self.generator(http).agenerate_from_manual_urls(['https://medio.test/nota'], ['cosecha'])
+
+        self.assertEqual(set(threads), {'dedup', 'tokens'})
+        for name, idents in threads.items():
+            self.assertNotIn(threading.get_ident(), idents, name)
+
+    async def test_process_many_caps_concurrent_generations(self):
+        user = await User.objects.acreate(username='editor')
+        generations = [await NewsGeneration.objects.acreate(tags=f"tema {i}", created_by=user) for i in range(4)]
+        generations.append(await NewsGeneration.objects.acreate(
+            tags='fuentes', created_by=user, manual_urls='https://medio.test/uno\nhttps://otro.test/dos',
+        ))
+        generations.append(await NewsGeneration.objects.acreate(tags='sin cupo', created_by=user))
+        ids = [news_gen.pk for news_gen in generations]
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(self.page)) as http:
+            client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.create)))
+            service = AsyncNewsGenerationService(AsyncResources(client=client, http=http))
+            with self.assertLogs('posts.services_async', 'ERROR'):
+                results = await service.process_many(ids, concurrency=2)
+
+        self.assertEqual(self.peak, 2)
+        self.assertEqual([result.pk for result in results[:5]], ids[:5])
+        self.assertIsInstance(results[5], rate_limit.RateLimitExceeded)
+        self.assertEqual(sorted(self.requests), ['https://medio.test/uno', 'https://otro.test/dos'])
+
+        statuses = NewsGeneration.objects.filter(pk__in=ids).order_by('pk').values_list('status', flat=True)
+        self.assertEqual([status async for status in statuses], ['COMPLETED'] * 5 + ['ERROR'])
+        self.assertTrue(await GenerationSpan.objects.filter(generation_id=ids[0], stage='completion').aexists())
+        manual = await NewsGeneration.objects.aget(pk=generations[4].pk)
+        self.assertEqual(len(manual.source_articles), 2)
+        self.assertEqual(manual.generation_metadata['context']['sources'], 1)
+
+@override_settings(CACHES=TEST_CACHES)
+class NewsBatchTests(TestCase):
+    """
+    Flujo de lotes contra el cliente local de la Batch API
+    """
+
+    def setUp(self):
+        self.batch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.batch_dir, ignore_errors=True)
+        settings_override = override_settings(NEWS_BATCH_DIR=self.batch_dir, NEWS_BATCH_BACKEND='local')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(username='editor')
+
+    def _generation(self, tags, **kwargs):
+        return NewsGeneration.objects.create(tags=tags, created_by=self.user, **kwargs)
+
+    def test_submit_writes_batch_jsonl_and_skips_manual_urls(self):
+        first = self._generation('ia, robots')
+        second = self._generation('clima')
+        manual = self._generation('web', manual_urls='https://example.com/nota')
+
+        batch = batching.submit_batch()
+
+        self.assertEqual(batch.request_count, 2)
+        self.assertTrue(batch.remote_id)
+        with open(batch.input_file, encoding='utf-8') as handle:
+            lines = [json.loads(line) for line in handle]
+        self.assertEqual([line['custom_id'] for line in lines], [f"news-{first.pk}", f"news-{second.pk}"])
+        for line in lines:
+            self.assertEqual(line['method'], 'POST')
+            self.assertEqual(line['url'], '/v1/chat/completions')
+            self.assertEqual(line['body']['response_format'], {'type': 'json_object'})
+            self.assertIn('messages', line['body'])
+
+        # Las filas del lote no quedan disponibles para los workers
+        self.assertEqual(list(jobs.claimable().values_list('pk', flat=True)), [manual.pk])
+        self.assertEqual(NewsGeneration.objects.filter(batch=batch, status='GENERATING').count(), 2)
+
+    def test_poll_fans_results_back_into_each_generation(self):
+        generations = [self._generation(f"tema {i}") for i in range(3)]
+        client = batching.LocalBatchClient()
+
+        batch = batching.submit_batch(client=client)
+        batching.poll_batch(batch, client)
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'COMPLETED')
+        self.assertEqual(batch.completed_count, 3)
+        for news_gen in generations:
+            news_gen.refresh_from_db()
+            self.assertEqual(news_gen.status, 'COMPLETED')
+            self.assertEqual(news_gen.generated_title, 'Artículo generado en lote')
+            self.assertEqual(news_gen.generation_metadata['generation_mode'], 'batch')
+            self.assertEqual(news_gen.total_sources_found, 5)
+
+    def test_failed_requests_go_back_to_the_worker_queue(self):
+        ok = self._generation('ia')
+        broken = self._generation('roto')
+
+        def responder(body):
+            if 'roto' in body['messages'][0]['content']:
+                raise RuntimeError('modelo no disponible')
+            return batching.sample_response(body)
+
+        client = batching.LocalBatchClient(responder=responder)
+        batch = batching.submit_batch(client=client)
+        batching.poll_batch(batch, client)
+
+        ok.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(ok.status, 'COMPLETED')
+        self.assertEqual(broken.status, 'PENDING')
+        self.assertIn('modelo no disponible', broken.error_message)
+        self.assertEqual(NewsBatch.objects.get(pk=batch.pk).failed_count, 1)
+        self.assertEqual(jobs.claim_next('worker-test').pk, broken.pk)
+
+    def test_invalid_json_response_is_requeued(self):
+        news_gen = self._generation('ia')
+        client = batching.LocalBatchClient(responder=lambda body: '{"title": "sin contenido"}')
+
+        batching.poll_batch(batching.submit_batch(client=client), client)
+
+        news_gen.refresh_from_db()
+        self.assertEqual(news_gen.status, 'PENDING')
+        self.assertIn('Faltan campos', news_gen.error_message)
+
+    def test_requeue_counts_the_batch_as_an_attempt(self):
+        news_gen = self._generation('roto')
+
+        def responder(body):
+            raise RuntimeError('modelo no disponible')
+
+        client = batching.LocalBatchClient(responder=responder)
+        for attempt in range(1, 3):
+            batching.poll_batch(batching.submit_batch(client=client), client)
+            news_gen.refresh_from_db()
+            self.assertEqual((news_gen.status, news_gen.attempts), ('PENDING', attempt))
+
+        with override_settings(NEWS_WORKER_MAX_ATTEMPTS=3):
+            batching.poll_batch(batching.submit_batch(client=client), client)
+        news_gen.refresh_from_db()
+        self.assertEqual((news_gen.status, news_gen.attempts), ('ERROR', 3))
+        self.assertIsNone(batching.submit_batch(client=client))
+
+    def test_command_stops_submitting_when_the_upload_fails(self):
+        self._generation('ia')
+        client = batching.LocalBatchClient()
+
+        def broken_upload(file, purpose):
+            raise ConnectionError('sin conexión')
+
+        client.files.create = broken_upload
+        with mock.patch.object(batching, 'get_batch_client', return_value=client):
+            call_command('process_news_batches', '--submit-only', stdout=io.StringIO(), stderr=io.StringIO())
+
+        batch = NewsBatch.objects.get()
+        self.assertEqual(batch.status, 'FAILED')
+        self.assertIn('sin conexión', batch.error_message)
+        self.assertEqual(NewsGeneration.objects.get().attempts, 1)
+
+    def test_submit_returns_none_without_pending_generations(self):
+        self._generation('ia', status='COMPLETED')
+        self.assertIsNone(batching.submit_batch())
+        self.assertFalse(NewsBatch.objects.exists())
+
+
+
+@override_settings(CACHES=TEST_CACHES, NEWS_OPENAI_PROMPT_PRICE=0.15, NEWS_OPENAI_COMPLETION_PRICE=0.60)
+class TracingTests(TestCase):
+    """
+    Tramos de las generaciones (posts/tracing.py) y reporte por etapa
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.news_gen = NewsGeneration.objects.create(tags='ia', created_by=self.user)
+
+    def spans(self, stage, durations, day, **fields):
+        started_at = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=day)
+        GenerationSpan.objects.bulk_create(
+            GenerationSpan(generation=self.news_gen, stage=stage, started_at=started_at, duration_ms=duration, **fields)
+            for duration in durations
+        )
+
+    def test_span_outside_a_generation_records_nothing(self):
+        with tracing.span('fetch', 'https://medio.test') as fields:
+            fields['cached'] = True
+        self.assertEqual(fields, {'cached': True})
+
+    def test_spans_are_saved_together_with_their_fields_and_errors(self):
+        with tracing.trace(self.news_gen.pk) as tracer:
+            with tracing.span('completion', 'gpt-4o-mini') as call:
+                call['prompt_tokens'] = 120
+                call['completion_tokens'] = 80
+            with self.assertRaises(ConnectionError):
+                with tracing.span('fetch', 'https://medio.test/' + 'x' * 600):
+                    raise ConnectionError('x' * 600)
+        self.assertIsNone(tracing._current.get())
+        self.assertFalse(GenerationSpan.objects.exists())
+
+        with self.assertNumQueries(1):
+            tracer.save()
+
+        completion, fetch = GenerationSpan.objects.order_by('pk')
+        self.assertEqual((completion.stage, completion.label), ('completion', 'gpt-4o-mini'))
+        self.assertEqual((completion.prompt_tokens, completion.completion_tokens, completion.error), (120, 80, ''))
+        self.assertGreaterEqual(completion.duration_ms, 0)
+        self.assertEqual((fetch.stage, len(fetch.label), fetch.error), ('fetch', 500, 'x' * 500))
+        self.assertEqual(tracer.spans, [])
+
+    def test_save_failures_are_logged_not_raised(self):
+        tracer = tracing.Tracer(self.news_gen.pk)
+        tracer.add('total', '', timezone.now(), 1.5)
+
+        with mock.patch.object(GenerationSpan.objects, 'bulk_create', side_effect=RuntimeError('base caída')):
+            with self.assertLogs('posts.tracing', 'WARNING') as logs:
+                tracer.save()
+        self.assertIn('base caída', logs.output[0])
+
+    def test_stage_report_percentiles_tokens_and_cost(self):
+        self.spans('fetch', range(1, 101), day=0)
+        self.spans('fetch', [500], day=1, error='HTTP 503')
+        self.spans('completion', [2000, 1000], day=1, prompt_tokens=1000, completion_tokens=500)
+        self.spans('completion', [3000], day=30)
+
+        with self.assertNumQueries(8):
+            totals, daily = tracing.stage_report(timezone.now() - timedelta(days=7))
+
+        fetch, completion = totals
+        self.assertEqual(
+            {key: fetch[key] for key in ('stage', 'day', 'count', 'errors', 'p50', 'p95', 'p99')},
+            {'stage': 'fetch', 'day': None, 'count': 101, 'errors': 1, 'p50': 51, 'p95': 96, 'p99': 100},
+        )
+        self.assertEqual((completion['count'], completion['p50'], completion['p99']), (2, 1000, 2000))
+        self.assertEqual((completion['prompt_tokens'], completion['completion_tokens']), (2000, 1000))
+        self.assertAlmostEqual(completion['cost'], (2000 * 0.15 + 1000 * 0.60) / 1_000_000)
+        self.assertEqual(completion['stage_label'], 'Llamada al modelo')
+
+        self.assertEqual([(row['stage'], row['count']) for row in daily], [('fetch', 100), ('fetch', 1), ('completion', 2)])
+        self.assertEqual((daily[0]['p50'], daily[0]['p95'], daily[0]['p99']), (50, 95, 99))
+        self.assertGreater(daily[0]['day'], daily[1]['day'])
+
+    def test_report_view_caps_the_period(self):
+        self.spans('total', [100], day=0)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('admin:generationspan_report'), {'days': 100000})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['days'], 30)
+        self.assertContains(response, 'Generación completa')
+
+@override_settings(CACHES=TEST_CACHES)
+class PageCacheTests(TestCase):
+    """
+    Páginas cacheadas: encabezados guardados, ETag del detalle e invalidación
+    desde posts/signals.py
+    """
+
+    def setUp(self):
+        caches[settings.PAGE_CACHE].clear()
+        self.news = Category.objects.create(name='Noticias', slug='noticias')
+        self.opinion = Category.objects.create(name='Opinión', slug='opinion')
+        self.post = Post.objects.create(
+            title='Primer post', slug='primer-post', content='<p>Hola</p>', category=self.news, published=True,
+        )
+
+    def versions(self):
+        scopes = (page_cache.ALL_POSTS, page_cache.SIDEBAR,
+                  page_cache.category_scope(self.news.pk), page_cache.category_scope(self.opinion.pk))
+        return {scope: page_cache._version(page_cache._list_version_key(scope)) for scope in scopes}
+
+    def changed_scopes(self, before):
+        after = self.versions()
+        return {scope for scope in before if before[scope] != after[scope]}
+
+    def detail(self, **headers):
+        return self.client.get(reverse('post_detail', args=[self.post.slug]), **headers)
+
+    def test_cached_response_replays_its_headers(self):
+        first = self.detail()
+        with mock.patch('posts.views.render') as render:
+            second = self.detail()
+
+        render.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        for header in ('Content-Type', 'Cache-Control', 'ETag'):
+            self.assertEqual(second[header], first[header], header)
+        self.assertIn('max-age=0', second['Cache-Control'])
+
+    def test_stored_headers_include_vary(self):
+        response = HttpResponse('<p>hola</p>', content_type='text/html; charset=utf-8')
+        response['Vary'] = 'Accept-Language'
+        page_cache.store_response('posts:test', response, 'abc')
+
+        cached = page_cache.get_response('posts:test', 'abc')
+        self.assertEqual((cached['Vary'], cached['Content-Type']), ('Accept-Language', 'text/html; charset=utf-8'))
+        self.assertIsNone(page_cache.get_response('posts:test', 'otro'))
+
+    def test_detail_etag_follows_the_sidebar(self):
+        etag = self.detail()['ETag']
+        self.assertEqual(self.detail(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Otro post publicado cambia populares y conteos de categorías del sidebar
+        Post.objects.create(title='Segundo', slug='segundo', content='<p>Otro</p>', category=self.opinion, published=True)
+        response = self.detail(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Opinión (1)')
+
+    def test_detail_is_validated_by_etag_only(self):
+        first = self.detail()
+        self.assertFalse(first.has_header('Last-Modified'))
+
+        # updated_at no refleja el sidebar: un If-Modified-Since no puede dar 304
+        Post.objects.create(title='Segundo', slug='segundo', content='<p>Otro</p>', category=self.opinion, published=True)
+        response = self.detail(HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Opinión (1)')
+
+    def test_popular_refresh_changes_the_etag_only_when_the_list_changes(self):
+        other = Post.objects.create(title='Segundo', slug='segundo', content='<p>Otro</p>', category=self.news, published=True)
+        Post.objects.filter(pk=self.post.pk).update(view_count=10)
+        sidebar.refresh_popular_posts()
+        etag = self.detail()['ETag']
+
+        # Más visitas sin cambiar qué posts aparecen ni su orden
+        Post.objects.filter(pk=self.post.pk).update(view_count=20)
+        sidebar.refresh_popular_posts()
+        self.assertEqual(self.detail()['ETag'], etag)
+
+        Post.objects.filter(pk=other.pk).update(view_count=50)
+        sidebar.refresh_popular_posts()
+        self.assertNotEqual(self.detail()['ETag'], etag)
+
+    def test_sidebar_version_is_part_of_every_list_key(self):
+        key = page_cache.list_key({}, page_cache.category_scope(self.news.pk))
+        page_cache.invalidate_lists(page_cache.SIDEBAR)
+        self.assertNotEqual(page_cache.list_key({}, page_cache.category_scope(self.news.pk)), key)
+
+    def test_publishing_invalidates_the_general_and_its_category_list(self):
+        before = self.versions()
+        Post.objects.create(title='Nuevo', slug='nuevo', content='<p>Nuevo</p>', category=self.opinion, published=True)
+        # El conteo de la categoría en el sidebar cambió
+        self.assertEqual(self.changed_scopes(before), {
+            page_cache.ALL_POSTS, page_cache.SIDEBAR, page_cache.category_scope(self.opinion.pk),
+        })
+
+    def test_editing_a_published_post_keeps_the_sidebar(self):
+        self.detail()
+        before = self.versions()
+        self.post.content = '<p>Hola, corregido</p>'
+        self.post.save()
+
+        self.assertEqual(self.changed_scopes(before), {page_cache.ALL_POSTS, page_cache.category_scope(self.news.pk)})
+        self.assertIsNone(caches[settings.PAGE_CACHE].get(page_cache.detail_key(self.post.slug)))
+
+    def test_editing_a_draft_invalidates_nothing(self):
+        draft = Post.objects.create(
+            title='Borrador', slug='borrador', content='<p>Borrador</p>', category=self.news, published=False,
+        )
+        before = self.versions()
+        draft.title = 'Borrador corregido'
+        draft.save()
+        self.assertEqual(self.changed_scopes(before), set())
+
+    def test_moving_a_post_invalidates_both_categories(self):
+        before = self.versions()
+        self.post.category = self.opinion
+        self.post.save()
+        self.assertEqual(self.changed_scopes(before), set(before))
+
+    def test_unpublishing_and_deleting_invalidate_the_lists(self):
+        before = self.versions()
+        self.post.published = False
+        self.post.save(update_fields=['published'])
+        self.assertEqual(self.changed_scopes(before), {
+            page_cache.ALL_POSTS, page_cache.SIDEBAR, page_cache.category_scope(self.news.pk),
+        })
+
+        # Un borrador borrado no estaba en ninguna página
+        before = self.versions()
+        self.post.delete()
+        self.assertEqual(self.changed_scopes(before), set())
+
+    def test_renaming_a_category_invalidates_its_lists(self):
+        Post.objects.create(title='Columna', slug='columna', content='<p>Columna</p>', category=self.opinion, published=True)
+        before = self.versions()
+        self.opinion.name = 'Columnas'
+        self.opinion.save()
+        self.assertEqual(self.changed_scopes(before), {
+            page_cache.ALL_POSTS, page_cache.SIDEBAR, page_cache.category_scope(self.opinion.pk),
+        })
+
+
+class FakeRedis:
+    """
+    Lo mínimo de redis.Redis que usa posts/view_counts.py
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.sets = defaultdict(set)
+
+    def incr(self, key, amount=1):
+        self.values[key] = int(self.values.get(key, 0)) + amount
+        return self.values[key]
+
+    incrby = incr
+
+    def getset(self, key, value):
+        previous = self.values.get(key)
+        self.values[key] = value
+        return None if previous is None else str(previous).encode()
+
+    def sadd(self, key, *members):
+        self.sets[key].update(str(member).encode() for member in members)
+
+    def spop(self, key, count):
+        return [self.sets[key].pop() for _ in range(min(count, len(self.sets[key])))]
+
+    def scard(self, key):
+        return len(self.sets[key])
+
+    def pipeline(self):
+        client, calls = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: calls.append((name, args))
+
+            def execute(self):
+                return [getattr(client, name)(*args) for name, args in calls]
+        return Pipeline()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ViewCountTests(TestCase):
+    """
+    Visitas de post_detail: en Redis hasta el volcado, o en la memoria del proceso sin Redis
+    """
+
+    def setUp(self):
+        caches[settings.PAGE_CACHE].clear()
+        view_counts._local.clear()
+        self.addCleanup(view_counts._local.clear)
+        category = Category.objects.create(name='Noticias', slug='noticias')
+        self.first, self.second = (
+            Post.objects.create(title=f"Post {i}", slug=f"post-{i}", content='<p>Hola</p>', category=category)
+            for i in range(2)
+        )
+
+    def view(self, post, times=1):
+        for _ in range(times):
+            self.assertEqual(self.client.get(reverse('post_detail', args=[post.slug])).status_code, 200)
+
+    def view_counts(self):
+        return list(Post.objects.order_by('pk').values_list('view_count', flat=True))
+
+    @override_settings(REDIS_URL='', VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_without_redis_views_stay_in_memory_until_the_flush(self):
+        with mock.patch.object(view_counts, '_last_flush', time.monotonic()):
+            with CaptureQueriesContext(connection) as queries:
+                self.view(self.first, 3)
+                self.view(self.second)
+            self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+            self.assertEqual(self.view_counts(), [0, 0])
+
+            self.assertEqual(view_counts.flush(), (2, 4))
+        self.assertEqual(self.view_counts(), [3, 1])
+        self.assertEqual(view_counts.flush(), (0, 0))
+
+    @override_settings(REDIS_URL='', VIEW_COUNT_FLUSH_INTERVAL=0)
+    def test_without_redis_the_request_flushes_when_the_interval_passed(self):
+        self.view(self.first, 2)
+        self.assertEqual(self.view_counts(), [2, 0])
+        self.assertFalse(view_counts._local)
+
+    @override_settings(REDIS_URL='', VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_failed_local_flush_keeps_the_views_for_the_next_one(self):
+        self.view(self.first, 2)
+        self.view(self.second)
+        add_views = view_counts._add_views
+
+        def fail_after_first_chunk(counts):
+            if self.view_counts() != [0, 0]:
+                raise RuntimeError('base caída')
+            add_views(counts)
+
+        with mock.patch.object(view_counts, 'FLUSH_CHUNK', 1):
+            with mock.patch.object(view_counts, '_add_views', side_effect=fail_after_first_chunk):
+                with self.assertRaises(RuntimeError):
+                    view_counts.flush_local()
+        # El primer bloque ya llegó a la base: sólo vuelve el resto
+        self.assertEqual(self.view_counts(), [2, 0])
+        self.assertEqual(view_counts._local, {self.second.pk: 1})
+
+        self.assertEqual(view_counts.flush_local(), (1, 1))
+        self.assertEqual(self.view_counts(), [2, 1])
+
+    @override_settings(REDIS_URL='', VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_revalidated_views_are_counted(self):
+        url = reverse('post_detail', args=[self.first.slug])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('post_detail', args=['no-existe'])).status_code, 404)
+        self.assertEqual(view_counts.flush(), (1, 2))
+
+    @override_settings(REDIS_URL='redis://test')
+    def test_redis_buffers_views_and_flushes_only_pending_posts(self):
+        fake = FakeRedis()
+        with mock.patch.object(view_counts, '_redis', return_value=fake):
+            self.view(self.first, 3)
+            self.view(self.second)
+            self.assertEqual(self.view_counts(), [0, 0])
+
+            self.assertEqual(view_counts.flush(), (2, 4))
+            self.assertEqual(self.view_counts(), [3, 1])
+            self.assertEqual(view_counts.flush(), (0, 0))
+
+            self.view(self.second, 2)
+            with mock.patch.object(view_counts, 'FLUSH_CHUNK', 1):
+                self.assertEqual(view_counts.flush(), (1, 2))
+        self.assertEqual(self.view_counts(), [3, 3])
+
+    @override_settings(REDIS_URL='redis://test')
+    def test_failed_flush_keeps_the_views_for_the_next_one(self):
+        fake = FakeRedis()
+        with mock.patch.object(view_counts, '_redis', return_value=fake):
+            self.view(self.first, 2)
+            with mock.patch.object(view_counts, '_add_views', side_effect=RuntimeError('base caída')):
+                with self.assertRaises(RuntimeError):
+                    view_counts.flush()
+
+            self.assertEqual(view_counts.flush(), (1, 2))
+        self.assertEqual(self.view_counts(), [2, 0])
+
+
+@override_settings(CACHES=TEST_CACHES, POST_IMAGE_WIDTHS=[100, 200, 400], MEDIA_URL='/media/')
+class ImageVariantTests(TestCase):
+    """
+    Variantes WebP/JPEG de Post.image (posts/images.py) y el tag post_picture
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.post = Post.objects.create(title='Con foto', slug='con-foto', content='<p>Hola</p>', image=self.upload('foto.png'))
+
+    def upload(self, name, size=(300, 150)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def files(self, variants):
+        return [name for key in ('webp', 'jpeg') for _, name in variants[key]]
+
+    def exists(self, name):
+        return self.post.image.storage.exists(name)
+
+    def picture(self, post):
+        return Template('{% load post_images %}{% post_picture post sizes="50vw" %}').render(Context({'post': post}))
+
+    def test_pending_images_get_one_variant_per_width_without_upscaling(self):
+        self.assertEqual(list(images.pending()), [self.post])
+        self.assertEqual(images.process_pending(), 1)
+        self.assertEqual(images.process_pending(), 0)
+
+        self.post.refresh_from_db()
+        variants = self.post.image_variants
+        self.assertEqual((variants['source'], variants['width'], variants['height']), (self.post.image.name, 300, 150))
+        self.assertEqual([width for width, _ in variants['webp']], [100, 200, 300])
+        self.assertEqual(variants['jpeg'][0][1], 'posts/foto-100w.jpg')
+        for name in self.files(variants):
+            self.assertTrue(self.exists(name))
+        with self.post.image.storage.open(variants['jpeg'][1][1]) as variant:
+            self.assertEqual(Image.open(variant).size, (200, 100))
+
+    def test_replacing_or_removing_the_image_deletes_the_old_variants(self):
+        old = self.files(images.generate(self.post))
+        self.post.refresh_from_db()
+
+        self.post.image = self.upload('otra.png', (120, 120))
+        self.post.save()
+        self.assertEqual(self.post.image_variants, {'stale': old})
+        self.assertEqual(list(images.pending()), [self.post])
+        images.process_pending()
+        self.post.refresh_from_db()
+        new = self.files(self.post.image_variants)
+        self.assertEqual([width for width, _ in self.post.image_variants['webp']], [100, 120])
+        self.assertFalse([name for name in old if self.exists(name)])
+        self.assertTrue(all(self.exists(name) for name in new))
+
+        self.post.image = None
+        self.post.save()
+        images.process_pending()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.image_variants, {})
+        self.assertFalse([name for name in new if self.exists(name)])
+        self.assertFalse(images.pending().exists())
+
+    def test_regenerating_with_other_widths_deletes_the_dropped_ones(self):
+        images.generate(self.post)
+        self.post.refresh_from_db()
+        with override_settings(POST_IMAGE_WIDTHS=[200]):
+            call_command('generate_image_variants', '--all', stdout=io.StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.files(self.post.image_variants), ['posts/foto-200w.webp', 'posts/foto-200w.jpg'])
+        self.assertTrue(self.exists('posts/foto-200w.jpg'))
+        self.assertFalse(self.exists('posts/foto-100w.jpg'))
+        self.assertFalse(self.exists('posts/foto-300w.webp'))
+
+    def test_image_changed_while_processing_discards_the_result(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        self.post.image = self.upload('nueva.png')
+        self.post.save()
+
+        self.assertIsNone(images.generate(stale))
+        self.assertFalse(self.exists('posts/foto-100w.webp'))
+        self.assertEqual(list(images.pending()), [self.post])
+
+    def test_broken_image_is_recorded_and_not_retried(self):
+        self.post.image.storage.save('posts/rota.png', io.BytesIO(b'no es una imagen'))
+        Post.objects.filter(pk=self.post.pk).update(image='posts/rota.png')
+        with self.assertLogs('posts.images', 'WARNING'):
+            images.process_pending()
+        self.post.refresh_from_db()
+        self.assertIn('error', self.post.image_variants)
+        self.assertFalse(images.pending().exists())
+        self.assertIn('src="/media/posts/rota.png"', self.picture(self.post))
+
+    def test_post_picture_uses_the_variants_once_generated(self):
+        html = self.picture(self.post)
+        self.assertNotIn('<picture>', html)
+        self.assertIn(f'src="/media/{self.post.image.name}"', html)
+
+        images.generate(self.post)
+        self.post.refresh_from_db()
+        html = self.picture(self.post)
+        self.assertIn(
+            '<source type="image/webp" srcset="/media/posts/foto-100w.webp 100w, /media/posts/foto-200w.webp 200w, '
+            '/media/posts/foto-300w.webp 300w" sizes="50vw">', html,
+        )
+        # Ninguna variante llega a FALLBACK_WIDTH: src es la más ancha
+        self.assertIn('src="/media/posts/foto-300w.jpg"', html)
+        self.assertIn('width="300" height="150"', html)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    """
+    Búsqueda de texto completo: ranking por campo y reindexado desde los signals
+    """
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Ciencia', slug='ciencia')
+
+    def post(self, slug, **fields):
+        return Post.objects.create(slug=slug, category=self.category, **{'title': slug, 'content': '<p>Texto</p>', **fields})
+
+    def test_title_matches_rank_above_content_matches(self):
+        in_content = self.post('en-el-cuerpo', title='Informe anual', content='<p>La <b>energía</b> solar creció</p>')
+        in_title = self.post('en-el-titulo', title='Energía solar en el norte')
+        in_keywords = self.post('en-las-claves', title='Parques eólicos', meta_keywords='energía, viento')
+        self.post('sin-coincidencia', title='Cosecha récord')
+        self.post('borrador', title='Energía nuclear', published=False)
+
+        self.assertEqual(search.ranked_ids('energia'), [in_title.pk, in_keywords.pk, in_content.pk])
+        # Prefijos y varias palabras (todas tienen que estar)
+        self.assertEqual(search.ranked_ids('sola energ'), [in_title.pk, in_content.pk])
+        self.assertEqual(search.ranked_ids('"; DROP TABLE posts_post; --'), [])
+        self.assertEqual(
+            set(search.filter_posts(Post.objects.all(), 'energía').values_list('pk', flat=True)),
+            {in_title.pk, in_keywords.pk, in_content.pk, Post.objects.get(slug='borrador').pk},
+        )
+
+    def test_saving_and_deleting_resync_the_index(self):
+        post = self.post('cambia', title='Satélite argentino', content='<p>Órbita baja</p>')
+        self.assertEqual(search.ranked_ids('satelite'), [post.pk])
+
+        post.title = 'Cohete reutilizable'
+        post.content = '<p>Aterrizaje vertical</p>'
+        post.save()
+        self.assertEqual(search.ranked_ids('satelite'), [])
+        self.assertEqual(search.ranked_ids('orbita'), [])
+        self.assertEqual(search.ranked_ids('cohete aterrizaje'), [post.pk])
+
+        # Despublicar no reindexa, pero sale de los resultados públicos
+        post.published = False
+        post.save(update_fields=['published'])
+        self.assertEqual(search.ranked_ids('cohete'), [])
+
+        post.delete()
+        self.assertEqual(search.filter_posts(Post.objects.all(), 'cohete').count(), 0)
+        if search.backend() == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT count(*) FROM {search.FTS_TABLE}")
+                self.assertEqual(cursor.fetchone()[0], 0)
+
+
+@override_settings(READING_WORDS_PER_MINUTE=10)
+class RenderingTests(SimpleTestCase):
+    """
+    Limpieza del HTML generado (posts/rendering.py)
+    """
+
+    def test_strips_model_leftovers(self):
+        result = rendering.render(
+            '```html\n<html><body><!-- borrador --><p>Hola</p><p> </p><script>alert(1)</script>'
+            '<style>p {}</style><div><p>Chau</p></div></body></html>\n```'
+        )
+        self.assertEqual(result['content'], '<p>Hola</p><p>Chau</p>')
+
+    def test_headings_start_at_h2_without_gaps_and_feed_the_toc(self):
+        result = rendering.render('<h1>Intro</h1><h4>Detalle</h4><h1>Intro</h1><h5>Nota al pie</h5>')
+
+        self.assertEqual(
+            result['content'],
+            '<h2 id="intro">Intro</h2><h3 id="detalle">Detalle</h3><h2 id="intro-2">Intro</h2><h4>Nota al pie</h4>',
+        )
+        self.assertEqual(result['toc'], [
+            {'level': 2, 'id': 'intro', 'title': 'Intro'},
+            {'level': 3, 'id': 'detalle', 'title': 'Detalle'},
+            {'level': 2, 'id': 'intro-2', 'title': 'Intro'},
+        ])
+
+    def test_keeps_relative_urls_and_drops_dangerous_schemes(self):
+        cases = {
+            '<p><img src="x.png" alt="Foto"></p>': '<p><img alt="Foto" src="x.png"/></p>',
+            '<p><a href="../otra-nota?p=2#arriba">nota</a></p>': '<p><a href="../otra-nota?p=2#arriba">nota</a></p>',
+            '<p><a href="/categoria/ia/">IA</a></p>': '<p><a href="/categoria/ia/">IA</a></p>',
+            '<p><a href="https://ejemplo.test" onclick="x()">fuente</a></p>':
+                '<p><a href="https://ejemplo.test" rel="nofollow noopener">fuente</a></p>',
+            '<p><a href="mailto:hola@ejemplo.test">escribinos</a></p>': '<p><a href="mailto:hola@ejemplo.test">escribinos</a></p>',
+            '<p><a href="JavaScript:alert(1)">clic</a></p>': '<p>clic</p>',
+            '<p><a href=" java&#9;script:alert(1)">clic</a></p>': '<p>clic</p>',
+            '<p><a href="vbscript:msgbox(1)">clic</a></p>': '<p>clic</p>',
+            '<p>Foto: <img src="data:image/svg+xml;base64,PHN2Zz4="></p>': '<p>Foto: </p>',
+        }
+        for html, expected in cases.items():
+            with self.subTest(html=html):
+                self.assertEqual(rendering.render(html)['content'], expected)
+
+    def test_collapses_whitespace_except_in_pre(self):
+        result = rendering.render('<p>Hola\n   <b>mundo</b>\t!</p>\n\n<pre>a  =  1\n  b</pre>')
+        self.assertEqual(result['content'], '<p>Hola <b>mundo</b> !</p><pre>a  =  1\n  b</pre>')
+
+    def test_word_count_and_reading_time(self):
+        result = rendering.render('<p>' + 'palabra ' * 25 + '</p><script>no cuenta</script>')
+        self.assertEqual((result['word_count'], result['reading_time']), (25, 3))
+        self.assertEqual(rendering.render('')['reading_time'], 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PostRenderingTests(TestCase):
+    """
+    Post.save renderiza sólo cuando se guarda content; rerender_posts reprocesa
+    los posts existentes
+    """
+
+    def setUp(self):
+        self.post = Post.objects.create(title='Nota', slug='nota', content='<h1>Uno</h1><p>Hola mundo</p>')
+
+    def stored(self):
+        return Post.objects.values('rendered_content', 'word_count', 'toc').get(pk=self.post.pk)
+
+    def test_create_renders_the_content(self):
+        self.assertEqual(self.stored(), {
+            'rendered_content': '<h2 id="uno">Uno</h2><p>Hola mundo</p>',
+            'word_count': 3,
+            'toc': [{'level': 2, 'id': 'uno', 'title': 'Uno'}],
+        })
+
+    def test_update_fields_without_content_does_not_render(self):
+        self.post.content = '<p>Cambio sin guardar</p>'
+        self.post.title = 'Nota corregida'
+        self.post.save(update_fields=['title'])
+        self.assertEqual(self.stored()['rendered_content'], '<h2 id="uno">Uno</h2><p>Hola mundo</p>')
+
+    def test_update_fields_with_content_saves_the_rendered_fields(self):
+        self.post.content = '<p>Texto <b>nuevo</b> del post</p>'
+        self.post.save(update_fields=['content'])
+        self.assertEqual(self.stored(), {
+            'rendered_content': '<p>Texto <b>nuevo</b> del post</p>', 'word_count': 4, 'toc': [],
+        })
+
+    def test_deferred_content_is_not_rendered_again(self):
+        post = Post.objects.defer('content').get(pk=self.post.pk)
+        post.title = 'Otro título'
+        with mock.patch.object(rendering, 'render') as render:
+            post.save()
+        render.assert_not_called()
+        self.assertEqual(self.stored()['word_count'], 3)
+
+    def test_rerender_posts_updates_only_stale_posts(self):
+        other = Post.objects.create(title='Otra', slug='otra', content='<p>Sin cambios</p>')
+        Post.objects.filter(pk=self.post.pk).update(rendered_content='<p>viejo</p>', word_count=0)
+        untouched = Post.objects.get(pk=other.pk).updated_at
+
+        out = io.StringIO()
+        call_command('rerender_posts', stdout=out)
+
+        self.assertIn('2 posts renderizados, 1 con cambios', out.getvalue())
+        self.assertEqual(self.stored()['rendered_content'], '<h2 id="uno">Uno</h2><p>Hola mundo</p>')
+        self.assertEqual(Post.objects.get(pk=other.pk).updated_at, untouched)
+        self.assertGreater(Post.objects.get(pk=self.post.pk).updated_at, untouched)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginatorTests(TestCase):
+    """
+    Paginación por cursor: sin saltos ni repetidos aunque varios posts tengan
+    el mismo created_at, en ambas direcciones
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Noticias', slug='noticias')
+        posts = Post.objects.bulk_create(
+            Post(title=f"Post {i}", slug=f"post-{i}", content='<p>Hola</p>', category=category) for i in range(11)
+        )
+        # De a pares con la misma fecha: el id desempata
+        now = timezone.now().replace(microsecond=0)
+        for i, post in enumerate(posts):
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=i // 2))
+        cls.expected = list(Post.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Post.objects.all(), 3)
+
+    def ids(self, page):
+        return [post.pk for post in page]
+
+    def walk_forward(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(after=pages[-1].next_cursor))
+        return pages
+
+    def test_first_page(self):
+        page = self.paginator.page()
+        self.assertEqual(self.ids(page), self.expected[:3])
+        self.assertEqual((page.has_previous(), page.has_next()), (False, True))
+
+    def test_after_cursors_cover_every_post_once_across_ties(self):
+        pages = self.walk_forward()
+
+        self.assertEqual([post for page in pages for post in self.ids(page)], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+        self.assertTrue(all(page.has_previous() for page in pages[1:]))
+
+    def test_last_page(self):
+        last = self.walk_forward()[-1]
+        self.assertEqual(self.ids(last), self.expected[-2:])
+        self.assertEqual((last.has_previous(), last.has_next()), (True, False))
+        self.assertFalse(self.paginator.page(after=last.next_cursor).has_other_pages())
+
+    def test_before_cursors_go_back_to_the_same_pages(self):
+        forward = self.walk_forward()
+
+        page = self.paginator.page(before=forward[-1].previous_cursor)
+        self.assertEqual(self.ids(page), self.ids(forward[-2]))
+        page = self.paginator.page(before=page.previous_cursor)
+        self.assertEqual(self.ids(page), self.ids(forward[-3]))
+        self.assertEqual((page.has_previous(), page.has_next()), (True, True))
+
+    def test_before_near_the_start_returns_the_full_first_page(self):
+        second = self.paginator.page(after=encode_cursor(Post.objects.get(pk=self.expected[1])))
+
+        page = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual(self.ids(page), self.expected[:3])
+        self.assertFalse(page.has_previous())
+
+    def test_invalid_cursors_fall_back_to_the_first_page(self):
+        truncated = encode_cursor(SimpleNamespace(created_at=timezone.now(), pk=1))[:-3]
+        # Base64 inválido, demasiado largo, "2026-01-01|abc" (id no numérico) y un cursor cortado
+        for cursor in ('!!!', 'x' * 65, 'MjAyNi0wMS0wMXxhYmM', truncated):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.ids(self.paginator.page(after=cursor)), self.expected[:3])
+                self.assertEqual(self.ids(self.paginator.page(before=cursor)), self.expected[:3])
+
+    def test_empty_queryset(self):
+        page = KeysetPaginator(Post.objects.none(), 3).page()
+        self.assertEqual((len(page), page.has_previous(), page.has_next()), (0, False, False))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryPlanTests(TestCase):
+    """
+    Las consultas del listado público y del changelist del admin usan sus
+    índices en lugar de recorrer la tabla completa (SQLite y PostgreSQL)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create(
+            Category(name=f"Categoría {i}", slug=f"categoria-{i}") for i in range(8)
+        )
+        Post.objects.bulk_create(
+            Post(title=f"Post {i}", slug=f"post-{i}", content='<p>Contenido</p>' * 20,
+                 category=categories[i % len(categories)], published=i % 10 != 0)
+            for i in range(3000)
+        )
+        users = User.objects.bulk_create(User(username=f"editor-{i}") for i in range(5))
+        statuses = [status for status, _ in NewsGeneration.STATUS_CHOICES]
+        NewsGeneration.objects.bulk_create(
+            NewsGeneration(tags=f"tema {i}", status=statuses[i % len(statuses)], created_by=users[i % len(users)])
+            for i in range(2000)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = users[0]
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Con pocas filas PostgreSQL prefiere recorrer la tabla aunque el índice sirva
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        if connection.vendor == 'sqlite':
+            self.assertIsNone(re.search(r'\bSCAN posts_\w+$', plan, re.MULTILINE), plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+        elif connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan', plan)
+            self.assertNotIn('Sort Key', plan)
+
+    def test_public_post_list_page(self):
+        self.assertUsesIndex(Post.objects.filter(published=True).select_related('category')[:6], 'post_published_recent_idx')
+
+    def test_category_page(self):
+        category = Category.objects.get(slug='categoria-3')
+        posts = Post.objects.filter(category=category, published=True).select_related('category')
+        self.assertUsesIndex(posts.order_by('-created_at', '-id')[:7], 'post_category_recent_idx')
+
+    def test_admin_drafts_filter(self):
+        self.assertUsesIndex(Post.objects.filter(published=False)[:100], 'post_draft_recent_idx')
+
+    def test_news_generation_changelist(self):
+        self.assertUsesIndex(NewsGeneration.objects.all()[:100], 'newsgen_created_idx')
+
+    def test_news_generation_status_filter(self):
+        self.assertUsesIndex(NewsGeneration.objects.filter(status='COMPLETED')[:100], 'newsgen_status_created_idx')
+
+    def test_news_generation_author_filter(self):
+        self.assertUsesIndex(NewsGeneration.objects.filter(created_by=self.user)[:100], 'newsgen_author_created_idx')
+
+    def test_news_generation_date_filter(self):
+        since = timezone.now() - timedelta(days=7)
+        self.assertUsesIndex(NewsGeneration.objects.filter(created_at__gte=since)[:100], 'newsgen_created_idx')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AdminChangelistQueryTests(TestCase):
+    """
+    Los changelists de Post y NewsGeneration hacen la misma cantidad de
+    consultas con pocas filas que con más de una página, y no traen las
+    columnas grandes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        cls.categories = Category.objects.bulk_create(
+            Category(name=f"Categoría {i}", slug=f"categoria-{i}") for i in range(3)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _posts(self, start, count):
+        Post.objects.bulk_create(
+            Post(title=f"Post {i}", slug=f"post-{i}", content='<p>Contenido</p>' * 200,
+                 category=self.categories[i % len(self.categories)], published=i % 2 == 0)
+            for i in range(start, start + count)
+        )
+
+    def _generations(self, start, count):
+        users = User.objects.bulk_create(User(username=f"editor-{i}") for i in range(start, start + count))
+        statuses = [status for status, _ in NewsGeneration.STATUS_CHOICES]
+        NewsGeneration.objects.bulk_create(
+            NewsGeneration(
+                tags=f"tema {i}", status=statuses[i % len(statuses)], created_by=users[i - start],
+                generated_title=f"Título {i}", generated_content='<p>Generado</p>' * 200,
+                source_articles=[{'url': f"https://example.com/{i}", 'content': 'x' * 2000}],
+            )
+            for i in range(start, start + count)
+        )
+
+    def assertConstantQueries(self, url, add_rows):
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        add_rows()
+        with self.assertNumQueries(len(few)) as many:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertNotSelected(self, queries, table, column):
+        # Sólo las consultas que cargan filas de `table`
+        rows = [query['sql'].split(' FROM ')[0] for query in queries
+                if query['sql'].startswith(f'SELECT "{table}"."id", ')]
+        self.assertTrue(rows)
+        for select in rows:
+            # Como columna; has_content sólo la compara con ''
+            self.assertIsNone(re.search(re.escape(f'"{table}"."{column}"') + r'(,|$)', select), select)
+
+    def test_post_changelist(self):
+        self._posts(0, 10)
+        url = reverse('admin:posts_post_changelist')
+        response = self.assertConstantQueries(url, lambda: self._posts(10, 250))
+        self.assertContains(response, 'Categoría 1')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertNotSelected(queries, 'posts_post', 'content')
+
+    def test_news_generation_changelist(self):
+        self._generations(0, 10)
+        url = reverse('admin:posts_newsgeneration_changelist')
+        response = self.assertConstantQueries(url, lambda: self._generations(10, 250))
+        self.assertContains(response, 'Vista Previa')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for column in ('generated_content', 'source_articles', 'generation_metadata'):
+            self.assertNotSelected(queries, 'posts_newsgeneration', column)
@@ -0,0 +1,134 @@
+"""
+Tramos cronometrados (spans) de cada generación, guardados en GenerationSpan.
+
+El servicio abre un Tracer con `trace(id)` y el pipeline marca sus tramos con
+`span(etapa, etiqueta)` sin recibir el tracer: el activo viaja en una
+ContextVar, que heredan los threads de descarga (posts/fetching.py) y las
+tareas asyncio. Fuera de una generación `span` no registra nada. Los tramos se
+acumulan en memoria y se guardan juntos con un solo bulk_create al terminar.
+
+stage_report resume los tramos para el reporte del admin.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum, Window
+from django.db.models.functions import Ceil, Coalesce, RowNumber, TruncDate
+from django.utils import timezone
+
+from .models import GenerationSpan
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('news_generation_tracer', default=None)
+
+
+class Tracer:
+
+    def __init__(self, generation_id):
+        self.generation_id = generation_id
+        self.spans = []
+
+    def add(self, stage, label, started_at, seconds, **fields):
+        if 'error' in fields:
+            fields['error'] = fields['error'][:500]
+        self.spans.append(GenerationSpan(
+            generation_id=self.generation_id, stage=stage, label=label[:500],
+            started_at=started_at, duration_ms=round(seconds * 1000, 3), **fields
+        ))
+
+    def save(self):
+        spans, self.spans = self.spans, []
+        try:
+            GenerationSpan.objects.bulk_create(spans)
+        except Exception as e:
+            # Las métricas nunca deben hacer fallar una generación
+            logger.warning(f"No se pudieron guardar los tramos de la generación {self.generation_id}: {e}")
+
+
+@contextmanager
+def trace(generation_id):
+    tracer = Tracer(generation_id)
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage, label=''):
+    """
+    Cronometra el bloque. En el dict que devuelve se pueden anotar tokens,
+    `cached` o `error`; si el bloque lanza una excepción queda como error.
+    """
+    fields = {}
+    tracer = _current.get()
+    if tracer is None:
+        yield fields
+        return
+
+    started_at = timezone.now()
+    started = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as e:
+        fields.setdefault('error', str(e) or type(e).__name__)
+        raise
+    finally:
+        tracer.add(stage, label, started_at, time.perf_counter() - started, **fields)
+
+
+# Percentiles del reporte: rango más cercano, la fila ceil(fracción * n) del grupo ordenado
+PERCENTILES = (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+
+
+def _grouped(spans, keys):
+    """
+    Cantidad, errores, tokens y percentiles de duración por `keys`, calculados
+    en la base: a Python llega una fila por grupo y percentil, no los tramos
+    """
+    rows = {
+        tuple(row[key] for key in keys): row
+        for row in spans.values(*keys).annotate(
+            count=Count('id'),
+            errors=Count('id', filter=~Q(error='')),
+            prompt_tokens=Coalesce(Sum('prompt_tokens'), 0),
+            completion_tokens=Coalesce(Sum('completion_tokens'), 0),
+        )
+    }
+    partition = [F(key) for key in keys]
+    for name, fraction in PERCENTILES:
+        ranked = spans.annotate(
+            position=Window(RowNumber(), partition_by=partition, order_by=F('duration_ms').asc()),
+            size=Window(Count('id'), partition_by=partition),
+        ).filter(position=Ceil(ExpressionWrapper(F('size') * fraction, output_field=FloatField())))
+        for *group, duration in ranked.values_list(*keys, 'duration_ms'):
+            rows[tuple(group)][name] = duration
+    return rows.values()
+
+
+def _cost(row):
+    return (row['prompt_tokens'] * settings.NEWS_OPENAI_PROMPT_PRICE
+            + row['completion_tokens'] * settings.NEWS_OPENAI_COMPLETION_PRICE) / 1_000_000
+
+
+def stage_report(since):
+    """
+    Latencia (p50/p95/p99 en ms), tokens y costo estimado por etapa desde
+    `since`: totales del período y desglose por día
+    """
+    spans = GenerationSpan.objects.filter(started_at__gte=since).annotate(day=TruncDate('started_at'))
+
+    order = {stage: i for i, (stage, _) in enumerate(GenerationSpan.STAGE_CHOICES)}
+    labels = dict(GenerationSpan.STAGE_CHOICES)
+    totals = [dict(row, day=None) for row in _grouped(spans, ['stage'])]
+    daily = list(_grouped(spans, ['day', 'stage']))
+    for row in totals + daily:
+        row.update(cost=_cost(row), stage_label=labels[row['stage']])
+    totals.sort(key=lambda row: order[row['stage']])
+    daily.sort(key=lambda row: (row['day'], -order[row['stage']]), reverse=True)
+    return totals, daily
@@ -0,0 +1,182 @@
+"""
+Contadores de visitas de los posts.
+
+Con Redis (REDIS_URL) post_detail no escribe en la base: hace INCR del
+contador del post y lo anota en el set de posts con visitas pendientes, ambos
+en una transacción MULTI/EXEC. `python manage.py flush_view_counts`
+(periódico) saca de ese set sólo los posts con visitas, suma sus contadores a
+Post.view_count con un UPDATE por bloque y recalcula los populares del sidebar.
+
+Sin Redis no hay un almacén compartido con incrementos atómicos (la caché en
+disco pierde visitas concurrentes y descarta entradas al llenarse), así que
+cada proceso acumula sus visitas en memoria y las suma a la base con el mismo
+UPDATE por bloque al terminar un request, cuando pasaron
+VIEW_COUNT_FLUSH_INTERVAL segundos desde el volcado anterior (la respuesta ya
+salió), y al terminar el proceso. Un worker caído sin apagarse pierde las
+visitas de ese intervalo.
+"""
+import atexit
+import functools
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Post
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis sólo hace falta con REDIS_URL
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+FLUSH_CHUNK = 500
+
+# Ids de los posts con visitas sin volcar
+PENDING_KEY = 'counters:views:pending'
+
+
+# Sin Redis: {id: visitas} de este proceso todavía sin volcar
+_local = Counter()
+_local_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _key(post_id):
+    return f"counters:views:{post_id}"
+
+
+@functools.lru_cache(maxsize=None)
+def _redis(url):
+    return redis.Redis.from_url(url)
+
+
+def buffered():
+    """
+    True si las visitas se acumulan en Redis; si no, en la memoria del proceso
+    """
+    return bool(settings.REDIS_URL)
+
+
+def record_view(post_id):
+    try:
+        if buffered():
+            pipe = _redis(settings.REDIS_URL).pipeline()
+            pipe.incr(_key(post_id))
+            pipe.sadd(PENDING_KEY, post_id)
+            pipe.execute()
+        else:
+            with _local_lock:
+                _local[post_id] += 1
+    except Exception as e:
+        # Una visita sin contar no debe romper la página
+        logger.warning(f"No se pudo registrar la visita del post {post_id}: {e}")
+
+
+def _take_pending(client):
+    """
+    Saca del set hasta FLUSH_CHUNK posts y deja sus contadores en 0; devuelve
+    (ids, {id: visitas}). Una visita que llegue mientras tanto vuelve a anotar
+    el post para el próximo volcado.
+    """
+    ids = [int(pk) for pk in client.spop(PENDING_KEY, FLUSH_CHUNK) or ()]
+    if not ids:
+        return ids, {}
+    pipe = client.pipeline()
+    for pk in ids:
+        pipe.getset(_key(pk), 0)
+    counts = {pk: int(count or 0) for pk, count in zip(ids, pipe.execute())}
+    return ids, {pk: count for pk, count in counts.items() if count}
+
+
+def _give_back(client, counts):
+    pipe = client.pipeline()
+    for pk, count in counts.items():
+        pipe.incrby(_key(pk), count)
+        pipe.sadd(PENDING_KEY, pk)
+    pipe.execute()
+
+
+def _add_views(counts):
+    Post.objects.filter(pk__in=counts).update(view_count=F('view_count') + Case(
+        *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+        default=Value(0), output_field=IntegerField(),
+    ))
+
+
+def flush_local():
+    """
+    Vuelca a la base las visitas acumuladas en este proceso; devuelve (posts, visitas)
+    """
+    global _last_flush
+    with _local_lock:
+        counts = dict(_local)
+        _local.clear()
+        _last_flush = time.monotonic()
+
+    posts = views = 0
+    items = list(counts.items())
+    for start in range(0, len(items), FLUSH_CHUNK):
+        chunk = dict(items[start:start + FLUSH_CHUNK])
+        try:
+            _add_views(chunk)
+        except Exception:
+            # Lo que no llegó a la base queda en memoria para el próximo volcado
+            with _local_lock:
+                _local.update(dict(items[start:]))
+            raise
+
+        posts += len(chunk)
+        views += sum(chunk.values())
+    return posts, views
+
+
+def flush_local_if_due():
+    if _local and time.monotonic() - _last_flush >= settings.VIEW_COUNT_FLUSH_INTERVAL:
+        try:
+            flush_local()
+        except Exception as e:
+            logger.warning(f"No se pudieron volcar las visitas: {e}")
+
+
+@atexit.register
+def _flush_on_exit():
+    # gunicorn recicla los workers (max_requests): que no se lleven sus visitas
+    if _local:
+        try:
+            flush_local()
+        except Exception as e:
+            logger.warning(f"No se pudieron volcar las visitas al salir: {e}")
+
+
+def flush():
+    """
+    Vuelca a la base las visitas acumuladas en Redis (o en este proceso, sin
+    Redis); devuelve (posts, visitas)
+    """
+    if not buffered():
+        return flush_local()
+
+    client = _redis(settings.REDIS_URL)
+    posts = views = 0
+    # Sólo los posts pendientes al empezar: con tráfico el set no se vacía nunca
+    for _ in range(client.scard(PENDING_KEY) // FLUSH_CHUNK + 1):
+        ids, counts = _take_pending(client)
+        if not ids:
+            break
+        if not counts:
+            continue
+        try:
+            _add_views(counts)
+        except Exception:
+            # Lo que no llegó a la base vuelve a Redis para el próximo volcado
+            _give_back(client, counts)
+            raise
+
+        posts += len(counts)
+        views += sum(counts.values())
+    return posts, views
@@ -1,21 +1,141 @@
+import functools
+import hashlib
+
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from .models import Post, Category
+from . import page_cache, search, sidebar, view_counts
+from .pagination import KeysetPaginator
+
+# Las tarjetas de los listados no muestran el cuerpo del post
+LIST_DEFERRED_FIELDS = ('content', 'rendered_content', 'toc')
 
 def post_list(request):
-    posts = Post.objects.filter(published=True).select_related('category')
+    # Lectores anónimos: la página sale de la caché hasta que cambie un post o una categoría
+    cache_key = page_cache.list_key(request.GET) if page_cache.is_cacheable(request) else None
+    if cache_key:
+        cached = page_cache.get_response(cache_key)
+        if cached is not None:
+            return cached
     
-    # Paginación
-    paginator = Paginator(posts, 6)  # 6 posts por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.filter(published=True).select_related('category').defer(*LIST_DEFERRED_FIELDS)
+    
+    if 'page' in request.GET:
+        # Paginación numerada (OFFSET + COUNT): se mantiene para los enlaces ya publicados
+        paginator = Paginator(posts, 6)  # 6 posts por página
+        page_obj = paginator.get_page(request.GET.get('page'))
+    else:
+        # Por cursor: mismo costo en cualquier página (ver posts/pagination.py)
+        page_obj = KeysetPaginator(posts, 6).page(after=request.GET.get('after'), before=request.GET.get('before'))
     
     context = {
         'posts': page_obj,
         'page_obj': page_obj,
     }
-    return render(request, 'posts/post_list.html', context)
+    response = render(request, 'posts/post_list.html', context)
+    if cache_key:
+        page_cache.store_response(cache_key, response)
+    return response
 
+def category_detail(request, slug):
+    category = get_object_or_404(Category, slug=slug)
+    
+    # Cada categoría tiene su propia versión en la caché: publicar en una no invalida las otras
+    scope = page_cache.category_scope(category.pk)
+    cache_key = page_cache.list_key(request.GET, scope) if page_cache.is_cacheable(request) else None
+    if cache_key:
+        cached = page_cache.get_response(cache_key)
+        if cached is not None:
+            return cached
+    
+    # Usa el índice post_category_recent_idx
+    posts = Post.objects.filter(category=category, published=True).select_related('category').defer(*LIST_DEFERRED_FIELDS)
+    page_obj = KeysetPaginator(posts, 6).page(after=request.GET.get('after'), before=request.GET.get('before'))
+    
+    context = {
+        'category': category,
+        'post_count': sidebar.category_count(category.slug),
+        'posts': page_obj,
+        'page_obj': page_obj,
+    }
+    response = render(request, 'posts/category_detail.html', context)
+    if cache_key:
+        page_cache.store_response(cache_key, response)
+    return response
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()[:200]
+    
+    # Sólo ids ordenados por relevancia desde el índice; los posts de la página se traen después
+    paginator = Paginator(search.ranked_ids(query) if query else [], 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = Post.objects.select_related('category').defer(*LIST_DEFERRED_FIELDS).in_bulk(page_obj.object_list)
+    page_obj.object_list = [posts[pk] for pk in page_obj.object_list if pk in posts]
+    
+    context = {
+        'query': query,
+        'posts': page_obj,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+def _post_version(request, slug):
+    """
+    (etag, id) del post publicado, o None si no existe. Se lee sólo
+    updated_at, el id y la categoría (nombre y slug), una vez por request;
+    el ETag incluye la versión del sidebar, que se muestra en la página.
+    """
+    if not hasattr(request, '_post_version'):
+        row = Post.objects.filter(slug=slug, published=True).values_list('updated_at', 'category__name', 'category__slug', 'id').first()
+        if row is None:
+            request._post_version = None
+        else:
+            updated_at, category_name, category_slug, pk = row
+            version = f"{slug}:{updated_at.isoformat()}:{category_name}:{category_slug}:{page_cache.sidebar_version()}"
+            digest = hashlib.md5(version.encode('utf-8')).hexdigest()
+            request._post_version = (digest, pk)
+    return request._post_version
+
+
+def post_etag(request, slug):
+    version = _post_version(request, slug)
+    return version and version[0]
+
+
+def _counts_views(view):
+    """
+    Suma la visita también cuando @condition responde 304: es el mismo lector
+    volviendo a la página, que su navegador ya tenía.
+    """
+    @functools.wraps(view)
+    def wrapper(request, slug):
+        response = view(request, slug)
+        version = getattr(request, '_post_version', None)
+        if version and response.status_code in (200, 304):
+            # Sólo un incremento en memoria o en Redis; la base se actualiza en bloque
+            view_counts.record_view(version[1])
+        return response
+    return wrapper
+
+
+# Si el navegador ya tiene la versión actual responde 304 sin renderizar. Sin
+# Last-Modified: updated_at no cambia cuando cambian el sidebar o la categoría,
+# así que un If-Modified-Since sólo daría 304 con la página vieja.
+@_counts_views
+@condition(etag_func=post_etag)
 def post_detail(request, slug):
-    post = get_object_or_404(Post, slug=slug, published=True)
-    return render(request, 'posts/post_detail.html', {'post': post})
+    etag = post_etag(request, slug)
+    cache_key = page_cache.detail_key(slug) if etag and page_cache.is_cacheable(request) else None
+    response = page_cache.get_response(cache_key, etag) if cache_key else None
+    
+    if response is None:
+        # El HTML ya viene renderizado desde el guardado (posts/rendering.py)
+        post = get_object_or_404(Post.objects.select_related('category').defer('content'), slug=slug, published=True)
+        response = render(request, 'posts/post_detail.html', {'post': post})
+        # Que el navegador revalide siempre: con ETag la respuesta es un 304 vacío
+        patch_cache_control(response, max_age=0)
+        if cache_key:
+            page_cache.store_response(cache_key, response, etag)
+    return response